@@ -0,0 +1,169 @@
+"""
+Benchmark for the period x entry time analysis on the bundled trade logs.
+
+Times the per-group apply calculation analyze() used to run for every
+strategy/weekday slice against building the analysis cube once and
+reducing it for each slice.  Also checks both give the same PCR and
+average PnL tables to 4 decimals, before they are averaged and rounded,
+for monthly, semi-monthly and weekly periods with and without weekday and
+news exclusions.
+
+Usage:
+    python benchmarks/bench_analyze.py [trade_log.csv ...]
+"""
+
+import os
+import sys
+import time
+from typing import Tuple
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import tta_core as tta
+
+DEFAULT_FILES = [
+    "Wide-EMA-2.5-1.5x.csv",
+    "Wide-EMA(5-40)-2.5-1.5x-.25slip-noFOMC.csv",
+    "Wide-EMA(5-40)-2.5-1.5x-w.FOMC.csv",
+    "Narrow-EMA-2.5-1.5x.csv",
+    "BYOB_test.csv",
+]
+NEWS_EVENTS_FILE = "calendar-event-list-2007-02-13_2024-12-31.csv"
+# period type and the weekday and news exclusions of each case
+CASES = [
+    ("Monthly", [], []),
+    ("Semi-Monthly", [], []),
+    ("Weekly", [], []),
+    ("Monthly", ["Friday"], ["CPI", "FOMC"]),
+    ("Semi-Monthly", ["Monday"], ["CPI", "FOMC"]),
+]
+
+
+def legacy_period_metrics(
+    df: pd.DataFrame, calc_type: str, agg_type: str
+) -> pd.DataFrame:
+    """
+    The calculation analyze() did before the cube, a Python callback
+    for every period/entry time group
+    """
+
+    def calculate_avg_pnl(df: pd.DataFrame) -> float:
+        if df.columns[0] == "Date Opened":  # OO BT data
+            return df["P/L"].sum() / df["No. of Contracts"].sum()
+        else:  # BYOB BT data
+            df["P/L"] = (
+                df["ProfitLossAfterSlippage"] - df["CommissionFees"] / 100
+            ) * 100
+            return df["P/L"].mean()
+
+    def calculate_pcr(df: pd.DataFrame) -> float:
+        if df.columns[0] == "Date Opened":  # OO BT data
+            return df["P/L"].sum() / (df["Premium"] * df["No. of Contracts"]).sum()
+        else:  # BYOB BT data
+            df["P/L"] = df["ProfitLossAfterSlippage"] - df["CommissionFees"] / 100
+            return df["P/L"].sum() / df["Premium"].sum()
+
+    if agg_type == "SM":
+
+        def semi_monthly_period(date):
+            return pd.Timestamp(
+                date.year, date.month, 15 if date.day <= 15 else date.days_in_month
+            )
+
+        period = df["EntryTime"].apply(semi_monthly_period)
+    else:
+        period = df["EntryTime"].dt.to_period(agg_type)
+    df_grouped = df.groupby([period, df["Time"].astype(str)])
+    func = calculate_pcr if calc_type == "PCR" else calculate_avg_pnl
+    return df_grouped.apply(func, include_groups=False).unstack(level=-1)
+
+
+def get_slices(df: pd.DataFrame):
+    """
+    Yields the name and boolean mask of every strategy/weekday slice
+    create_excel_file analyzes
+    """
+    for strat, option_type in [("Put-Call Comb", None), ("Puts", "P"), ("Calls", "C")]:
+        for day in ["All"] + tta.weekday_list:
+            mask = pd.Series(True, index=df.index)
+            if day != "All":
+                mask &= df["Day of Week"] == day
+            if option_type:
+                mask &= df["OptionType"] == option_type
+            yield f"{strat}_{day[:3]}", mask
+
+
+def run_benchmark(
+    df: pd.DataFrame,
+    calc_type: str,
+    agg_type: str,
+    weekday_exclusions: list,
+    news_exclusions: list,
+) -> Tuple[float, float]:
+    settings = {
+        "-AGG_TYPE-": agg_type,
+        "-CALC_TYPE-": calc_type,
+        "-GAP_ANALYSIS-": False,
+    }
+    agg_type = "".join(word[0] for word in agg_type.split("-"))
+    df = df[
+        (~df["Day of Week"].isin(weekday_exclusions))
+        & (~tta.get_news_event_mask(df["EntryTime"], news_exclusions))
+    ]
+
+    start = time.perf_counter()
+    legacy_tables = {
+        name: legacy_period_metrics(df[mask], calc_type, agg_type)
+        for name, mask in get_slices(df)
+        if mask.any()
+    }
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cube = tta.build_analysis_cube(df, settings)
+    cube_tables = {
+        name: tta.calculate_period_metrics(cube[mask])
+        for name, mask in get_slices(cube)
+        if mask.any()
+    }
+    cube_time = time.perf_counter() - start
+
+    for name, legacy_table in legacy_tables.items():
+        pd.testing.assert_frame_equal(
+            cube_tables[name],
+            legacy_table,
+            rtol=0,
+            atol=0.5e-4,
+            check_names=False,
+        )
+
+    return legacy_time, cube_time
+
+
+def main():
+    files = sys.argv[1:] or [os.path.join(REPO_DIR, f) for f in DEFAULT_FILES]
+    tta.import_news_events(os.path.join(REPO_DIR, NEWS_EVENTS_FILE))
+    print(
+        f"{'File':<44}{'Calc':>5}{'Period':>14}{'Excl':>6}{'Per-group':>11}"
+        f"{'Cube':>9}{'Speedup':>9}"
+    )
+    for file in files:
+        df = tta.read_trade_log(file)
+        for calc_type in ["PCR", "PnL"]:
+            for agg_type, weekday_exclusions, news_exclusions in CASES:
+                legacy_time, cube_time = run_benchmark(
+                    df, calc_type, agg_type, weekday_exclusions, news_exclusions
+                )
+                excluded = "yes" if weekday_exclusions or news_exclusions else "no"
+                print(
+                    f"{os.path.basename(file):<44}{calc_type:>5}{agg_type:>14}"
+                    f"{excluded:>6}{legacy_time:>10.3f}s{cube_time:>8.3f}s"
+                    f"{legacy_time / cube_time:>8.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
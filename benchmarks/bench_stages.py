@@ -0,0 +1,336 @@
+"""
+Benchmark of each stage of an analysis and walk forward run.
+
+Times load_data, analyze, create_excel_file, get_top_times and the walk
+forward test with the legacy and the vectorized engine on the bundled trade
+logs, or the ones given, plus synthetic Option Omega/BYOB logs of any size.
+Every log runs in a fresh process so the peak RSS of a stage is the peak of
+that log up to the end of the stage.  The SPX history is a synthetic one
+stored in the work directory so nothing is downloaded.
+
+The wall time and peak RSS of every stage are appended to a JSON history
+in the work directory, along with the commit and versions they were
+measured with, and each run is printed next to the last run of the same
+log and stage.
+
+Usage:
+    python benchmarks/bench_stages.py [trade_log.csv ...] [--synthetic 10k 1M]
+                                      [--formats BYOB OO] [--skip STAGE ...]
+"""
+
+import argparse
+import concurrent.futures
+import datetime as dt
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic_logs
+import tta_cli
+import tta_core as tta
+
+BUNDLED_FILES = [
+    "Narrow-EMA-2.5-1.5x.csv",
+    "Wide-EMA-2.5-1.5x.csv",
+    "Wide-EMA(5-40)-2.5-1.5x-.25slip-noFOMC.csv",
+    "Wide-EMA(5-40)-2.5-1.5x-w.FOMC.csv",
+    "BYOB_test.csv",
+]
+STAGES = [
+    "load_data",
+    "analyze",
+    "create_excel_file",
+    "get_top_times",
+    "walk_forward_test",
+    "walk_forward_fast",
+]
+
+
+def get_commit() -> str:
+    """
+    Returns the short hash of the checked out commit, marked dirty if there
+    are uncommitted changes, or None outside of a git checkout
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "-C", REPO_DIR, "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        changes = subprocess.run(
+            ["git", "-C", REPO_DIR, "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if changes else commit
+
+
+def run_stages(file: str, settings_file: str, stages: list, output_format: str) -> dict:
+    """
+    Runs every stage on a trade log in the work directory it is in and
+    returns the wall time and peak RSS of the ones in 'stages'.  Stages that
+    are skipped still run untimed when a later stage needs their results.
+    """
+    os.chdir(os.path.dirname(file))
+    # use the synthetic SPX history in the work directory, not the app's
+    tta.spx_history_path = os.path.join(os.path.dirname(file), "data", "cache")
+    app_settings = tta_cli.load_settings(settings_file)
+    app_settings["-PORTFOLIO_MODE-"] = False
+    strategy_settings = tta_cli.get_strategy_settings([file], app_settings)
+    tta.validate_strategy_settings(strategy_settings)
+    settings = strategy_settings["-SINGLE_MODE-"]
+    wf_path = os.path.join("data", "trade_logs")
+    os.makedirs(wf_path, exist_ok=True)
+    timings = {}
+
+    def run_stage(stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        if stage in stages:
+            timings[stage] = {
+                "seconds": round(time.perf_counter() - start, 4),
+                "peak_rss_mb": tta.get_peak_rss_mb(),
+            }
+        return result
+
+    def get_all_top_times(df_dicts):
+        for day_dict in df_dicts.values():
+            for df_dict in day_dict.values():
+                tta.get_top_times(df_dict, strategy_settings)
+
+    def walk_forward_test(df_dicts, fast_engine):
+        tta.walk_forward_test(
+            df_dicts,
+            wf_path,
+            strategy_settings,
+            start=tta_cli.parse_date(app_settings["-START_DATE-"], "Start"),
+            end=tta_cli.parse_date(app_settings["-END_DATE-"], "End"),
+            initial_value=float(app_settings["-START_VALUE-"]),
+            fast_engine=fast_engine,
+        )
+
+    # parse the CSV instead of reading the cached trades
+    for filename in tta.get_trade_log_cache_filenames(file):
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    trades = 0
+    result = run_stage("load_data", tta.load_data, file)
+    if result:
+        df = result[0]
+        trades = len(df)
+        if "analyze" in stages:
+            run_stage(
+                "analyze",
+                lambda: tta.analyze(tta.build_analysis_cube(df, settings), settings),
+            )
+        del df, result
+
+        def create_excel_file():
+            # run through run_analysis_threaded for the combined Best P/C tabs
+            df_dicts = tta.run_analysis_threaded(
+                [file], strategy_settings, False, output_format=output_format
+            )
+            tta.wait_for_heatmaps()
+            return df_dicts
+
+        df_dicts = run_stage("create_excel_file", create_excel_file)
+        if df_dicts and "Put-Call Comb" in df_dicts:
+            if "get_top_times" in stages:
+                run_stage("get_top_times", get_all_top_times, df_dicts)
+            if "walk_forward_test" in stages:
+                run_stage("walk_forward_test", walk_forward_test, df_dicts, False)
+            if "walk_forward_fast" in stages:
+                run_stage("walk_forward_fast", walk_forward_test, df_dicts, True)
+
+    errors = []
+    while True:
+        try:
+            result_key, result = tta.results_queue.get(block=False)
+        except queue.Empty:
+            break
+        if result_key == "-ERROR-":
+            errors.append(result)
+    return {"trades": trades, "stages": timings, "errors": errors}
+
+
+def load_history(filename: str) -> list:
+    if not os.path.exists(filename):
+        return []
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def get_last_timing(history: list, log: str, stage: str) -> dict:
+    """
+    Returns the timing of the stage in the most recent run with that log
+    """
+    for run in reversed(history):
+        timing = run["logs"].get(log, {}).get("stages", {}).get(stage)
+        if timing:
+            return timing
+
+
+def print_results(logs: dict, history: list) -> None:
+    print(
+        f"{'Log':<44}{'Trades':>9}{'Stage':>19}{'Time':>10}{'Peak RSS':>11}"
+        f"{'vs last':>9}"
+    )
+    for log, result in logs.items():
+        for stage, timing in result["stages"].items():
+            change = ""
+            last = get_last_timing(history, log, stage)
+            if last and last["seconds"]:
+                change = f"{timing['seconds'] / last['seconds'] - 1:+.0%}"
+            rss = timing["peak_rss_mb"]
+            rss = "" if rss is None else f"{rss:.0f}MB"
+            print(
+                f"{log:<44}{result['trades']:>9}{stage:>19}"
+                f"{timing['seconds']:>9.3f}s{rss:>11}{change:>9}"
+            )
+
+
+def get_args():
+    arg_parser = argparse.ArgumentParser(
+        description="Time each stage of the Tranche Time Analyzer on trade logs"
+    )
+    arg_parser.add_argument(
+        "files", nargs="*", help="trade log CSV files, defaults to the bundled logs"
+    )
+    arg_parser.add_argument(
+        "--synthetic",
+        nargs="+",
+        default=[],
+        type=synthetic_logs.parse_size,
+        help="sizes of synthetic logs to add, e.g. 10k 100k 1M 10M",
+    )
+    arg_parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=synthetic_logs.LOG_FORMATS,
+        default=synthetic_logs.LOG_FORMATS,
+        help="formats of the synthetic logs",
+    )
+    arg_parser.add_argument(
+        "--no-bundled",
+        action="store_true",
+        help="only benchmark the synthetic logs when no files are given",
+    )
+    arg_parser.add_argument(
+        "--skip", nargs="+", choices=STAGES, default=[], help="stages not to time"
+    )
+    arg_parser.add_argument(
+        "--settings", help="settings JSON with the same keys as tta_settings.json"
+    )
+    arg_parser.add_argument(
+        "--output-format",
+        choices=tta.heatmap_output_formats,
+        default="XLSX",
+        help="format create_excel_file saves the heatmaps in, defaults to XLSX",
+    )
+    arg_parser.add_argument(
+        "--work-dir",
+        default=os.path.join(tempfile.gettempdir(), "tta_bench"),
+        help="directory for the copied and synthetic logs and their output."
+        " Synthetic logs already in it are reused",
+    )
+    arg_parser.add_argument(
+        "--history",
+        help="JSON file the results are appended to, defaults to"
+        " bench_history.json in the work directory",
+    )
+    arg_parser.add_argument("--seed", type=int, default=0)
+    return arg_parser.parse_args()
+
+
+def main():
+    args = get_args()
+    work_dir = os.path.abspath(args.work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    settings_file = os.path.abspath(args.settings) if args.settings else None
+    # kept out of the checkout so a run doesn't mark the next one as dirty
+    history_file = os.path.abspath(
+        args.history or os.path.join(work_dir, "bench_history.json")
+    )
+    stages = [stage for stage in STAGES if stage not in args.skip]
+
+    # copy the logs so the caches and heatmaps are not written next to them
+    files = args.files
+    if not files and not args.no_bundled:
+        files = [os.path.join(REPO_DIR, file) for file in BUNDLED_FILES]
+    logs = {}
+    for file in files:
+        logs[os.path.basename(file)] = shutil.copy(file, work_dir)
+    for size in args.synthetic:
+        for log_format in args.formats:
+            print(f"Generating {size} {log_format} trades", file=sys.stderr)
+            file = synthetic_logs.write_trade_log(work_dir, size, log_format, args.seed)
+            logs[os.path.basename(file)] = file
+    if not logs:
+        print("Error: no trade logs to benchmark", file=sys.stderr)
+        return 1
+
+    # store a synthetic SPX history where the stages look for it
+    os.chdir(work_dir)
+    tta.spx_history_path = os.path.join(work_dir, "data", "cache")
+    spx_history = synthetic_logs.generate_spx_history(seed=args.seed)
+    tta.save_spx_history(
+        tta.normalize_spx_history(spx_history),
+        spx_history.index.min().date(),
+        spx_history.index.max().date(),
+    )
+
+    results = {}
+    for log, file in logs.items():
+        print(f"Running {log}", file=sys.stderr)
+        # a fresh process for every log so the peak RSS is its own
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            result = executor.submit(
+                run_stages, file, settings_file, stages, args.output_format
+            ).result()
+        for error in result.pop("errors"):
+            print(f"Error: {log}: {error}", file=sys.stderr)
+        results[log] = result
+
+    history = load_history(history_file)
+    print_results(results, history)
+    history.append(
+        {
+            "date": dt.datetime.now().isoformat(timespec="seconds"),
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "output_format": args.output_format,
+            "logs": results,
+        }
+    )
+    with open(history_file, "w") as f:
+        json.dump(history, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Regression check of the analysis pool after a serial run in the same process.
+
+Runs run_analysis_threaded on one trade log serially, writing its XLSX
+heatmaps, and then on two logs with a pool of two workers, the way the GUI
+does when Analyze is clicked again with "Analyze files in parallel".  The
+parallel run has to finish within the timeout and give the same tables as
+the serial one.  The logs are copied to the work directory with a synthetic
+SPX history so nothing is downloaded.
+
+Usage:
+    python benchmarks/check_analysis_pool.py [trade_log.csv] [--timeout 120]
+"""
+
+import argparse
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic_logs
+import tta_cli
+import tta_core as tta
+
+DEFAULT_FILE = "Wide-EMA-2.5-1.5x.csv"
+
+
+def run_with_timeout(timeout: float, func, *args, **kwargs):
+    """
+    Runs func on a daemon thread and returns its result, or raises
+    TimeoutError if it has not returned after 'timeout' seconds
+    """
+    result = {}
+
+    def target():
+        result["value"] = func(*args, **kwargs)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"{func.__name__} did not finish in {timeout:.0f}s")
+    return result.get("value")
+
+
+def get_errors() -> list:
+    errors = []
+    while True:
+        try:
+            result_key, result = tta.results_queue.get(block=False)
+        except queue.Empty:
+            return errors
+        if result_key == "-ERROR-":
+            errors.append(result)
+
+
+def get_args():
+    arg_parser = argparse.ArgumentParser(
+        description="Check the analysis pool finishes after a serial analysis"
+    )
+    arg_parser.add_argument(
+        "file", nargs="?", default=os.path.join(REPO_DIR, DEFAULT_FILE)
+    )
+    arg_parser.add_argument(
+        "--timeout", type=float, default=120, help="seconds the pool may take"
+    )
+    arg_parser.add_argument(
+        "--work-dir",
+        default=os.path.join(tempfile.gettempdir(), "tta_check_pool"),
+        help="directory for the copied logs and their output",
+    )
+    return arg_parser.parse_args()
+
+
+def main():
+    args = get_args()
+    work_dir = os.path.abspath(args.work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    name, ext = os.path.splitext(os.path.basename(args.file))
+    files = [
+        shutil.copy(args.file, os.path.join(work_dir, f"{name}-{copy}{ext}"))
+        for copy in ["a", "b"]
+    ]
+
+    os.chdir(work_dir)
+    tta.spx_history_path = os.path.join(work_dir, "data", "cache")
+    spx_history = synthetic_logs.generate_spx_history()
+    tta.save_spx_history(
+        tta.normalize_spx_history(spx_history),
+        spx_history.index.min().date(),
+        spx_history.index.max().date(),
+    )
+
+    app_settings = tta_cli.load_settings(None)
+    app_settings["-PORTFOLIO_MODE-"] = False
+    strategy_settings = tta_cli.get_strategy_settings(files, app_settings)
+    tta.validate_strategy_settings(strategy_settings)
+
+    print("Serial run of one log", file=sys.stderr)
+    serial = tta.run_analysis_threaded(
+        files[:1], strategy_settings, False, output_format="XLSX"
+    )
+    tta.wait_for_heatmaps()
+    print("Parallel run of two logs", file=sys.stderr)
+    try:
+        parallel = run_with_timeout(
+            args.timeout,
+            tta.run_analysis_threaded,
+            files,
+            strategy_settings,
+            False,
+            workers=2,
+            output_format="XLSX",
+        )
+    except TimeoutError as e:
+        print(f"Error: the analysis pool hung: {e}", file=sys.stderr)
+        sys.stderr.flush()
+        # exiting normally would wait on the hung workers
+        os._exit(1)
+    errors = get_errors()
+    for error in errors:
+        print(f"Error: {error}", file=sys.stderr)
+    if errors or not parallel:
+        return 1
+
+    source = os.path.splitext(os.path.basename(files[0]))[0]
+    for right_type, day_dict in serial.items():
+        for day, df_dict in day_dict.items():
+            if source not in df_dict:
+                continue
+            for key in ["org_df", "result_df"]:
+                pd.testing.assert_frame_equal(
+                    parallel[right_type][day][source][key], df_dict[source][key]
+                )
+    print("OK", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
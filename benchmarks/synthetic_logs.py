@@ -0,0 +1,305 @@
+"""
+Generates synthetic Option Omega and BYOB trade logs for benchmarking.
+
+The logs have the same columns as the ones the tools export, with put and
+call spreads entered on a 5 minute grid through the trading day.  The
+number of trading days grows with the number of trades, about 20 a day
+like the bundled logs, up to 10 years, after which the trades per day
+grow instead.  Every entry time has its own win rate so the heatmaps and
+top times are not flat.  The same size, format and seed always give the
+same log.
+
+Usage:
+    python benchmarks/synthetic_logs.py 100k [--format OO] [--output FILE]
+"""
+
+import argparse
+import os
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+LOG_FORMATS = ["BYOB", "OO"]
+START_DATE = "2014-01-02"
+TRADES_PER_DAY = 20
+MIN_DAYS = 250
+MAX_DAYS = 2520
+# trades formatted and written at a time so 10M trade logs fit in memory
+CHUNK_SIZE = 1_000_000
+# entry times from 9:35 to 15:55
+ENTRY_MINUTES = np.arange(9 * 60 + 35, 16 * 60, 5)
+
+
+def parse_size(size: str) -> int:
+    """
+    Returns the number of trades for a size such as 10000, 10k or 1.5M
+    """
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    size = size.strip().lower().replace("_", "")
+    if size[-1:] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+
+def get_synthetic_filename(path: str, num_trades: int, log_format: str) -> str:
+    return os.path.join(path, f"Synthetic-{log_format}-{num_trades}.csv")
+
+
+def generate_trades(num_trades: int, seed: int = 0) -> Tuple[pd.DataFrame, dict]:
+    """
+    Returns the entry day, entry minute, right, strikes and results of the
+    trades along with the labels of the trading days and entry times
+    """
+    rng = np.random.default_rng(seed)
+    num_days = int(np.clip(-(-num_trades // TRADES_PER_DAY), MIN_DAYS, MAX_DAYS))
+    days = pd.bdate_range(START_DATE, periods=num_days)
+
+    # spread the trades evenly over the days at random times
+    day = np.arange(num_trades) * num_days // num_trades
+    slot = rng.integers(0, len(ENTRY_MINUTES), num_trades)
+    order = np.lexsort((slot, day))
+    day, slot = day[order], slot[order]
+    is_put = rng.random(num_trades) < 0.5
+
+    # every entry time has its own edge
+    win_rate = np.clip(0.6 + rng.normal(0, 0.08, len(ENTRY_MINUTES)), 0.3, 0.85)
+    is_win = rng.random(num_trades) < win_rate[slot]
+    premium = np.round(rng.uniform(1.0, 4.0, num_trades) * 20) / 20
+    slippage = np.where(
+        is_win, 0.0, rng.choice([0.05, 0.1, 0.15, 0.2, 0.25], num_trades)
+    )
+    profit_loss = np.where(is_win, premium, -1.5 * premium)
+
+    # SPX drifts from day to day, strikes are on a 5 point grid
+    spx = 4000 + rng.normal(0, 30, num_days).cumsum()
+    short_strike = (
+        np.round(
+            (spx[day] + np.where(is_put, -1, 1) * rng.uniform(10, 60, num_trades)) / 5
+        )
+        * 5
+    )
+    width = rng.choice([30.0, 55.0], num_trades)
+    long_strike = short_strike + np.where(is_put, -width, width)
+
+    trades = pd.DataFrame(
+        {
+            "day": day,
+            "slot": slot,
+            "OptionType": np.where(is_put, "P", "C"),
+            "SPX": np.round(spx[day], 2),
+            "ShortStrike": short_strike,
+            "LongStrike": long_strike,
+            "Width": width,
+            "Premium": premium,
+            "IsWin": is_win,
+            "ProfitLoss": profit_loss,
+            "Slippage": slippage,
+            "CommissionFees": np.where(is_win, 3.2, 6.4),
+        }
+    )
+    hours, minutes = np.divmod(ENTRY_MINUTES, 60)
+    labels = {
+        "days": days,
+        "hours": hours,
+        "minutes": minutes,
+        "trades_per_day": np.bincount(day, minlength=num_days),
+    }
+    return trades, labels
+
+
+def generate_byob_log(trades: pd.DataFrame, labels: dict) -> pd.DataFrame:
+    days, hours, minutes = labels["days"], labels["hours"], labels["minutes"]
+    # format each day and entry time once, e.g. 1/3/2022 9:45:00 AM
+    day_labels = np.array([f"{d.month}/{d.day}/{d.year}" for d in days], dtype=object)
+    time_labels = np.array(
+        [
+            f"{(h - 1) % 12 + 1}:{m:02d}:00 {'AM' if h < 12 else 'PM'}"
+            for h, m in zip(hours, minutes)
+        ],
+        dtype=object,
+    )
+    entry_time = day_labels[trades["day"]] + " " + time_labels[trades["slot"]]
+    is_win = trades["IsWin"].to_numpy()
+    premium = trades["Premium"].to_numpy()
+
+    return pd.DataFrame(
+        {
+            "TradeID": 1_000_000 + trades.index.to_numpy(),
+            "EntryTime": entry_time,
+            "OptionType": trades["OptionType"],
+            "Delta": 0.0,
+            "ShortStrike": trades["ShortStrike"],
+            "LongStrike": trades["LongStrike"],
+            "Width": trades["Width"],
+            "Premium": premium,
+            "ProfitTarget": "P100",
+            "ProfitDateTime": "",
+            "ProfitPrice": "",
+            "StopLossDateTime": np.where(is_win, "", entry_time),
+            "StopLossTarget": "1.5x",
+            "StopLossPrice": np.where(is_win, np.nan, premium * 2.5),
+            "IsWin": is_win,
+            "Outcome": np.where(is_win, "Expiration", "Stop Loss"),
+            "ProfitLoss": trades["ProfitLoss"],
+            "ProfitLossAfterSlippage": np.round(
+                trades["ProfitLoss"] - trades["Slippage"], 2
+            ),
+            "CommissionFees": trades["CommissionFees"],
+            "Slippage": trades["Slippage"],
+            "LossMultiple": np.where(is_win, 0.0, 1.6),
+            "TradesToday": labels["trades_per_day"][trades["day"]],
+        }
+    )
+
+
+def generate_oo_log(
+    trades: pd.DataFrame, labels: dict, starting_funds: float = 100_000
+) -> pd.DataFrame:
+    days, hours, minutes = labels["days"], labels["hours"], labels["minutes"]
+    date_labels = np.array([d.strftime("%Y-%m-%d") for d in days], dtype=object)
+    expiry_labels = np.array(
+        [f"{d.strftime('%b')} {d.day}" for d in days], dtype=object
+    )
+    time_labels = np.array(
+        [f"{h:02d}:{m:02d}:00" for h, m in zip(hours, minutes)], dtype=object
+    )
+    day = trades["day"].to_numpy()
+    is_win = trades["IsWin"].to_numpy()
+    premium = trades["Premium"].to_numpy()
+    right = trades["OptionType"].to_numpy(dtype=object)
+
+    # e.g. 1 Jan 3 4770 P STO 2.50 | 1 Jan 3 4740 P BTO 0.30
+    legs = (
+        "1 "
+        + expiry_labels[day]
+        + " "
+        + trades["ShortStrike"].astype(int).astype(str).to_numpy(dtype=object)
+        + " "
+        + right
+        + " STO "
+        + np.char.mod("%.2f", premium + 0.3).astype(object)
+        + " | 1 "
+        + expiry_labels[day]
+        + " "
+        + trades["LongStrike"].astype(int).astype(str).to_numpy(dtype=object)
+        + " "
+        + right
+        + " BTO 0.30"
+    )
+    opening_fees = 1.6 * np.ones(len(trades))
+    closing_fees = trades["CommissionFees"].to_numpy() - opening_fees
+    pnl = np.round(
+        (trades["ProfitLoss"] - trades["Slippage"]).to_numpy() * 100
+        - opening_fees
+        - closing_fees,
+        2,
+    )
+    closing_cost = np.where(is_win, 0.0, premium * 2.5 + trades["Slippage"])
+
+    return pd.DataFrame(
+        {
+            "Date Opened": date_labels[day],
+            "Time Opened": time_labels[trades["slot"]],
+            "Opening Price": trades["SPX"],
+            "Legs": legs,
+            "Premium": np.round(premium * 100, 2),
+            "Closing Price": trades["SPX"],
+            "Date Closed": date_labels[day],
+            "Time Closed": np.where(is_win, "16:00:00", time_labels[trades["slot"]]),
+            "Avg. Closing Cost": np.round(closing_cost * 100, 2),
+            "Reason For Close": np.where(is_win, "Expired", "Stop Loss"),
+            "P/L": pnl,
+            "No. of Contracts": 1,
+            "Funds at Close": np.round(starting_funds + pnl.cumsum(), 2),
+            "Margin Req.": trades["Width"] * 100,
+            "Strategy": "Synthetic",
+            "Opening Commissions + Fees": opening_fees,
+            "Closing Commissions + Fees": closing_fees,
+        }
+    )
+
+
+def generate_spx_history(
+    start: str = "2000-01-03", end: str = "2035-12-31", seed: int = 0
+) -> pd.DataFrame:
+    """
+    Returns a random walk of the daily SPX Open and Close indexed by date so
+    the gaps can be calculated without downloading the history
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, end, name="Date")
+    close = 4000 + rng.normal(0, 30, len(dates)).cumsum()
+    return pd.DataFrame(
+        {"Open": close + rng.normal(0, 15, len(dates)), "Close": close}, index=dates
+    )
+
+
+def generate_trade_log(
+    num_trades: int, log_format: str = "BYOB", seed: int = 0
+) -> pd.DataFrame:
+    """
+    Returns a synthetic trade log with 'num_trades' trades in the format of
+    an Option Omega ("OO") or BYOB backtest export
+    """
+    trades, labels = generate_trades(num_trades, seed)
+    if log_format == "OO":
+        return generate_oo_log(trades, labels)
+    return generate_byob_log(trades, labels)
+
+
+def save_trade_log(
+    filename: str, num_trades: int, log_format: str = "BYOB", seed: int = 0
+) -> None:
+    """
+    Writes a synthetic trade log to a CSV, formatting the trades in chunks
+    """
+    trades, labels = generate_trades(num_trades, seed)
+    funds = 100_000
+    # write to a temp file first so an interrupted run is not reused
+    with open(f"{filename}.tmp", "w", newline="") as f:
+        for start in range(0, num_trades, CHUNK_SIZE):
+            chunk = trades.iloc[start : start + CHUNK_SIZE]
+            if log_format == "OO":
+                df = generate_oo_log(chunk, labels, funds)
+                funds = df["Funds at Close"].iloc[-1]
+            else:
+                df = generate_byob_log(chunk, labels)
+            df.to_csv(f, index=False, header=start == 0)
+    os.replace(f"{filename}.tmp", filename)
+
+
+def write_trade_log(
+    path: str, num_trades: int, log_format: str = "BYOB", seed: int = 0
+) -> str:
+    """
+    Writes a synthetic trade log to 'path' unless it was already generated
+    and returns its filename
+    """
+    filename = get_synthetic_filename(path, num_trades, log_format)
+    if not os.path.exists(filename):
+        os.makedirs(path, exist_ok=True)
+        save_trade_log(filename, num_trades, log_format, seed)
+    return filename
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="Generate a synthetic trade log for benchmarking"
+    )
+    arg_parser.add_argument("size", help="number of trades, e.g. 10000, 10k or 1M")
+    arg_parser.add_argument("--format", choices=LOG_FORMATS, default="BYOB")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument(
+        "--output", help="CSV to write, defaults to Synthetic-<format>-<size>.csv"
+    )
+    args = arg_parser.parse_args()
+
+    num_trades = parse_size(args.size)
+    filename = args.output or get_synthetic_filename(".", num_trades, args.format)
+    save_trade_log(filename, num_trades, args.format, args.seed)
+    print(f"Wrote {num_trades} trades to {filename}")
+
+
+if __name__ == "__main__":
+    main()
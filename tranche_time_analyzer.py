@@ -1,33 +1,44 @@
 import base64
+import concurrent.futures
 import ctypes
-import datetime as dt
-import functools
-import gc
 import os
 import json
-import platform
+import multiprocessing
 import queue
-import subprocess
 import threading
-import uuid
 import webbrowser
 from io import BytesIO
-from typing import Tuple
-import matplotlib
+from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
 import PySimpleGUI as sg
 from dateutil import parser
-from dateutil.relativedelta import relativedelta
-from openpyxl.utils import get_column_letter
 from PIL import Image, ImageTk
-import yfinance as yf
 from CSV_merger import main as csv_merger_window
+import tta_core as core
+from tta_core import (
+    results_queue,
+    cancel_flag,
+    weekday_list,
+    heatmap_output_formats,
+    news_events,
+    with_gc,
+    timed_stage,
+    append_stage_log,
+    get_top_times,
+    import_news_events,
+    import_spx_history,
+    get_news_event_mask,
+    find_and_import_news_events,
+    run_analysis_threaded,
+    set_default_app_settings,
+    update_strategy_settings,
+    validate_strategy_settings,
+    walk_forward_test,
+    calculate_summary_metrics,
+)
 import seaborn as sns
 
-matplotlib.use("TkAgg")
-import matplotlib.pyplot as plt
-
 # make app dpi aware
 try:
     ctypes.windll.shcore.SetProcessDpiAwareness(1)
@@ -60,42 +71,6 @@ screen_size = sg.Window.get_screen_size()
 image_aspect_ratio = 0.5
 
 
-# results queue for threads
-results_queue = queue.Queue()
-cancel_flag = threading.Event()
-
-weekday_list = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-analysis_options = {
-    "weekday_exclusions": [],
-    "put_or_call": True,
-    "idv_weekday": True,
-    "news_exclusions": [],
-}
-
-news_events = {
-    "CPI": [],
-    "Initial Jobless Claims": [],
-    "Retail Sales": [],
-    "ADP": [],
-    "JOLT": [],
-    "Unemployment/NFP": [],
-    "PPI": [],
-    "GDP": [],
-    "PCE": [],
-    "Triple Witching": [],
-    "Beige Book": [],
-    "ISM Manufacturing PMI": [],
-    "ISM Services PMI": [],
-    "S&P Global PMI": [],
-    "Fed Chair Speech": [],
-    "FOMC Minutes": [],
-    "FOMC": [],
-    "MI Consumer Sent.": [],
-    "Chicago PMI": [],
-}
-news_events_loaded = False
-
-
 # Allows custom checkbox icon
 class Checkbox(sg.Checkbox):
     elements = []
@@ -146,515 +121,12 @@ class Checkbox(sg.Checkbox):
         Checkbox.elements.clear()
 
 
-def with_gc(func):
-    """
-    Decorator to garbage collect threaded functions.
-    This resolves the Tcl_AsyncDelete error
-    """
-
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        result = func(*args, **kwargs)
-        gc.collect()
-        return result
-
-    return wrapper
-
-
-def analyze(
-    df: pd.DataFrame,
-    settings: dict,
-) -> Tuple[
-    pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame
-]:
-    if df.empty or settings["-PASSTHROUGH_MODE-"]:
-        return pd.DataFrame(columns=["Date Range"]), pd.DataFrame(
-            columns=["Date Range"]
-        )
-    short_avg_period = settings["-AVG_PERIOD_1-"]
-    long_avg_period = settings["-AVG_PERIOD_2-"]
-    short_weight = settings["-PERIOD_1_WEIGHT-"] / 100
-    long_weight = settings["-PERIOD_2_WEIGHT-"] / 100
-    calc_type = settings["-CALC_TYPE-"]
-    agg_type = "".join(word[0] for word in settings["-AGG_TYPE-"].split("-"))
-
-    def calculate_avg_pnl(df: pd.DataFrame) -> float:
-        if df.columns[0] == "Date Opened":  # OO BT data
-            return df["P/L"].sum() / df["No. of Contracts"].sum()
-        elif df.columns[0] == "TradeID":  # BYOB BT data
-            df["P/L"] = (
-                df["ProfitLossAfterSlippage"] - df["CommissionFees"] / 100
-            ) * 100
-            return df["P/L"].mean()
-        else:
-            raise ValueError("Unknown dataset type")
-
-    def calculate_pcr(df: pd.DataFrame) -> float:
-        if df.columns[0] == "Date Opened":  # OO BT data
-            return df["P/L"].sum() / (df["Premium"] * df["No. of Contracts"]).sum()
-        elif df.columns[0] == "TradeID":  # BYOB BT data
-            df["P/L"] = df["ProfitLossAfterSlippage"] - df["CommissionFees"] / 100
-            return df["P/L"].sum() / df["Premium"].sum()
-        else:
-            raise ValueError("Unknown dataset type")
-
-    def calculate_rolling_averages(df, short_avg_period, long_avg_period, agg_type):
-        if agg_type == "W":
-            short_avg_period = int(short_avg_period * 4.33)
-            long_avg_period = int(long_avg_period * 4.33)
-        elif agg_type == "SM":  # semi-monthly
-            short_avg_period = int(short_avg_period * 2)
-            long_avg_period = int(long_avg_period * 2)
-
-        short_avg = df.rolling(short_avg_period, min_periods=1).mean()
-        long_avg = df.rolling(long_avg_period, min_periods=1).mean()
-        weighted_avg = short_weight * short_avg + long_weight * long_avg
-        return weighted_avg
-
-    def create_output_labels(df, long_avg_period, start_date, end_date, agg_type):
-        output_labels = pd.DataFrame(index=df.index)
-        for i, (date, row) in enumerate(df.iterrows()):
-            if agg_type == "M":
-                current_period_end = date.to_timestamp() + pd.offsets.MonthEnd(1)
-                previous_period_start = (
-                    current_period_end - pd.DateOffset(months=long_avg_period - 1)
-                ).replace(day=1)
-            elif agg_type == "W":
-                current_period_end = date.to_timestamp() + pd.offsets.Week(weekday=6)
-                previous_period_start = current_period_end - pd.DateOffset(
-                    weeks=int(long_avg_period * 4.33)
-                )
-            elif agg_type == "SM":  # Semi-Monthly
-                if date.day <= 15:
-                    current_period_end = pd.Timestamp(date.year, date.month, 15)
-                    previous_period_start = current_period_end - pd.DateOffset(
-                        months=long_avg_period
-                    )
-                else:
-                    current_period_end = pd.Timestamp(
-                        date.year, date.month, date.days_in_month
-                    )
-                    previous_period_start = (
-                        current_period_end - pd.DateOffset(months=long_avg_period - 1)
-                    ).replace(day=1)
-                # if previous_period_start.day > 15:
-                #     previous_period_start = previous_period_start.replace(day=16)
-                # else:
-                #     previous_period_start = previous_period_start.replace(day=1)
-            else:
-                current_period_end = date.to_timestamp() + pd.offsets.DateOffset(
-                    freq=agg_type
-                )
-                previous_period_start = current_period_end - pd.DateOffset(
-                    freq=agg_type, periods=long_avg_period - 1
-                )
-
-            if i == 0:
-                date_range_label = f"{end_date} - {previous_period_start.date()}"
-            elif i == len(df) - 1:
-                date_range_label = f"{current_period_end.date()} - {start_date}"
-            else:
-                date_range_label = (
-                    f"{current_period_end.date()} - {previous_period_start.date()}"
-                )
-            output_labels.loc[date, "Date Range"] = date_range_label
-        return output_labels
-
-    def perform_analysis(df_grouped):
-        if calc_type == "PCR":
-            df_calc = df_grouped.apply(calculate_pcr, include_groups=False)
-        elif calc_type == "PnL":
-            df_calc = df_grouped.apply(calculate_avg_pnl, include_groups=False)
-        else:
-            raise ValueError("Invalid calc_type. Expected 'PCR' or 'PnL'.")
-
-        if isinstance(df_calc.index, pd.MultiIndex):
-            df_calc = df_calc.unstack(level=-1)
-
-        weighted_avg = calculate_rolling_averages(
-            df_calc, short_avg_period, long_avg_period, agg_type
-        )
-        one_month_avg = df_calc.rolling(
-            1 if agg_type == "M" else 2 if agg_type == "SM" else 4, min_periods=1
-        ).mean()
-
-        weighted_avg.sort_index(ascending=False, inplace=True)
-        one_month_avg.sort_index(ascending=False, inplace=True)
-
-        if isinstance(weighted_avg, pd.Series):
-            weighted_avg = weighted_avg.to_frame()
-
-        if calc_type == "PCR":
-            weighted_avg = weighted_avg.apply(lambda x: round(x, 4))
-            one_month_avg = one_month_avg.apply(lambda x: round(x, 4))
-        elif calc_type == "PnL":
-            weighted_avg = weighted_avg.apply(lambda x: round(x, 2))
-            one_month_avg = one_month_avg.apply(lambda x: round(x, 2))
-
-        output_labels = create_output_labels(
-            weighted_avg, long_avg_period, start_date, end_date, agg_type
-        )
-        one_month_avg_labels = create_output_labels(
-            one_month_avg, 1, start_date, end_date, agg_type
-        )
-
-        df_output = pd.concat([output_labels, weighted_avg], axis=1)
-        df_output_1mo_avg = pd.concat([one_month_avg_labels, one_month_avg], axis=1)
-
-        return df_output, df_output_1mo_avg
-
-    # get list of news event dates to skip.
-    news_date_exclusions = []
-    if settings["-APPLY_EXCLUSIONS-"] != "Walk Forward Test":
-        for release, date_list in news_events.items():
-            if release in settings["-NEWS_EXCLUSIONS-"]:
-                news_date_exclusions += date_list
-
-        # filter df for news exclusions
-        df = df[~df["EntryTime"].dt.date.isin(news_date_exclusions)]
-
-        # filter for weekday exlusions
-        df = df[~df["Day of Week"].isin(settings["-WEEKDAY_EXCLUSIONS-"])]
-
-    if agg_type == "SM":
-        # Custom function to create semi-monthly periods
-        def semi_monthly_period(date):
-            return pd.Timestamp(
-                date.year, date.month, 15 if date.day <= 15 else date.days_in_month
-            )
-
-        df["period"] = df["EntryTime"].apply(semi_monthly_period)
-        df_grouped_combined = df.groupby(["period", "Time"])
-    else:
-        df_grouped_combined = df.groupby(
-            [df["EntryTime"].dt.to_period(agg_type), "Time"]
-        )
-    start_date = df["EntryTime"].min().date()
-    end_date = df["EntryTime"].max().date()
-
-    if df.empty:
-        df_output_combined, df_output_1mo_avg_combined = pd.DataFrame(
-            columns=["Date Range"]
-        ), pd.DataFrame(columns=["Date Range"])
-    else:
-        df_output_combined, df_output_1mo_avg_combined = perform_analysis(
-            df_grouped_combined
-        )
-
-    return (
-        df_output_combined,
-        df_output_1mo_avg_combined,
-    )
-
-
-def create_excel_file(
-    file,
-    settings,
-    open_files,
-) -> dict:
-    calc_type = settings["-CALC_TYPE-"]
-    short_avg_period = settings["-AVG_PERIOD_1-"]
-    short_weight = settings["-PERIOD_1_WEIGHT-"] / 100
-    long_avg_period = settings["-AVG_PERIOD_2-"]
-    long_weight = settings["-PERIOD_2_WEIGHT-"] / 100
-    top_x = settings["-TOP_X-"]
-    weekday_exclusions = []
-    news_date_exclusions = []
-    if settings["-APPLY_EXCLUSIONS-"] != "Walk Forward Test":
-        weekday_exclusions = settings["-WEEKDAY_EXCLUSIONS-"]
-        # get list of news event dates to skip.
-        for release, date_list in news_events.items():
-            if release in settings["-NEWS_EXCLUSIONS-"]:
-                news_date_exclusions += date_list
-
-    # load the data
-    result = load_data(file)
-    if result:
-        df, start_date, end_date = result
-        filtered_df = df[
-            (~df["Day of Week"].isin(weekday_exclusions))
-            & (~df["EntryTime"].dt.date.isin(news_date_exclusions))
-        ]
-    else:
-        return
-
-    # path and orginal filename
-    path = os.path.join(os.path.dirname(file), "data", "heatmaps")
-    org_filename = os.path.splitext(os.path.basename(file))[0]
-    os.makedirs(path, exist_ok=True)
-
-    # Create filename
-    filename = os.path.join(
-        path,
-        (
-            f"{org_filename}-TWAvg({calc_type})_{short_avg_period}mo({short_weight * 100:.0f})-{long_avg_period}mo({long_weight * 100:.0f})_{start_date} -"
-            f" {end_date}.xlsx"
-        ),
-    )
-
-    # Create a Pandas Excel writer using XlsxWriter as the engine
-    with pd.ExcelWriter(filename, engine="xlsxwriter") as writer:
-
-        # Get the xlsxwriter workbook
-        workbook = writer.book
-
-        # get the sheets for day of week
-        day_to_num = {
-            "Monday": 1,
-            "Tuesday": 2,
-            "Wednesday": 3,
-            "Thursday": 4,
-            "Friday": 5,
-            "Saturday": 6,
-            "Sunday": 7,
-        }
-
-        days_sorted = ["All"]
-        if settings["-IDV_WEEKDAY-"]:
-            # This gets the unique days of the week from the DataFrame, then sorts them based on the numerical value
-            days_sorted = days_sorted + sorted(
-                [
-                    d
-                    for d in filtered_df["Day of Week"].unique()
-                    if d not in settings["-WEEKDAY_EXCLUSIONS-"]
-                ],
-                key=lambda day: day_to_num[day],
-            )
-
-        df_dicts = {"Put-Call Comb": {}}
-        if settings["-PUT_OR_CALL-"]:
-            df_dicts["Puts"] = {}
-            df_dicts["Calls"] = {}
-
-        if settings["-GAP_ANALYSIS-"]:
-            for strat in df_dicts.copy():
-                df_dicts[f"{strat} Gap Up"] = {}
-                df_dicts[f"{strat} Gap Down"] = {}
-
-        gap_error = False
-        for strat in df_dicts.copy():
-            for day in days_sorted:
-                # check for cancel flag to stop thread
-                if cancel_flag.is_set():
-                    return
-
-                # filter for the weekday
-                # we will keep a dataset with exlusions filtered out and one
-                # with all the data.  We will sort and filter those both for
-                # the analysis but the analysis will only happen on the filtered df
-                # this will allow us to store either the filtered df that has the
-                # exclusions removed or the original df that was filtered for the analysis
-                # type, but still has the excluded events.  This filtered, but non-excluded
-                # df will be what is used for the WF test.  This allows events/weekday exclusions
-                # to be done for analysis only, but still traded during the WF test.
-                if day == "All":
-                    _df = df
-                    _filtered_df = filtered_df
-                else:
-                    _df = df[df["Day of Week"] == day]
-                    _filtered_df = filtered_df[filtered_df["Day of Week"] == day]
-
-                # filter for calls/puts
-                if strat.startswith("Puts"):
-                    _df = _df[_df["OptionType"] == "P"]
-                    _filtered_df = _filtered_df[_filtered_df["OptionType"] == "P"]
-                elif strat.startswith("Calls"):
-                    _df = _df[_df["OptionType"] == "C"]
-                    _filtered_df = _filtered_df[_filtered_df["OptionType"] == "C"]
-
-                # filter for gaps
-                _gap_type = "Gap%" if settings["-GAP_TYPE-"] == "%" else "Gap"
-                try:
-                    if strat.endswith("Gap Up"):
-                        _df = _df[_df[_gap_type] > settings["-GAP_THRESHOLD-"]]
-                        _filtered_df = _filtered_df[
-                            _filtered_df[_gap_type] > settings["-GAP_THRESHOLD-"]
-                        ]
-                    elif strat.endswith("Gap Down"):
-                        _df = _df[_df[_gap_type] < -settings["-GAP_THRESHOLD-"]]
-                        _filtered_df = _filtered_df[
-                            _filtered_df[_gap_type] < -settings["-GAP_THRESHOLD-"]
-                        ]
-                except KeyError:
-                    # gap data did not load, maybe no internet
-                    _df = pd.DataFrame(columns=df.columns)
-                    _filtered_df = pd.DataFrame(columns=df.columns)
-                    if not gap_error:
-                        gap_error = True  # only notify once
-                        results_queue.put(
-                            (
-                                "-ERROR-",
-                                "Gap data could not be loaded!\nAnalysis will continue without it.",
-                            )
-                        )
-
-                # run the analysis
-                if settings["-APPLY_EXCLUSIONS-"] != "Walk Forward Test":
-                    # exclusions are only for WF, so use the non-filtered df
-                    df_output, df_output_1mo_avg = analyze(_df, settings)
-                    # store the results and the original df in case we need it later
-                    df_dicts[strat][day[:3]] = {"org_df": _df, "result_df": df_output}
-                else:
-                    # otherwise we use the filtered/excluded df for analysis
-                    df_output, df_output_1mo_avg = analyze(_filtered_df, settings)
-                    # store the results and the original df in case we need it later
-                    if settings["-APPLY_EXCLUSIONS-"] == "Analysis":
-                        # since we are only excluded from analysis we will store the non-filtered df
-                        df_dicts[strat][day[:3]] = {
-                            "org_df": _df,
-                            "result_df": df_output,
-                        }
-                    else:
-                        # otherwise we are exluding from both so we can should store the filtered df
-                        df_dicts[strat][day[:3]] = {
-                            "org_df": _filtered_df,
-                            "result_df": df_output,
-                        }
-
-                # create the sheets
-                if not settings["-PASSTHROUGH_MODE-"]:
-                    df_output.to_excel(
-                        writer, sheet_name=f"{strat}_{day[:3]}", index=False
-                    )
-                    df_output_1mo_avg.to_excel(
-                        writer, sheet_name=f"{strat}_1mo-{day[:3]}", index=False
-                    )
-
-        # use All df from Put/Call Combined for row and col lengths
-        df_output = df_dicts["Put-Call Comb"]["All"]["result_df"]
-        # Set the PCR columns to percentage format
-        percent_format = workbook.add_format({"num_format": "0.00%", "align": "center"})
-        top_x_format = workbook.add_format(
-            {"bold": 1, "font_color": "#FFFFFF"}
-        )  # white
-        for row in range(
-            2, len(df_output) + 2
-        ):  # +2 because Excel's index starts from 1 and there is a header row
-            for worksheet in writer.sheets.values():
-                # Apply a conditional format to the PCR cells in the current row
-                worksheet.conditional_format(
-                    f"B{row}:{get_column_letter(len(df_output.columns))}{row}",
-                    {
-                        "type": "3_color_scale",
-                        "min_color": "red",
-                        "mid_color": "yellow",
-                        "max_color": "green",
-                    },
-                )
-                # Format top x values in bold white text
-                if top_x > 0:
-                    worksheet.conditional_format(
-                        f"B{row}:{get_column_letter(len(df_output.columns))}{row}",
-                        {
-                            "type": "top",
-                            "value": top_x,
-                            "format": top_x_format,
-                        },
-                    )
-                if calc_type == "PCR":
-                    worksheet.set_row(row - 1, None, percent_format)
-
-        # Adjust the column widths
-        for column in df_output:
-            column_length = max(
-                df_output[column].astype(str).map(len).max() + 1, len(column) + 1
-            )
-            col_idx = df_output.columns.get_loc(column)
-            for worksheet in writer.sheets.values():
-                worksheet.set_column(col_idx, col_idx, column_length)
-
-    # open file in excel
-    if open_files:
-        try:
-            if platform.system() == "Windows":
-                os.startfile(filename)
-            elif platform.system() == "Darwin":  # This is the value returned for macOS
-                subprocess.Popen(["open", filename])
-            else:
-                subprocess.call(("xdg-open", filename))  # linux
-        except:
-            pass
-
-    return df_dicts
-
-
 def chunk_list(input_list, chunk_size=4):
     return [
         input_list[i : i + chunk_size] for i in range(0, len(input_list), chunk_size)
     ]
 
 
-def export_oo_sig_file(trade_log_df: pd.DataFrame, filename: str):
-    """
-    Takes a trade log df and converts to an
-    Option Omega signal file that can be loaded
-    into OO for backtesting and adding to OO portfolio
-    """
-    signal_data = []
-    for _, trade in trade_log_df.iterrows():
-        if "Legs" in trade and isinstance(trade["Legs"], str):
-            # OO data processing (unchanged)
-            legs = trade["Legs"].split("|")
-            for leg in legs:
-                leg_parts = leg.strip().split(" ")
-                signal_data.append(
-                    {
-                        "OPEN_DATETIME": (
-                            trade["Date Opened"].strftime("%Y-%m-%d")
-                            + " "
-                            + trade["Time Opened"][:5]
-                        ),
-                        "BUY_SELL": "B" if leg_parts[5] == "BTO" else "S",
-                        "CALL_PUT": leg_parts[4],
-                        "STRIKE": leg_parts[3],
-                        "EXPIRATION": trade["Date Opened"].strftime("%Y-%m-%d"),
-                        "QUANTITY": int(leg_parts[0]) * trade["qty"],
-                    }
-                )
-        else:
-            # BYOB data processing
-            open_datetime = trade["EntryTime"].strftime("%Y-%m-%d %H:%M")
-
-            # Handle close datetime
-            if pd.notnull(trade["CloseDate"]) and pd.notnull(trade["CloseTime"]):
-                close_datetime = f"{trade['CloseDate']} {trade['CloseTime'][:5]}"
-            else:
-                # Use OpenDate and set time to 16:00 if CloseDate or CloseTime is missing
-                close_datetime = f"{trade['OpenDate']} 16:00"
-
-            signal_data.append(
-                {
-                    "OPEN_DATETIME": open_datetime,
-                    "BUY_SELL": "S",  # We'll do short for the first leg
-                    "CALL_PUT": trade["OptionType"],
-                    "STRIKE": trade["ShortStrike"],
-                    "EXPIRATION": trade["OpenDate"],
-                    "QUANTITY": trade["qty"],
-                }
-            )
-            signal_data.append(
-                {
-                    "OPEN_DATETIME": open_datetime,
-                    "BUY_SELL": "B",  # We'll do long for the second leg
-                    "CALL_PUT": trade["OptionType"],
-                    "STRIKE": trade["LongStrike"],
-                    "EXPIRATION": trade["OpenDate"],
-                    "QUANTITY": trade["qty"],
-                }
-            )
-
-    path = os.path.dirname(filename)
-    basename = os.path.basename(filename)
-    result_df = pd.DataFrame(signal_data)
-    result_df.to_csv(filename, index=False)  # full signal file with puts and calls
-    for right in ["Puts", "Calls"]:  # separate signal files
-        fitlered = result_df[result_df["CALL_PUT"] == right[0]]
-        file_path = os.path.join(path, f"{right}_{basename}")
-        fitlered.to_csv(file_path, index=False)
-
-    return result_df
-
-
 def get_dpi_scale():
     try:
         user32 = ctypes.windll.user32
@@ -678,6 +150,26 @@ def format_float(value):
         return str(value)
 
 
+def load_chart_image(buf: BytesIO) -> Image.Image:
+    """
+    Takes a buffer with a chart saved as PNG and returns the decoded image
+    """
+    buf.seek(0)
+    image = Image.open(buf)
+    image.load()
+    return image
+
+
+def save_chart_image(fig: Figure, **kwargs) -> Image.Image:
+    """
+    Renders the figure with Agg and returns the chart as a decoded image
+    so it can be kept in memory
+    """
+    buf = BytesIO()
+    fig.savefig(buf, dpi=150, **kwargs)
+    return load_chart_image(buf)
+
+
 @with_gc
 def get_correlation_matrix(results):
     # Create a DataFrame with daily PnL for each strategy
@@ -688,40 +180,46 @@ def get_correlation_matrix(results):
     corr_matrix = pnl_df.corr()
 
     # Create a heatmap
-    plt.figure(figsize=(8, 5))
-    sns.heatmap(corr_matrix, annot=True, cmap="coolwarm", vmin=-1, vmax=1, center=0)
-    plt.title("Strategy Correlation Matrix")
+    fig = Figure(figsize=(8, 5))
+    ax = fig.subplots()
+    sns.heatmap(
+        corr_matrix, annot=True, cmap="coolwarm", vmin=-1, vmax=1, center=0, ax=ax
+    )
+    ax.set_title("Strategy Correlation Matrix")
 
     # Rotate x-axis labels
-    plt.xticks(rotation=30, ha="right")
+    ax.tick_params(axis="x", labelrotation=30)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment("right")
 
     # Rotate y-axis labels
-    plt.yticks(rotation=0, ha="right")
+    ax.tick_params(axis="y", labelrotation=0)
+    for label in ax.get_yticklabels():
+        label.set_horizontalalignment("right")
 
     # Adjust layout to prevent cutting off labels
-    plt.tight_layout()
-
-    # Save the plot to a buffer
-    buf = BytesIO()
-    plt.savefig(buf, format="png", dpi=150, bbox_inches="tight")
-    buf.seek(0)
-
-    # Convert the image to base64
-    img_str = base64.b64encode(buf.getvalue())
-    plt.close()
+    fig.tight_layout()
 
-    return img_str
+    return save_chart_image(fig, format="png", bbox_inches="tight")
 
 
 @with_gc
 def get_monthly_pnl_chart(results):
-    plt.figure(figsize=(12, 6))
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+
+    # Group the PnL of each strategy by month
+    monthly_pnls = {
+        strategy: df.groupby(pd.to_datetime(df["Date"]).dt.to_period("M"))[
+            "Day PnL"
+        ].sum()
+        for strategy, df in results.items()
+    }
 
     # Get all unique months across all strategies
     all_months = set()
-    for df in results.values():
-        df["Date"] = pd.to_datetime(df["Date"])
-        all_months.update(df["Date"].dt.to_period("M"))
+    for monthly_pnl in monthly_pnls.values():
+        all_months.update(monthly_pnl.index)
     all_months = sorted(list(all_months))
 
     # Set up the x-axis
@@ -729,123 +227,85 @@ def get_monthly_pnl_chart(results):
     width = 0.8 / len(results)  # Adjust bar width based on number of strategies
 
     # Plot bars for each strategy
-    for i, (strategy, df) in enumerate(results.items()):
-        monthly_pnl = df.groupby(df["Date"].dt.to_period("M"))["Day PnL"].sum()
-
+    for i, (strategy, monthly_pnl) in enumerate(monthly_pnls.items()):
         # Align the strategy's data with all_months
         pnl_values = [monthly_pnl.get(month, 0) for month in all_months]
 
-        plt.bar(x + i * width, pnl_values, width, label=strategy, alpha=0.8)
+        ax.bar(x + i * width, pnl_values, width, label=strategy, alpha=0.8)
 
-    plt.title("Monthly PnL")
-    plt.xlabel("Month")
-    plt.ylabel("PnL")
-    plt.legend()
+    ax.set_title("Monthly PnL")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("PnL")
+    ax.legend()
 
     # Set x-axis ticks
-    plt.xticks(
+    ax.set_xticks(
         x + width * (len(results) - 1) / 2,
         [m.strftime("%Y-%m") for m in all_months],
         rotation=45,
         ha="right",
     )
 
-    plt.tight_layout()
-    # buffer for saving data
-    buf = BytesIO()
-    plt.savefig(buf, dpi=150, bbox_inches="tight")
-    buf.seek(0)
-    # Convert PNG to base64 string
-    img_str = base64.b64encode(buf.getvalue())
-    plt.close()
-    return img_str
+    fig.tight_layout()
+    return save_chart_image(fig, bbox_inches="tight")
 
 
-@with_gc
-def get_pnl_plot(results):
+def get_pnl_table(results) -> list:
+    """
+    Returns the rows of the walk forward summary table, one per strategy
+    """
     table_data = []
-    plt.figure(figsize=(8, 4))
     for strategy, df in results.items():
-        plt.plot(df["Date"], df["Current Value"], label=strategy)
         # Calculate summary statistics for the strategy
-        final_value = df["Current Value"].iloc[-1]
-        max_dd = df["Max DD"].max()
-        dd_days = df["DD Days"].max()
-        initial_value = df["Initial Value"].min()
-        total_return = (final_value - initial_value) / initial_value
-        win_streak = df["Win Streak"].max()
-        loss_streak = df["Loss Streak"].max()
-        # CAGR
-        start_dt = df["Date"].iloc[0]
-        end_dt = df["Date"].iloc[-1]
-        years = (end_dt - start_dt).days / 365.25
-        cagr = ((final_value / initial_value) ** (1 / years)) - 1
-
-        # Sharpe Ratio
-        df["Daily Return"] = df["Current Value"].pct_change()
-        std_dev = df["Daily Return"].std()
-        risk_free_rate = 0.02 / 252  # Assume 2% annual risk-free rate, convert to daily
-        excess_returns = df["Daily Return"] - risk_free_rate
-        sharpe_ratio = np.sqrt(252) * excess_returns.mean() / std_dev  # Annualized
-
-        if max_dd:
-            mar = cagr / max_dd
-        else:
-            mar = float("inf")
-
-        # Group PnL by month
-        df["YearMonth"] = df["Date"].dt.to_period("M")
-        monthly_pnl = df.groupby("YearMonth")["Day PnL"].sum()
-
-        # Calculate largest and lowest monthly PnL with their corresponding dates
-        largest_monthly_pnl = monthly_pnl.max()
-        largest_monthly_pnl_date = monthly_pnl.idxmax().to_timestamp()
-        lowest_monthly_pnl = monthly_pnl.min()
-        lowest_monthly_pnl_date = monthly_pnl.idxmin().to_timestamp()
+        metrics = calculate_summary_metrics(df)
 
         # Format the date strings
         largest_monthly_pnl_str = (
-            f"{largest_monthly_pnl:,.2f} {largest_monthly_pnl_date.strftime('%b%y')}"
+            f"{metrics["Largest Monthly PnL"]:,.2f}"
+            f" {metrics["Largest Monthly PnL Date"].strftime('%b%y')}"
         )
         lowest_monthly_pnl_str = (
-            f"{lowest_monthly_pnl:,.2f} {lowest_monthly_pnl_date.strftime('%b%y')}"
+            f"{metrics["Lowest Monthly PnL"]:,.2f}"
+            f" {metrics["Lowest Monthly PnL Date"].strftime('%b%y')}"
         )
 
         # Create row for Table
         row_data = [
             f"{strategy}",
-            f"{final_value:,.2f}",
-            f"{(final_value - initial_value):,.2f}",
-            f"{total_return:,.2%}",
-            f"{cagr:.2%}",
-            f"{max_dd:.2%}",
-            f"{dd_days}",
-            f"{win_streak}",
-            f"{loss_streak}",
+            f"{metrics["Final Value"]:,.2f}",
+            f"{metrics["Net PnL"]:,.2f}",
+            f"{metrics["Total Return"]:,.2%}",
+            f"{metrics["CAGR"]:.2%}",
+            f"{metrics["Max DD"]:.2%}",
+            f"{metrics["DD Days"]}",
+            f"{metrics["Win Streak"]}",
+            f"{metrics["Loss Streak"]}",
             largest_monthly_pnl_str,
             lowest_monthly_pnl_str,
-            f"{mar:.2f}",
-            f"{sharpe_ratio:.2f}",
+            f"{metrics["MAR"]:.2f}",
+            f"{metrics["Sharpe"]:.2f}",
         ]
 
         table_data.append(row_data)
 
-    plt.title("P/L Walk Forward Test")
-    plt.xlabel("Date")
-    plt.ylabel("Current Value")
-    plt.legend()
-    plt.grid(True)
-    # plt.xticks(rotation=45)
-    plt.tight_layout()
+    return table_data
 
-    # buffer for saving data
-    buf = BytesIO()
-    plt.savefig(buf, dpi=150)
-    buf.seek(0)
-    # Convert PNG to base64 string
-    img_str = base64.b64encode(buf.getvalue())
-    plt.close()
-    return table_data, img_str
+
+@with_gc
+def get_pnl_plot(results):
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
+    for strategy, df in results.items():
+        ax.plot(df["Date"], df["Current Value"], label=strategy)
+
+    ax.set_title("P/L Walk Forward Test")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Current Value")
+    ax.legend()
+    ax.grid(True)
+    fig.tight_layout()
+
+    return save_chart_image(fig)
 
 
 @with_gc
@@ -860,22 +320,19 @@ def get_news_event_pnl_chart(results, sum=True):
 
     # Sum the PnL values for each strategy and news event
     for strategy, df in results.items():
-        for event, dates in news_events.items():
-            event_dates = pd.to_datetime(dates)
+        for event in news_events:
+            event_mask = get_news_event_mask(df["Date"], [event])
             if sum:
-                event_pnl = df[df["Date"].dt.date.isin(event_dates.date)][
-                    "Day PnL"
-                ].sum()
+                event_pnl = df[event_mask]["Day PnL"].sum()
             else:
-                event_pnl = df[df["Date"].dt.date.isin(event_dates.date)][
-                    "Day PnL"
-                ].mean()
+                event_pnl = df[event_mask]["Day PnL"].mean()
             summed_pnls[strategy][event] = event_pnl
 
     # Prepare data for the bar chart
     x = np.arange(len(events))  # the label locations
     width = 0.8 / len(results)
-    fig, ax = plt.subplots(figsize=(10, 5))
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
 
     # Plot bars for each strategy
     for i, (strategy, pnl_dict) in enumerate(summed_pnls.items()):
@@ -894,15 +351,8 @@ def get_news_event_pnl_chart(results, sum=True):
     ax.legend(loc="upper center", bbox_to_anchor=(0.5, 1.25), ncol=min(len(results), 4))
 
     fig.subplots_adjust(bottom=0.3)
-    plt.tight_layout()
-    # buffer for saving data
-    buf = BytesIO()
-    plt.savefig(buf, dpi=150, bbox_inches="tight")
-    buf.seek(0)
-    # Convert PNG to base64 string
-    img_str = base64.b64encode(buf.getvalue())
-    plt.close()
-    return img_str
+    fig.tight_layout()
+    return save_chart_image(fig, bbox_inches="tight")
 
 
 @with_gc
@@ -924,7 +374,8 @@ def get_weekday_pnl_chart(results):
     x = np.arange(len(weekdays))  # the label locations
     width = 0.8 / len(results)
 
-    fig, ax = plt.subplots(figsize=(10, 5))
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
 
     # Plot bars for each strategy
     for i, (strategy, pnl_dict) in enumerate(summed_pnls.items()):
@@ -940,374 +391,89 @@ def get_weekday_pnl_chart(results):
         loc="upper center", bbox_to_anchor=(0.5, -0.15), ncol=min(len(results), 4)
     )
     fig.subplots_adjust(bottom=0.2)
-    plt.tight_layout()
-    # buffer for saving data
-    buf = BytesIO()
-    plt.savefig(buf, dpi=150, bbox_inches="tight")
-    buf.seek(0)
-    # Convert PNG to base64 string
-    img_str = base64.b64encode(buf.getvalue())
-    plt.close()
-    return img_str
-
-
-def get_spx_gaps(start_date, end_date):
-    start = start_date - dt.timedelta(
-        10
-    )  # make sure we get a few days before for calcs
-    end = end_date + dt.timedelta(1)  # make sure we get the end date
-    spx = yf.Ticker("^SPX")
-    spx_history = spx.history(start=start, end=end, interval="1d")
-    spx_history["Gap"] = spx_history["Open"] - spx_history["Close"].shift(1)
-    spx_history["Gap%"] = spx_history["Gap"] / spx_history["Close"].shift(1) * 100
-    return spx_history
-
-
-def get_top_times(
-    df_dict, strategy_settings, date: dt.datetime.date = None, top_n_override=0
-) -> pd.DataFrame:
-    portfolio_mode = "-SINGLE_MODE-" not in strategy_settings
-    all_top_values = []
-    top_n = 0
-    # Iterate over each DataFrame in the dictionary
-    for source, _df_dict in df_dict.items():
-        strategy = "-SINGLE_MODE-" if not portfolio_mode else f"{source}.csv"
-        try:
-            settings = strategy_settings[strategy]
-        except KeyError:
-            # this is probably the separate put/call analysis we need to parse the source file
-            strategy = f"{source.split('||')[1]}.csv"
-            settings = strategy_settings[strategy]
-
-        agg_type = "".join(word[0] for word in settings["-AGG_TYPE-"].split("-"))
-        top_n = top_n_override if top_n_override else int(settings["-TOP_X-"])
-        calc_type = settings["-CALC_TYPE-"]
-        threshold = settings["-TOP_TIME_THRESHOLD-"] / 100
-        df_orig = _df_dict["result_df"]
-
-        if not date:
-            df = df_orig.copy()
-        else:
-            date_timestamp = pd.Timestamp(date)
-            if agg_type == "SM":
-                # For semi-monthly, we need to check if the date is in the first or second half of the month
-                if date_timestamp.day <= 15:
-                    period_start = date_timestamp.replace(day=1)
-                    period_end = date_timestamp.replace(day=15)
-                else:
-                    period_start = date_timestamp.replace(day=16)
-                    period_end = date_timestamp.replace(
-                        day=date_timestamp.days_in_month
-                    )
-                df = df_orig.loc[
-                    (df_orig.index >= period_start) & (df_orig.index <= period_end), :
-                ]
-            else:
-                period = pd.Period(date_timestamp, freq=agg_type)
-                # df = df_orig.loc[df_orig.index == period, :]
-                # this change allows to select the next available period in case the
-                # current period is missing due to having some exclusions at that time.
-                df = df_orig.loc[df_orig.index <= period, :].head(1)
+    fig.tight_layout()
+    return save_chart_image(fig, bbox_inches="tight")
 
-        if df.index.name != "Date Range":
-            df.set_index("Date Range", inplace=True)
 
-        # Extract the first row of values
-        try:
-            if df.empty:
-                continue
-            first_row_values = df.iloc[0]
-        except IndexError:
-            # missing data for this month
-            continue
-
-        # Filter and sort the values in descending order and select the top n
-        top_values = (
-            first_row_values[first_row_values >= threshold]
-            .sort_values(ascending=False)
-            .head(top_n)
-        )
-
-        # Format values based on calc_type and add to the list of all top values
-        for time, value in top_values.items():
-            formatted_value = (
-                f"{value:.2f}" if calc_type == "PnL" else f"{value * 100:.2f}%"
-            )
-            all_top_values.append(
-                {
-                    "Top Times": time,
-                    "Values": formatted_value,
-                    "Source": source,
-                    "RawValue": value,  # Keep raw value for sorting
-                }
-            )
-
-    # Convert the list to a DataFrame
-    if all_top_values:
-        result_df = pd.DataFrame(all_top_values)
-    else:
-        # empty
-        result_df = pd.DataFrame(columns=["Top Times", "Values", "Source", "RawValue"])
-
-    if not portfolio_mode:
-        # Sort all values based on RawValue and select the overall top n
-        result_df = result_df.loc[result_df.groupby("Top Times")["RawValue"].idxmax()]
-        result_df = result_df.sort_values("RawValue", ascending=False).head(top_n)
-
-    # Drop the RawValue column as it's no longer needed
-    result_df = result_df.drop(columns=["RawValue"])
-
-    return result_df
-
-
-def import_news_events(filename) -> bool:
-    global news_events
+@with_gc
+def render_charts_threaded(results, portfolio_mode) -> None:
     """
-    Import CSV downloaded from https://www.fxstreet.com/economic-calendar
-    populates the dates for the releases in 'news_events' dict
+    Draws the walk forward charts concurrently and posts each one to
+    'results_queue' as soon as it is done
     """
+    charts = {
+        "-PNL_CHART-": (get_pnl_plot, results),
+        "-WEEKDAY_PNL_CHART-": (get_weekday_pnl_chart, results),
+        "-MONTHLY_PNL_CHART-": (get_monthly_pnl_chart, results),
+        "-NEWS_PNL_CHART-": (get_news_event_pnl_chart, results),
+        "-NEWS_AVG_PNL_CHART-": (get_news_event_pnl_chart, results, False),
+    }
+    if portfolio_mode:
+        charts["-CORRELATION_MATRIX-"] = (get_correlation_matrix, results)
 
-    def get_triple_witching_dates(
-        start_year: int = 2000, end_year: int = dt.datetime.now().year
-    ):
-        """
-        These are not in the calendar and must be calculated
-        Triple witching ocurrs on the third friday of March, June, Sept, Dec
-        """
-        triple_witching_dates = []
-
-        for year in range(start_year, end_year + 1):
-            for month in [3, 6, 9, 12]:  # March, June, September, December
-                # Get the first day of the month
-                first_day = dt.datetime(year, month, 1)
-
-                # Find the first Friday
-                friday = first_day + dt.timedelta(
-                    days=(4 - first_day.weekday() + 7) % 7
-                )
+    def render_chart(chart, func, *args):
+        with timed_stage("render_chart", chart=chart.strip("-")):
+            return func(*args)
 
-                # Get the third Friday
-                third_friday = friday + dt.timedelta(weeks=2)
-
-                triple_witching_dates.append(third_friday.date())
-
-        return triple_witching_dates
-
-    def get_event(name):
-        """
-        Helper function to add news_event column to the df
-        """
-        keyword_dict = {
-            "Consumer Price Index": "CPI",
-            "Nonfarm Payrolls": "NFP",
-            "ADP Employment": "ADP",
-            "Initial Jobless Claims": "Initial Jobless Claims",
-            "Retail Sales": "Retail Sales",
-            "JOLT": "JOLT",
-            "Unemployment": "Unemployment/NFP",
-            "Producer Price Index": "PPI",
-            "Gross Domestic Product": "GDP",
-            "Personal Consumption Expenditures": "PCE",
-            "Beige Book": "Beige Book",
-            "ISM Manufacturing PMI": "ISM Manufacturing PMI",
-            "ISM Services PMI": "ISM Services PMI",
-            "Fed's Chair": "Fed Chair Speech",
-            "FOMC Minutes": "FOMC Minutes",
-            "Fed Interest Rate Decision": "FOMC",
-            "Michigan Consumer Sentiment Index": "MI Consumer Sent.",
-            "Chicago Purchasing": "Chicago PMI",
-            "Chicago PMI": "Chicago PMI",
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(charts)) as executor:
+        futures = {
+            executor.submit(render_chart, chart, *chart_args): chart
+            for chart, chart_args in charts.items()
         }
-
-        if "S&P" in name and "PMI" in name:
-            return "S&P Global PMI"
-        else:
-            for keyword, event in keyword_dict.items():
-                if keyword in name:
-                    return event
-            return ""
-
-    # load csv, config dates and filter for US events
-    try:
-        df = pd.read_csv(filename)
-    except Exception as e:
-        return False
-    if (
-        "Start" not in df.columns
-        or "Currency" not in df.columns
-        or "Name" not in df.columns
-    ):
-        return False
-    df.drop_duplicates(inplace=True)
-    df["Start"] = pd.to_datetime(df["Start"])
-    df = df[df["Currency"] == "USD"]
-    df["news_event"] = df["Name"].apply(get_event)
-
-    for news_event in news_events:
-        if news_event == "Triple Witching":
-            news_events[news_event] = get_triple_witching_dates()
-        else:
-            filtered_df = df[df["news_event"] == news_event]
-            news_events[news_event] = sorted(filtered_df["Start"].dt.date.to_list())
-
-    return True
-
-
-def find_and_import_news_events():
-    global news_events_loaded
-    best_file = None
-    max_rows = 0
-    required_columns = set(["Id", "Start", "Name", "Impact", "Currency"])
-
-    # Loop through all files in the current directory
-    for filename in os.listdir("."):
-        if filename.endswith(".csv"):
+        for future in concurrent.futures.as_completed(futures):
+            chart = futures[future]
             try:
-                # Try to read the CSV file
-                df = pd.read_csv(filename)
-
-                # Check if the required columns are present
-                if set(df.columns) == required_columns:
-                    rows = len(df)
-
-                    # If this is the first valid file or has more rows than the previous best
-                    if best_file is None or rows > max_rows:
-                        best_file = filename
-                        max_rows = rows
+                chart_image = future.result()
             except Exception as e:
-                # If there's an error reading the file, skip it
+                # report the chart that failed and keep the others coming
+                chart_name = (
+                    chart.strip("-").replace("_", " ").title().replace("Pnl", "PnL")
+                )
+                results_queue.put(
+                    ("-ERROR-", f"The {chart_name} could not be drawn:\n{e}")
+                )
                 continue
-
-    # If a valid file was found, import the news events
-    if best_file:
-        success = import_news_events(best_file)
-        if success:
-            news_events_loaded = True
-            results_queue.put(
-                ("-IMPORT_NEWS-", "News event list found and loaded sucessuflly!")
-            )
-            return
-    results_queue.put(
-        (
-            "-IMPORT_NEWS-",
-            "Could not locate news event csv.\nPlease select under options if needed",
-        )
-    )
+            results_queue.put(("-CHART-", (chart, chart_image)))
 
 
-def get_next_filename(path: str, base: str, ext: str) -> str:
+def format_stage_totals(stage_totals: dict, peak_rss_mb: float) -> str:
     """
-    Takes a path, base name, and extension.
-    Checks if a filename already exists with that filename
-    Adds (x) to the filename and returns the complete filename path
+    Returns the total time of each stage of a run, slowest first, and the
+    peak memory used
     """
-    # Create filename
-    filename = os.path.join(path, f"{base}{ext}")
-    counter = 1
-    while os.path.exists(filename):
-        filename = os.path.join(path, f"{base}({counter}){ext}")
-        counter += 1
-    return filename
+    stages = sorted(stage_totals.items(), key=lambda stage: stage[1], reverse=True)
+    text = "  ".join(f"{stage} {seconds:.1f}s" for stage, seconds in stages)
+    if peak_rss_mb:
+        text += f"  peak {peak_rss_mb:.0f}MB"
+    return text
 
 
-def is_BYOB_data(df: pd.DataFrame) -> bool:
-    return df.columns[0] == "TradeID"
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
 
 
-def load_data(
-    file: str,
-    weekday_exclusions: list = [],
-) -> Tuple[pd.DataFrame, dt.datetime.date, dt.datetime.date]:
+def format_progress(progress: dict) -> str:
     """
-    Takes a Trade Log CSV from either Option Omega or BYOB
-    and returns a dataframe containing the trade data and
-    the start and end dates of the dataset
+    Returns the task, the item being worked on, the throughput and the time
+    left of a -PROGRESS- message
     """
-    # Load the CSV file
-    try:
-        delims = [",", ";", "\t", "|"]
-        for delim in delims:
-            df = pd.read_csv(file, delimiter=delim)
-            if len(df.columns) > 1:
-                break
-        if len(df.columns) <= 1:
-            # none of the delims worked
-            raise UnicodeDecodeError
-    except UnicodeDecodeError:
-        sg.popup_no_border(
-            "This does not appear to be a backtest results\nCSV from either OptionOmega"
-            " or BYOB.\n\nPlease choose a different file"
-        )
-        return
-
-    # remove duplicate rows in case human error in combining csv files
-    df.drop_duplicates(inplace=True)
-
-    # Determine which type of data, OptionOmega or BYOB
-    is_byob = is_BYOB_data(df)
-    if is_byob is None:
-        sg.popup_no_border(
-            "This does not appear to be a backtest results\nCSV from either OptionOmega"
-            " or BYOB.\n\nPlease choose a different file"
-        )
-        return
-
-    elif not is_byob:  # OO BT data
-        # Convert 'Date Opened' to datetime format
-        df["Date Opened"] = pd.to_datetime(df["Date Opened"])
-
-        # Add EntryTime Column for analysis
-        df["EntryTime"] = pd.to_datetime(
-            df["Date Opened"].astype(str) + " " + df["Time Opened"]
-        )
-
-        # Add column for Option Right 'C' or 'P'
-        df["OptionType"] = df["Legs"].apply(
-            lambda x: x.split("|")[0].strip().split(" ")[4]
-        )
-
-    # Convert 'EntryTime' to datetime format
-    df["EntryTime"] = pd.to_datetime(df["EntryTime"])
-
-    # Add Day of week column
-    df["Day of Week"] = df["EntryTime"].dt.day_name()
-
-    # Create a 'Time' column
-    df["Time"] = df["EntryTime"].dt.strftime("%H:%M:%S")
-
-    # Sort by 'EntryTime'
-    df.sort_values(["EntryTime"], inplace=True)
-
-    # Determine start and end dates
-    start_date = df["EntryTime"].min().date()
-    end_date = df["EntryTime"].max().date()
-
-    # Add temporary Date column for merging gap info
-    df["Date"] = df["EntryTime"].dt.date
-
-    # Get SPX historical open/close from yahoo finance and calc gaps
-    spx_history = get_spx_gaps(start_date, end_date)
-    if not spx_history.empty:
-        spx_history = spx_history.reset_index()  # Reset index to make 'Date' a column
-        spx_history["Date"] = spx_history["Date"].dt.date
-
-        # drop the rows from spx_history that are not in df
-        spx_history = spx_history[spx_history["Date"].isin(df["Date"].to_list())]
-
-        # remove already present gap column from OO data
-        df = df.drop(columns=["Gap"], errors="ignore")
-
-        # Merge SPX gap information with the main dataframe
-        df = pd.merge(df, spx_history[["Date", "Gap", "Gap%"]], on="Date", how="left")
-
-    # Remove the temporary "Date" column if not needed
-    df = df.drop(columns=["Date"])
-
-    return (
-        df[~df["Day of Week"].isin(weekday_exclusions)],
-        start_date,
-        end_date,
-    )
+    text = progress["task"]
+    if progress["label"]:
+        text += f" {progress['label']}"
+    rate = progress["rate"]
+    if rate:
+        unit = progress["unit"]
+        if rate >= 1:
+            text += f"  {rate:.0f} {unit}/s"
+        else:
+            text += f"  {1 / rate:.1f}s per {unit.removesuffix('s')}"
+    if progress["eta"] is not None:
+        text += f"  ETA {format_duration(progress['eta'])}"
+    return text
 
 
 def resize_image(image_path, size):
@@ -1319,6 +485,17 @@ def resize_image(image_path, size):
     return buf.getvalue()
 
 
+def resize_chart_image(image: Image.Image, desired_height: int) -> ImageTk.PhotoImage:
+    """
+    Resizes a chart image to the desired height, keeping its aspect ratio,
+    and returns it ready to be shown in an sg.Image element
+    """
+    scale_factor = desired_height / image.height
+    new_width = int(image.width * scale_factor)
+    resized_image = image.resize((new_width, desired_height), Image.LANCZOS)
+    return ImageTk.PhotoImage(resized_image)
+
+
 def resize_base64_image(base64_image, desired_height):
     # Decode the base64 string
     image_data = base64.b64decode(base64_image)
@@ -1342,73 +519,6 @@ def resize_base64_image(base64_image, desired_height):
     return base64.b64encode(buf.getvalue())
 
 
-@with_gc
-def run_analysis_threaded(
-    files_list,
-    strategy_settings,
-    open_files,
-):
-    # initialize df_dicts
-    df_dicts = {}
-
-    for file in files_list:
-        strategy = (
-            "-SINGLE_MODE-"
-            if "-SINGLE_MODE-" in strategy_settings
-            else os.path.basename(file)
-        )
-        settings = strategy_settings[strategy]
-        result_dicts = create_excel_file(file, settings, open_files)
-
-        # check for cancel flag to stop thread
-        if cancel_flag.is_set():
-            cancel_flag.clear()
-            results_queue.put(("-BACKTEST_CANCELED-", ""))
-            return
-
-        source = os.path.splitext(os.path.basename(file))[0]
-        for right_type, day_dict in result_dicts.items():
-            if right_type not in df_dicts:
-                df_dicts[right_type] = {
-                    "All": {},
-                    "Mon": {},
-                    "Tue": {},
-                    "Wed": {},
-                    "Thu": {},
-                    "Fri": {},
-                }
-            for day, df_dict in day_dict.items():
-                df_dicts[right_type][day][source] = df_dict
-
-    for _best in ["Best P/C", "Best P/C Gap Up", "Best P/C Gap Down"]:
-        df_dicts[_best] = {
-            "All": {},
-            "Mon": {},
-            "Tue": {},
-            "Wed": {},
-            "Thu": {},
-            "Fri": {},
-        }
-
-        # combine the put and call dfs into 1 dict for dertmining the best time
-        # from among both individual datasets
-        for _right in ["Puts", "Calls"]:
-            if _best.endswith("Gap Up"):
-                _right += " Gap Up"
-            elif _best.endswith("Gap Down"):
-                _right += " Gap Down"
-
-            if _right in df_dicts:
-                for _day, _day_dict in df_dicts[_right].items():
-                    for _source, _df_dict in _day_dict.items():
-                        df_dicts[_best][_day][
-                            f"{_right.removesuffix("s")}||{_source}"
-                        ] = _df_dict
-
-    results_queue.put(("-RUN_ANALYSIS_END-", df_dicts))
-    return df_dicts
-
-
 def save_settings(settings, settings_filename, values):
     for key in settings:
         settings[key] = values[key]
@@ -1417,695 +527,8 @@ def save_settings(settings, settings_filename, values):
         json.dump(settings, f, indent=4)
 
 
-def set_default_app_settings(app_settings):
-    # Setup defaults if setting did not load/exist
-    if "-THEME-" not in app_settings:
-        app_settings["-THEME-"] = "Light"
-    if "-AVG_PERIOD_1-" not in app_settings:
-        app_settings["-AVG_PERIOD_1-"] = "4"
-    if "-AVG_PERIOD_2-" not in app_settings:
-        app_settings["-AVG_PERIOD_2-"] = "8"
-    if "-PERIOD_1_WEIGHT-" not in app_settings:
-        app_settings["-PERIOD_1_WEIGHT-"] = "25"
-    if "-PERIOD_2_WEIGHT-" not in app_settings:
-        app_settings["-PERIOD_2_WEIGHT-"] = "75"
-    if "-TOP_X-" not in app_settings:
-        app_settings["-TOP_X-"] = "5"
-    if "-CALC_TYPE-" not in app_settings:
-        app_settings["-CALC_TYPE-"] = "PCR"
-    if "-AGG_TYPE-" not in app_settings:
-        app_settings["-AGG_TYPE-"] = "Monthly"
-    if "-OPEN_FILES-" not in app_settings:
-        app_settings["-OPEN_FILES-"] = False
-    if "-BACKTEST-" not in app_settings:
-        app_settings["-BACKTEST-"] = False
-    if "-START_VALUE-" not in app_settings:
-        app_settings["-START_VALUE-"] = "100000"
-    if "-START_DATE-" not in app_settings:
-        app_settings["-START_DATE-"] = ""
-    if "-END_DATE-" not in app_settings:
-        app_settings["-END_DATE-"] = ""
-    if "-EXPORT-" not in app_settings:
-        app_settings["-EXPORT-"] = False
-    if "-EXPORT_OO_SIG-" not in app_settings:
-        app_settings["-EXPORT_OO_SIG-"] = False
-    if "-SCALING-" not in app_settings:
-        app_settings["-SCALING-"] = False
-    if "-MIN_TRANCHES-" not in app_settings:
-        app_settings["-MIN_TRANCHES-"] = "5"
-    if "-MAX_TRANCHES-" not in app_settings:
-        app_settings["-MAX_TRANCHES-"] = "5"
-    if "-BP_PER-" not in app_settings:
-        app_settings["-BP_PER-"] = "6000"
-    if "-PORTFOLIO_MODE-" not in app_settings:
-        app_settings["-PORTFOLIO_MODE-"] = False
-    if "-TOP_TIME_THRESHOLD-" not in app_settings:
-        app_settings["-TOP_TIME_THRESHOLD-"] = ""
-
-
-def update_strategy_settings(values, settings):
-    settings.update(
-        {
-            "-AVG_PERIOD_1-": values["-AVG_PERIOD_1-"],
-            "-PERIOD_1_WEIGHT-": values["-PERIOD_1_WEIGHT-"],
-            "-AVG_PERIOD_2-": values["-AVG_PERIOD_2-"],
-            "-PERIOD_2_WEIGHT-": values["-PERIOD_2_WEIGHT-"],
-            "-TOP_X-": values["-TOP_X-"],
-            "-CALC_TYPE-": values["-CALC_TYPE-"],
-            "-AGG_TYPE-": values["-AGG_TYPE-"],
-            "-MIN_TRANCHES-": values["-MIN_TRANCHES-"],
-            "-MAX_TRANCHES-": values["-MAX_TRANCHES-"],
-            "-BP_PER-": values["-BP_PER-"],
-            "-PASSTHROUGH_MODE-": values["-PASSTHROUGH_MODE-"],
-            "-PORT_WEIGHT-": values["-PORT_WEIGHT-"],
-            "-TOP_TIME_THRESHOLD-": values["-TOP_TIME_THRESHOLD-"],
-        }
-    )
-
-    # Initialize option settings if they don't exist
-    for option in [
-        "-WEEKDAY_EXCLUSIONS-",
-        "-NEWS_EXCLUSIONS-",
-        "-PUT_OR_CALL-",
-        "-IDV_WEEKDAY-",
-        "-AUTO_EXCLUSIONS-",
-        "-GAP_ANALYSIS-",
-    ]:
-        if option not in settings:
-            settings[option] = []
-    if "-APPLY_EXCLUSIONS-" not in settings:
-        settings["-APPLY_EXCLUSIONS-"] = "Both"
-    if "-GAP_THRESHOLD-" not in settings:
-        settings["-GAP_THRESHOLD-"] = 0
-    if "-GAP_TYPE-" not in settings:
-        settings["-GAP_TYPE-"] = "%"
-
-
-def validate_strategy_settings(strategy_settings):
-    for strategy in strategy_settings:
-        try:
-            period1 = int(strategy_settings[strategy]["-AVG_PERIOD_1-"])
-            period2 = int(strategy_settings[strategy]["-AVG_PERIOD_2-"])
-            weight1 = float(strategy_settings[strategy]["-PERIOD_1_WEIGHT-"])
-            weight2 = float(strategy_settings[strategy]["-PERIOD_2_WEIGHT-"])
-            strategy_settings[strategy]["-AVG_PERIOD_1-"] = period1
-            strategy_settings[strategy]["-AVG_PERIOD_2-"] = period2
-            strategy_settings[strategy]["-PERIOD_1_WEIGHT-"] = weight1
-            strategy_settings[strategy]["-PERIOD_2_WEIGHT-"] = weight2
-
-            strategy_settings[strategy]["-TOP_X-"] = int(
-                strategy_settings[strategy]["-TOP_X-"]
-            )
-            strategy_settings[strategy]["-MIN_TRANCHES-"] = int(
-                strategy_settings[strategy]["-MIN_TRANCHES-"]
-            )
-            strategy_settings[strategy]["-MAX_TRANCHES-"] = int(
-                strategy_settings[strategy]["-MAX_TRANCHES-"]
-            )
-            strategy_settings[strategy]["-BP_PER-"] = float(
-                strategy_settings[strategy]["-BP_PER-"]
-            )
-            strategy_settings[strategy]["-PORT_WEIGHT-"] = float(
-                strategy_settings[strategy]["-PORT_WEIGHT-"]
-            )
-            if strategy_settings[strategy]["-TOP_TIME_THRESHOLD-"]:
-                strategy_settings[strategy]["-TOP_TIME_THRESHOLD-"] = float(
-                    strategy_settings[strategy]["-TOP_TIME_THRESHOLD-"]
-                )
-            else:
-                strategy_settings[strategy]["-TOP_TIME_THRESHOLD-"] = float("-inf")
-        except ValueError:
-            return (
-                "Problem with values entered.\nPlease enter only positive whole numbers"
-            )
-        if period1 < 1 or period2 < 1 or period1 > period2:
-            return "Please make sure both averaging periods are > 0\nand that Trailing Avg 2 is >= to Trailing Avg 1"
-        if weight1 + weight2 != 100:
-            return "Trailing Avg Weights should add up to 100"
-
-    return True
-
-
-@with_gc
-def walk_forward_test(
-    df_dicts: dict,
-    path: str,
-    strategy_settings: dict,
-    start: dt.datetime.date = None,
-    end: dt.datetime.date = None,
-    initial_value: float = 100_000,
-    use_scaling=False,
-    export_trades=False,
-    export_OO_sig=False,
-):
-    portfolio_mode = "-SINGLE_MODE-" not in strategy_settings
-    start_date = dt.date.min
-    passthrough_start_date = dt.date.min
-    end_date = dt.date.max
-    # loop through all the source dfs
-    for source, df_dict in df_dicts["Put-Call Comb"]["All"].items():
-        try:
-            passthrough = strategy_settings[f"{source}.csv"]["-PASSTHROUGH_MODE-"]
-        except KeyError as e:
-            passthrough = False
-
-        _start_date = df_dict["org_df"]["EntryTime"].min().date()
-        _end_date = df_dict["org_df"]["EntryTime"].max().date()
-        # find the latest start date
-        if not passthrough:
-            if _start_date > start_date:
-                start_date = _start_date
-        else:
-            # we need to treat passthrough seperate since there is no
-            # warm up period necessary.
-            if _start_date > passthrough_start_date:
-                passthrough_start_date = _start_date
-
-        # find the earliest end date passthrough doesn't matter here
-        if _end_date < end_date:
-            end_date = _end_date
-
-    max_long_avg_period = max(
-        [
-            max(settings["-AVG_PERIOD_1-"], settings["-AVG_PERIOD_2-"])
-            for settings in strategy_settings.values()
-        ]
-    )
-    date_adv = start_date + relativedelta(months=max_long_avg_period)
-    warm_start = dt.date(date_adv.year, date_adv.month, 1)
-    # use either the user input date or the first warmed up date
-    if start:
-        start_test_date = max(warm_start, start)
-    else:
-        start_test_date = warm_start
-    end = end_date if end is None else end
-
-    # check if any strats are using auto exclusion
-    warm_up_date = start_test_date
-    using_auto_exclusions = False
-    for setting in strategy_settings.values():
-        if setting["-AUTO_EXCLUSIONS-"]:
-            # set the warmup date
-            warm_up_date = warm_start + relativedelta(months=max_long_avg_period)
-            using_auto_exclusions = True
-            break
-    # now we just need to see if the passthrough strats start later
-    warm_up_date = max(warm_up_date, passthrough_start_date)
-
-    if not portfolio_mode:
-        settings = strategy_settings["-SINGLE_MODE-"]
-        strats = ["All-P_C_Comb"]
-        if settings["-PUT_OR_CALL-"] and settings["-IDV_WEEKDAY-"]:
-            strats += ["Weekday-P_C_Comb", "All-Best_P_or_C", "Weekday-Best_P_or_C"]
-        elif settings["-IDV_WEEKDAY-"]:
-            strats.append("Weekday-P_C_Comb")
-        elif settings["-PUT_OR_CALL-"]:
-            strats.append("All-Best_P_or_C")
-        if settings["-GAP_ANALYSIS-"]:
-            for _strat in strats.copy():
-                strats.append(f"{_strat}-Gap")
-    else:
-        strats = ["Portfolio"] + list(strategy_settings.keys())
-
-    portfolio_metrics = {}
-    for _strat in strats:
-        portfolio_metrics[_strat] = {
-            "Current Value": initial_value,
-            "Highest Value": initial_value,
-            "Max DD": 0.0,
-            "Current DD": 0.0,
-            "DD Days": 0,
-            "Tranche Qtys": [],
-            "Port Tranche Qtys": [],
-            "Num Tranches": 1,
-            "Port Num Tranches": 1,
-            "trade log": pd.DataFrame(),
-            "Tlog Auto Exclusions": (
-                pd.DataFrame()
-            ),  # for warm-up to calc EV for auto exclusions
-            "Win Streak": 0,
-            "Loss Streak": 0,
-        }
-
-    if portfolio_mode:
-        port_dict = portfolio_metrics["Portfolio"]
-
-    # init results
-    results = {}
-    for strategy in portfolio_metrics:
-        results[strategy] = pd.DataFrame()
-
-    # convert weekdays from full day name to short name. i.e. Monday to Mon
-    day_list = [_day[:3] for _day in weekday_list]
-
-    def determine_auto_skip(date: dt.date, tlog: pd.DataFrame, agg_type: str) -> bool:
-        """
-        Calculate the expected value of any news events that
-        occur on the given date and return True if negative expectancy
-        """
-        current_weekday = date.strftime("%a")
-        agg_type = (
-            "ME"
-            if agg_type == "Monthly"
-            else "SME" if agg_type == "Semi-Monthly" else "W-SAT"
-        )
-        trade_log = tlog.copy()
-        trade_log["EntryTime"] = pd.to_datetime(trade_log["EntryTime"])
-        if is_BYOB_data(trade_log):
-            trade_log["P/L"] = (
-                trade_log["ProfitLossAfterSlippage"] * 100 - trade_log["CommissionFees"]
-            )
-
-        def _get_current_rolling_avg(df):
-            # Set 'EntryTime' as the index
-            df = df.set_index("EntryTime")
-            # Resample to monthly or weekly frequency, summing the PNL
-            aggregated_pnl = df["P/L"].resample(agg_type).sum()
-            # Calculate the rolling average
-            window = (
-                max_long_avg_period
-                if agg_type == "ME"
-                else (
-                    int(max_long_avg_period * 2)
-                    if agg_type == "SME"
-                    else int(max_long_avg_period * 4.33)
-                )
-            )
-            rolling_avg_pnl = aggregated_pnl.rolling(
-                window=window, min_periods=1
-            ).mean()
-            if not rolling_avg_pnl.empty:
-                return rolling_avg_pnl.iloc[-1]
-            else:
-                return 0
-
-        # find the events that occur on this date and calc the expectancy
-        for event, date_list in news_events.items():
-            if date in date_list:
-                trade_log_filtered = trade_log[
-                    trade_log["EntryTime"].dt.date.isin(date_list)
-                ]
-                if not trade_log_filtered.empty:
-                    current_avg = _get_current_rolling_avg(trade_log_filtered)
-                    if current_avg < 0:
-                        # this event has negative expectancy, whole day can be skipped
-                        return True
-
-        # passed all news events, lets see if we skip the weekday
-        trade_log_filtered = trade_log[
-            trade_log["Day of Week"].str.contains(current_weekday)
-        ]
-        if not trade_log_filtered.empty:
-            current_avg = _get_current_rolling_avg(trade_log_filtered)
-            if current_avg < 0:
-                # this dat has negative expectancy, whole day can be skipped
-                return True
-        return False
-
-    if using_auto_exclusions:
-        current_date = warm_start
-    else:
-        current_date = max(start_test_date, passthrough_start_date)
-
-    # determine if we need to use gaps
-    spx_history = pd.DataFrame()
-    for setting in strategy_settings.values():
-        if setting["-GAP_ANALYSIS-"]:
-            spx_history = get_spx_gaps(current_date, end)
-            if not spx_history.empty:
-                # reset the index to just the date, dropping the time component
-                spx_history = spx_history.reset_index()
-                spx_history["Date"] = spx_history["Date"].dt.date
-                spx_history = spx_history.set_index("Date")
-
-    while current_date <= end:
-        # check for cancel flag to stop thread
-        if cancel_flag.is_set():
-            cancel_flag.clear()
-            results_queue.put(("-BACKTEST_CANCELED-", ""))
-            return
-
-        warmed_up = current_date >= warm_up_date
-
-        if portfolio_mode:
-            # reset daily pnl for portfolio
-            port_dict["Current Day PnL"] = 0
-
-        current_weekday = current_date.strftime("%a")
-        for strat, strat_dict in portfolio_metrics.items():
-            if portfolio_mode and strat == "Portfolio":
-                # we don't trade the portfolio, it is just the combination of all individual strats
-                continue
-            elif portfolio_mode:
-                settings = strategy_settings[strat]
-            else:
-                settings = strategy_settings["-SINGLE_MODE-"]
-
-            # reset daily pnl for individual strategy
-            strat_dict["Current Day PnL"] = 0
-
-            day_exlusions = []
-            news_date_exclusions = []
-            if settings["-APPLY_EXCLUSIONS-"] != "Analysis":
-                # we are applying exclusions to either the WF test or both the WF and Analysis
-                day_exlusions = [_day[:3] for _day in settings["-WEEKDAY_EXCLUSIONS-"]]
-                # get list of news event dates to skip.
-                for release, date_list in news_events.items():
-                    if release in settings["-NEWS_EXCLUSIONS-"]:
-                        news_date_exclusions += date_list
-
-            skip_day = False
-            if warmed_up and using_auto_exclusions:
-                skip_day = determine_auto_skip(
-                    current_date,
-                    strat_dict["Tlog Auto Exclusions"],
-                    settings["-AGG_TYPE-"],
-                )
-            elif (
-                current_weekday in day_exlusions
-                or current_weekday not in day_list
-                or current_date in news_date_exclusions
-            ):
-                skip_day = True
-
-            if not settings["-PASSTHROUGH_MODE-"]:
-                if use_scaling:
-
-                    def determine_num_tranches(
-                        min_tranches, max_tranches, num_contracts
-                    ):
-                        tranches = max_tranches
-                        while True:
-                            if num_contracts > tranches:
-                                max_tranche_qty = int(num_contracts / tranches)
-                                remain_qty = num_contracts - (
-                                    tranches * max_tranche_qty
-                                )
-                                if remain_qty >= min_tranches or remain_qty == 0:
-                                    # we're done we can stay at this number of tranches with
-                                    # the remainder filling up another set of at least min tranches
-                                    return tranches
-                                else:
-                                    # we need to take a tranche away so we can try to fill up at
-                                    # least 1 full set at min amount
-                                    if tranches - 1 < min_tranches:
-                                        # we can't reduce any further, got with what we have
-                                        # even if that means we will be adding contracts below the min
-                                        return tranches
-                                    else:
-                                        tranches -= 1
-                            else:
-                                return num_contracts
-
-                    def determine_tranche_qtys(tranches):
-                        tranche_qtys = []
-                        for x in range(tranches):
-                            if x < num_contracts % tranches:
-                                # this is where we add the remaining contracts after filling up all tranches
-                                tranche_qtys.append(int(num_contracts / tranches) + 1)
-                            else:
-                                tranche_qtys.append(int(num_contracts / tranches))
-                        return tranche_qtys
-
-                    min_tranches = settings["-MIN_TRANCHES-"]
-                    max_tranches = settings["-MAX_TRANCHES-"]
-                    bp_per_contract = settings["-BP_PER-"]
-                    num_contracts = int(strat_dict["Current Value"] / bp_per_contract)
-                    tranches = determine_num_tranches(
-                        min_tranches, max_tranches, num_contracts
-                    )
-                    strat_dict["Num Tranches"] = tranches
-                    strat_dict["Tranche Qtys"] = determine_tranche_qtys(tranches)
-                    if portfolio_mode:
-                        weighted_value = (
-                            port_dict["Current Value"] * settings["-PORT_WEIGHT-"] / 100
-                        )
-                        num_contracts = int(weighted_value / bp_per_contract)
-                        tranches = determine_num_tranches(
-                            min_tranches, max_tranches, num_contracts
-                        )
-                        strat_dict["Port Num Tranches"] = tranches
-                        strat_dict["Port Tranche Qtys"] = determine_tranche_qtys(
-                            tranches
-                        )
-                else:
-                    # not scaling
-                    num_contracts = settings["-TOP_X-"]
-                    strat_dict["Num Tranches"] = num_contracts
-                    strat_dict["Tranche Qtys"] = [1 for x in range(num_contracts)]
-                    strat_dict["Port Num Tranches"] = num_contracts
-                    strat_dict["Port Tranche Qtys"] = [1 for x in range(num_contracts)]
-
-            if settings["-AGG_TYPE-"] == "Monthly":
-                # date for best times should be the month prior as we don't know the future yet
-                best_time_date = current_date - relativedelta(months=1)
-            elif settings["-AGG_TYPE-"] == "Semi-Monthly":
-                # grab from last half-month
-                if current_date.day != 31:
-                    best_time_date = current_date - relativedelta(days=15)
-                else:
-                    best_time_date = current_date - relativedelta(days=16)
-            else:
-                # grab from last week
-                best_time_date = current_date - relativedelta(weeks=1)
-
-            def log_pnl_and_trades(strat_dict, num_tranches, tranche_qtys):
-                # determine gap info
-                gap_str = ""
-                if settings["-GAP_ANALYSIS-"]:
-                    _gap_type = "Gap%" if settings["-GAP_TYPE-"] == "%" else "Gap"
-                    try:
-                        gap_value = spx_history.at[current_date, _gap_type]
-                    except KeyError as e:
-                        # probably a day market was not open (i.e. holiday)
-                        gap_value = 0
-                    if gap_value > settings["-GAP_THRESHOLD-"]:
-                        gap_str = " Gap Up"
-                    elif gap_value < -settings["-GAP_THRESHOLD-"]:
-                        gap_str = " Gap Down"
-
-                if portfolio_mode:
-                    # determine which strat to use
-                    if settings["-PUT_OR_CALL-"]:
-                        _strat = "Best P/C"
-                    else:
-                        _strat = "Put-Call Comb"
-
-                    _strat = _strat + gap_str  # add gap info onto the end of strat name
-
-                    # determine which weekday to use
-                    if settings["-IDV_WEEKDAY-"]:
-                        _weekday = current_weekday
-                    else:
-                        _weekday = "All"
-
-                else:
-                    # determine strat name for df_dicts
-                    if "P_C_Comb" in strat:
-                        _strat = "Put-Call Comb"
-                    else:
-                        _strat = "Best P/C"
-
-                    # determine gap type
-                    if "Gap" not in strat:
-                        gap_str = ""
-
-                    _strat = _strat + gap_str  # add gap onto the end of strat name
-
-                    # determine weekday type
-                    if strat.startswith("All"):
-                        _weekday = "All"
-                    else:
-                        _weekday = current_weekday
-
-                # finally select the appropriate df_dict
-                df_dict = df_dicts[_strat][_weekday]
-
-                # get the best times for this strat
-                best_times_df = get_top_times(
-                    df_dict, strategy_settings, best_time_date, num_tranches
-                )
-
-                if portfolio_mode:
-                    # filter out other sources since all sources are included
-                    source = os.path.splitext(strat)[0]
-                    best_times_df = (
-                        best_times_df[best_times_df["Source"].str.endswith(source)]
-                        .sort_values("Values", ascending=False)
-                        .head(num_tranches)
-                    )
-
-                if settings["-PASSTHROUGH_MODE-"]:
-                    # get all the times this traded on this date
-                    source_df = df_dicts["Put-Call Comb"]["All"][source]["org_df"]
-                    _filtered_df = source_df[
-                        source_df["EntryTime"].dt.date == current_date
-                    ]
-                    best_times = (
-                        _filtered_df["EntryTime"]
-                        .dt.strftime("%H:%M:%S")
-                        .unique()
-                        .tolist()
-                    )
-                    # we don't determine the tranche qtys in passthrough mode, we just need
-                    # to trade whaterver is in the trade log for that day.  Let's determine
-                    # the qtys to trade for each trade in the log.
-                    tranche_qtys = []
-                    for _ in best_times:
-                        if use_scaling:
-                            current_value = strat_dict["Current Value"]
-                            # calc total qty
-                            total_qty = (
-                                current_value
-                                * settings["-PORT_WEIGHT-"]
-                                / 100
-                                / settings["-BP_PER-"]
-                            )
-
-                            # qty per trade
-                            qty = int(total_qty / len(best_times))
-                            tranche_qtys.append(max(qty, 1))
-                        else:
-                            tranche_qtys.append(1)
-                else:  # no passthrough, use best times analysis
-                    best_times = best_times_df["Top Times"].to_list()
-
-                for time in best_times:
-                    # get the qty for this tranche time
-                    qty = tranche_qtys[best_times.index(time)]
-                    full_dt = dt.datetime.combine(
-                        current_date, dt.datetime.strptime(time, "%H:%M:%S").time()
-                    )
-
-                    if not settings["-PASSTHROUGH_MODE-"]:
-                        # get the source df, we already have it from eariler for pass-through
-                        source = best_times_df.loc[
-                            best_times_df["Top Times"] == time, "Source"
-                        ].values[0]
-                        source_df = df_dict[source]["org_df"]
-
-                    filtered_rows = source_df[source_df["EntryTime"] == full_dt].copy()
-
-                    if filtered_rows.empty:
-                        continue
-
-                    filtered_rows["qty"] = qty
-                    filtered_rows["source"] = source
-
-                    if is_BYOB_data(source_df):
-                        gross_pnl = (
-                            filtered_rows["ProfitLossAfterSlippage"].sum() * 100 * qty
-                        )
-                        commissions = filtered_rows["CommissionFees"].sum() * qty
-                        pnl = gross_pnl - commissions
-                    else:
-                        pnl = filtered_rows["P/L"].sum() * qty
-
-                    # log trade
-                    strat_dict["Tlog Auto Exclusions"] = pd.concat(
-                        [strat_dict["Tlog Auto Exclusions"], filtered_rows],
-                        ignore_index=True,
-                    )
-                    if warmed_up and not skip_day:
-                        strat_dict["trade log"] = pd.concat(
-                            [strat_dict["trade log"], filtered_rows], ignore_index=True
-                        )
-                        strat_dict["Current Value"] += pnl
-                        strat_dict["Current Day PnL"] += pnl
-
-            if current_weekday in day_list:
-                # make sure its not the weekend
-                num_tranches = strat_dict["Num Tranches"]
-                tranche_qtys = strat_dict["Tranche Qtys"]
-                log_pnl_and_trades(strat_dict, num_tranches, tranche_qtys)
-                if portfolio_mode:
-                    num_tranches = strat_dict["Port Num Tranches"]
-                    tranche_qtys = strat_dict["Port Tranche Qtys"]
-                    log_pnl_and_trades(port_dict, num_tranches, tranche_qtys)
-
-            def calc_metrics(strat_dict: dict, strat: str, results: dict) -> None:
-                # calc metrics and log the results for the day
-                if strat_dict["Current Value"] >= strat_dict["Highest Value"]:
-                    strat_dict["Highest Value"] = strat_dict["Current Value"]
-                    strat_dict["DD Days"] = 0
-                else:
-                    # we are in Drawdown
-                    dd = (
-                        strat_dict["Highest Value"] - strat_dict["Current Value"]
-                    ) / strat_dict["Highest Value"]
-                    strat_dict["Current DD"] = dd
-                    if dd > strat_dict["Max DD"]:
-                        strat_dict["Max DD"] = dd
-                    strat_dict["DD Days"] += 1
-
-                if strat_dict["Current Day PnL"] > 0:
-                    strat_dict["Win Streak"] += 1
-                    strat_dict["Loss Streak"] = 0
-                elif strat_dict["Current Day PnL"] < 0:
-                    # tie does not change any streak
-                    strat_dict["Win Streak"] = 0
-                    strat_dict["Loss Streak"] += 1
-
-                new_row = pd.DataFrame(
-                    [
-                        {
-                            "Date": current_date,
-                            "Current Value": strat_dict["Current Value"],
-                            "Highest Value": strat_dict["Highest Value"],
-                            "Max DD": strat_dict["Max DD"],
-                            "Current DD": strat_dict["Current DD"],
-                            "DD Days": strat_dict["DD Days"],
-                            "Day PnL": strat_dict["Current Day PnL"],
-                            "Win Streak": strat_dict["Win Streak"],
-                            "Loss Streak": strat_dict["Loss Streak"],
-                            "Initial Value": initial_value,
-                            "Weekday": current_weekday,
-                        }
-                    ]
-                )
-                results[strat] = pd.concat([results[strat], new_row], ignore_index=True)
-
-            if warmed_up and not skip_day:
-                calc_metrics(strat_dict, strat, results)
-
-            if skip_day:
-                # this is a skip day just increment the DD days if needed
-                if strat_dict["DD Days"] > 0:
-                    strat_dict["DD Days"] += 1
-                if portfolio_mode and port_dict["DD Days"] > 0:
-                    port_dict["DD Days"] += 1
-
-        # calculate all the stats for the portfolio now that all other strats have traded
-        if portfolio_mode and warmed_up and not skip_day:
-            calc_metrics(port_dict, "Portfolio", results)
-
-        current_date += dt.timedelta(1)
-
-    for strat in portfolio_metrics:
-        if not results[strat].empty:
-            results[strat]["Date"] = pd.to_datetime(results[strat]["Date"])
-            uuid_str = str(uuid.uuid4())[:8]
-            if export_trades:
-                base_filename = f"{strat} - TradeLog_{uuid_str}"
-                ext = ".csv"
-                export_filename = get_next_filename(path, base_filename, ext)
-                portfolio_metrics[strat]["trade log"].to_csv(
-                    export_filename, index=False
-                )
-            if export_OO_sig:
-                base_filename = f"{strat} - OO_Signal_File_{uuid_str}"
-                ext = ".csv"
-                export_filename = get_next_filename(path, base_filename, ext)
-                export_oo_sig_file(
-                    portfolio_metrics[strat]["trade log"], export_filename
-                )
-    results_queue.put(("-BACKTEST_END-", results))
-    return results
-
-
 @with_gc
 def options_window(settings) -> None:
-    global news_events_loaded
     dpi_scale = get_dpi_scale()
     BASE_HEIGHT = 40
     scaled_height = int(BASE_HEIGHT * dpi_scale)
@@ -2149,7 +572,7 @@ def options_window(settings) -> None:
         ],
         [
             sg.Input(
-                "Loaded" if news_events_loaded else "",
+                "Loaded" if core.news_events_loaded else "",
                 key="-FILE-",
                 expand_x=True,
             ),
@@ -2234,6 +657,11 @@ def options_window(settings) -> None:
                             readonly=True,
                             key="-GAP_TYPE-",
                         ),
+                        sg.Push(),
+                        sg.Button(
+                            "Import SPX History",
+                            tooltip="Use daily SPX Open/Close data from a CSV for the gaps\ninstead of downloading it from yahoo finance",
+                        ),
                     ],
                 ],
                 expand_x=True,
@@ -2308,6 +736,27 @@ def options_window(settings) -> None:
             )
             window["-FILE-"].update(news_file)
 
+        elif event == "Import SPX History":
+            spx_file = sg.popup_get_file(
+                "",
+                file_types=(("CSV Files", "*.csv"),),
+                multiple_files=False,
+                no_window=True,
+            )
+            if not spx_file:
+                # user hit cancel
+                continue
+            if import_spx_history(spx_file):
+                sg.popup_no_border(
+                    "SPX history imported successfully!",
+                    auto_close=True,
+                    auto_close_duration=5,
+                )
+            else:
+                sg.popup_no_border(
+                    "This does not appear to be a CSV with\nthe daily Date, Open and Close of SPX"
+                )
+
         elif event == "Ok":
             settings["-WEEKDAY_EXCLUSIONS-"] = [
                 day for day in weekday_list if values[day]
@@ -2329,7 +778,7 @@ def options_window(settings) -> None:
             if values["-FILE-"] and values["-FILE-"] != "Loaded":
                 result = import_news_events(values["-FILE-"])
                 if result:
-                    news_events_loaded = True
+                    core.news_events_loaded = True
                     break
                 else:
                     sg.popup_no_border(
@@ -2593,7 +1042,13 @@ def main():
                         visible=False,
                     ),
                 ),
+                sg.pin(sg.Text("", key="-PROGRESS_STATUS-", visible=False)),
                 sg.pin(sg.Button("Cancel", pad=(20, 0), visible=False)),
+                sg.Text(
+                    old_window["-STAGE_STATUS-"].get() if old_window else "",
+                    key="-STAGE_STATUS-",
+                    tooltip="Time spent in each stage of the last run",
+                ),
                 sg.Push(),
                 sg.Button("CSV Merger"),
                 sg.Combo(
@@ -2744,12 +1199,36 @@ def main():
                                 readonly=True,
                             ),
                             sg.Push(),
+                            Checkbox(
+                                "Analyze files in parallel",
+                                app_settings["-PARALLEL-"],
+                                key="-PARALLEL-",
+                                size=(16, 1),
+                                tooltip="Analyze each file in a separate process using all CPU cores.\nSpeeds up portfolios with many files",
+                            ),
+                            sg.Text(
+                                "Heatmaps",
+                                tooltip="Format to save the heatmap tables in.\nNone only keeps them for the walk forward test and top times",
+                            ),
+                            sg.Combo(
+                                heatmap_output_formats,
+                                app_settings["-OUTPUT_FORMAT-"],
+                                key="-OUTPUT_FORMAT-",
+                                readonly=True,
+                            ),
                             Checkbox(
                                 "Open Excel files after creation",
                                 app_settings["-OPEN_FILES-"],
                                 key="-OPEN_FILES-",
                                 size=(20, 1),
                             ),
+                            Checkbox(
+                                "Log stage timings",
+                                app_settings["-STAGE_LOG-"],
+                                key="-STAGE_LOG-",
+                                size=(12, 1),
+                                tooltip="Append the time, rows and peak memory of each stage\nto stage_log.jsonl in the data folder",
+                            ),
                         ],
                     ],
                     expand_x=True,
@@ -2800,6 +1279,13 @@ def main():
                                 justification="c",
                                 tooltip="Date to end test. Leave blank to automatically\nselect the latest available end date from the available data",
                             ),
+                            Checkbox(
+                                "Fast engine",
+                                app_settings["-FAST_WF-"],
+                                key="-FAST_WF-",
+                                size=(9, 1),
+                                tooltip="Test all the days at once instead of one day at a time.\nUsed when not scaling and without passthrough or auto exclusions.",
+                            ),
                             sg.Push(),
                             Checkbox(
                                 "Export Trades to CSV",
@@ -2909,7 +1395,6 @@ def main():
             finalize=True,
             location=window_position,
         )
-        window["-PROGRESS-"].Widget.config(mode="indeterminate")
         Checkbox.initial(window)
 
         # reselect previously selected tabs
@@ -2955,8 +1440,16 @@ def main():
     window = get_main_window()
     error = False
     chart_images = {}
+    # resized copy of each chart with the height it was resized to and the
+    # window and image size the charts were last drawn in
+    resized_charts = {}
+    drawn_charts = None
     strategy_settings = {}
     test_running = False
+    # time spent in each stage of the current run and where to log them
+    stage_totals = {}
+    stage_peak_rss_mb = 0
+    stage_log_path = None
     while True:
         event, values = window.read(timeout=100)
         if event == sg.WIN_CLOSED:
@@ -3034,7 +1527,14 @@ def main():
                 end_date = None
 
             # All settings validated, proceed with analysis
-            window["-PROGRESS-"].update(visible=True)
+            stage_totals.clear()
+            stage_peak_rss_mb = 0
+            stage_log_path = None
+            if values["-STAGE_LOG-"]:
+                stage_log_path = os.path.join(os.path.dirname(files_list[0]), "data")
+            window["-STAGE_STATUS-"].update("")
+            window["-PROGRESS-"].update(0, visible=True)
+            window["-PROGRESS_STATUS-"].update("Starting", visible=True)
             window["Analyze"].update("Working...", disabled=True)
             window["Cancel"].update(visible=True)
             threading.Thread(
@@ -3042,6 +1542,8 @@ def main():
                     files_list,
                     strategy_settings,
                     values["-OPEN_FILES-"],
+                    workers=os.cpu_count() if values["-PARALLEL-"] else 1,
+                    output_format=values["-OUTPUT_FORMAT-"],
                 ),
                 daemon=True,
             ).start()
@@ -3142,10 +1644,16 @@ def main():
                     image_width_max, int(image_height_max / image_aspect_ratio)
                 )
                 image_size = (image_width, int(image_width * image_aspect_ratio))
-                for chart, image_b64 in chart_images.items():
-                    # we only need to pass the height
-                    resized_image = resize_base64_image(image_b64, image_size[1])
-                    window[chart].update(data=resized_image)
+                # only redraw the charts when the window was resized or recreated
+                if drawn_charts != (window, image_size):
+                    for chart, image in chart_images.items():
+                        # we only need to pass the height
+                        height, resized_image = resized_charts.get(chart, (0, None))
+                        if height != image_size[1]:
+                            resized_image = resize_chart_image(image, image_size[1])
+                            resized_charts[chart] = (image_size[1], resized_image)
+                        window[chart].update(data=resized_image)
+                    drawn_charts = (window, image_size)
 
         elif event == "-THEME-":
             new_theme = themes[values["-THEME-"]]
@@ -3221,18 +1729,21 @@ def main():
                             use_scaling=values["-SCALING-"],
                             export_trades=values["-EXPORT-"],
                             export_OO_sig=values["-EXPORT_OO_SIG-"],
+                            fast_engine=values["-FAST_WF-"],
                         ),
                         daemon=True,
                     ).start()
 
                 else:
                     window["-PROGRESS-"].update(visible=False)
+                    window["-PROGRESS_STATUS-"].update(visible=False)
                     window["Cancel"].update(visible=False)
                     window["Analyze"].update("Analyze", disabled=False)
                     test_running = False
 
             elif result_key == "-BACKTEST_END-":
                 window["-PROGRESS-"].update(visible=False)
+                window["-PROGRESS_STATUS-"].update(visible=False)
                 window["Cancel"].update(visible=False)
                 window["Analyze"].update("Analyze", disabled=False)
                 test_running = False
@@ -3246,31 +1757,23 @@ def main():
                         "One or more of your strategies or files contains no results.\nPerhaps the dataset does not go back far enough?"
                     )
                     continue
-                table_data, img_data = get_pnl_plot(results)
-                chart_images["-PNL_CHART-"] = img_data
+                table_data = get_pnl_table(results)
                 window["-PNL_TABLE_CHART-"].update(
                     values=table_data, num_rows=min(len(table_data), 4)
                 )
 
-                chart_images["-WEEKDAY_PNL_CHART-"] = get_weekday_pnl_chart(results)
-                chart_images["-MONTHLY_PNL_CHART-"] = get_monthly_pnl_chart(results)
-                chart_images["-NEWS_PNL_CHART-"] = get_news_event_pnl_chart(results)
-                chart_images["-NEWS_AVG_PNL_CHART-"] = get_news_event_pnl_chart(
-                    results, False
-                )
+                # draw the charts in the background, each one is shown
+                # as soon as it arrives on the results queue
+                chart_images.clear()
+                resized_charts.clear()
+                drawn_charts = None
+                threading.Thread(
+                    target=render_charts_threaded,
+                    args=(results, values["-PORTFOLIO_MODE-"]),
+                    daemon=True,
+                ).start()
                 if values["-PORTFOLIO_MODE-"]:
-                    chart_images["-CORRELATION_MATRIX-"] = get_correlation_matrix(
-                        results
-                    )
                     window["-CORRELATION_MATRIX_TAB-"].update(visible=True)
-                # resize the images to fit in the window
-                for chart, image_data in chart_images.items():
-                    chart_image = resize_base64_image(
-                        image_data,
-                        int(window.size[1] * 0.25),
-                    )
-                    window[chart].update(data=chart_image)
-
                 window["-TAB_GROUP-"].Widget.select(4)
 
                 # recreate window to have table columns auto adjust
@@ -3288,25 +1791,48 @@ def main():
                 window = new_window
                 continue
 
+            elif result_key == "-CHART-":
+                chart, chart_image = results
+                chart_images[chart] = chart_image
+                resized_charts.pop(chart, None)
+                # draw the new chart on the next timeout
+                drawn_charts = None
+
             elif result_key == "-BACKTEST_CANCELED-":
                 window["-PROGRESS-"].update(visible=False)
+                window["-PROGRESS_STATUS-"].update(visible=False)
                 window["Cancel"].update("Cancel", disabled=False, visible=False)
                 window["Analyze"].update("Analyze", disabled=False)
                 test_running = False
 
+            elif result_key == "-PROGRESS-":
+                if results["total"]:
+                    window["-PROGRESS-"].update(
+                        int(100 * results["done"] / results["total"])
+                    )
+                window["-PROGRESS_STATUS-"].update(format_progress(results))
+
+            elif result_key == "-STAGE-":
+                stage_totals[results["stage"]] = (
+                    stage_totals.get(results["stage"], 0) + results["seconds"]
+                )
+                stage_peak_rss_mb = max(stage_peak_rss_mb, results["peak_rss_mb"] or 0)
+                window["-STAGE_STATUS-"].update(
+                    format_stage_totals(stage_totals, stage_peak_rss_mb)
+                )
+                if stage_log_path:
+                    append_stage_log(stage_log_path, results)
+
             elif result_key == "-IMPORT_NEWS-":
                 sg.popup_no_border(results, auto_close=True, auto_close_duration=5)
 
             elif result_key == "-ERROR-":
                 sg.popup_no_border(results)
-        # move the progress bar
-        if window["Analyze"].Disabled:
-            window["-PROGRESS-"].Widget["value"] += 10
-        else:
-            window["-PROGRESS-"].Widget["value"] = 0
 
     window.close()
 
 
 if __name__ == "__main__":
+    # needed for the analysis worker processes in a frozen executable
+    multiprocessing.freeze_support()
     main()
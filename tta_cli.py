@@ -0,0 +1,378 @@
+"""
+Runs the Tranche Time Analyzer analysis and walk forward test without the GUI.
+
+Takes one or more trade log CSVs and a settings JSON using the same keys as
+data/tta_settings.json.  The settings file may also hold a dict of strategy
+settings for a trade log, keyed by its file name (or "-SINGLE_MODE-" when not
+running in portfolio mode), to set the options from the GUI options window
+such as "-WEEKDAY_EXCLUSIONS-" or "-PASSTHROUGH_MODE-".
+
+The heatmap workbooks are written next to the trade logs like the GUI does,
+or as Parquet/CSV tables with --output-format.
+The top times, walk forward results, summary metrics and exported trade logs
+are written to the output directory.  The time, rows and peak memory of each
+stage of the run are printed with --timings and appended to stage_log.jsonl
+in the output directory with --stage-log.
+
+Usage:
+    python tta_cli.py trade_log.csv [...] [--settings tta_settings.json]
+                      [--portfolio] [--walk-forward] [--output DIR]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+
+import pandas as pd
+from dateutil import parser as date_parser
+
+import tta_core as core
+
+# where the -STAGE- timings go, set from the command line
+stage_options = {"print": False, "log_path": None}
+
+
+def format_stage(span: dict) -> str:
+    """
+    Returns a one line description of a -STAGE- span
+    """
+    names = " ".join(
+        str(span[key]) for key in ["file", "strategy", "chart"] if span.get(key)
+    )
+    text = f"{span['stage']} {names}".strip() + f": {span['seconds']:.3f}s"
+    if span["rows"] is not None:
+        text += f", {span['rows']} rows"
+    if span["peak_rss_mb"] is not None:
+        text += f", peak {span['peak_rss_mb']:.0f}MB"
+    return text
+
+
+def report_messages() -> bool:
+    """
+    Prints the messages posted to 'results_queue' by the engine to stderr.
+    Returns True if any of them was an error.
+    """
+    error = False
+    while True:
+        try:
+            result_key, result = core.results_queue.get(block=False)
+        except queue.Empty:
+            return error
+
+        if result_key == "-ERROR-":
+            error = True
+            print(f"Error: {result}", file=sys.stderr)
+        elif result_key in ["-IMPORT_NEWS-", "-BACKTEST_CANCELED-"]:
+            print(result or "Canceled", file=sys.stderr)
+        elif result_key == "-STAGE-":
+            if stage_options["print"]:
+                print(f"Stage {format_stage(result)}", file=sys.stderr)
+            if stage_options["log_path"]:
+                core.append_stage_log(stage_options["log_path"], result)
+
+
+def load_settings(filename: str) -> dict:
+    """
+    Returns the app settings from a tta_settings.json style file with the
+    defaults filled in for anything that is missing
+    """
+    app_settings = {}
+    if filename:
+        with open(filename, "r") as f:
+            app_settings = json.load(f)
+    core.set_default_app_settings(app_settings)
+    return app_settings
+
+
+def get_strategy_settings(files_list: list, app_settings: dict) -> dict:
+    """
+    Builds the strategy settings for the files the way the GUI does when
+    the files are selected, applying any per strategy settings from the
+    settings file on top of the app settings
+    """
+    if app_settings["-PORTFOLIO_MODE-"]:
+        strategies = [os.path.basename(file) for file in files_list]
+    else:
+        strategies = ["-SINGLE_MODE-"]
+
+    strategy_settings = {}
+    for strategy in strategies:
+        overrides = app_settings.get(strategy, {})
+        values = {
+            **app_settings,
+            "-PASSTHROUGH_MODE-": False,
+            "-PORT_WEIGHT-": 100 / len(strategies),
+            **overrides,
+        }
+        strategy_settings[strategy] = dict(overrides)
+        core.update_strategy_settings(values, strategy_settings[strategy])
+
+    return strategy_settings
+
+
+def parse_date(date_str: str, name: str):
+    if not date_str:
+        return None
+    try:
+        return date_parser.parse(date_str, fuzzy=True).date()
+    except ValueError:
+        raise ValueError(
+            f"Problem parsing {name} Date. Try entering in YYYY-MM-DD format"
+        )
+
+
+def load_news_events(filename: str, strategy_settings: dict) -> bool:
+    """
+    Imports the news event calendar from the file given or, when the
+    strategies need it, looks for one in the current directory like the
+    GUI does on start up
+    """
+    if filename:
+        if not core.import_news_events(filename):
+            print(
+                f"Error: {filename} does not appear to be a CSV from"
+                " https://www.fxstreet.com/economic-calendar",
+                file=sys.stderr,
+            )
+            return False
+        core.news_events_loaded = True
+        return True
+
+    for settings in strategy_settings.values():
+        if settings["-NEWS_EXCLUSIONS-"] or settings["-AUTO_EXCLUSIONS-"]:
+            core.find_and_import_news_events()
+            report_messages()
+            break
+    return True
+
+
+def write_top_times(df_dicts: dict, strategy_settings: dict, filename: str) -> None:
+    """
+    Writes the top times of every strategy and weekday tab to one CSV
+    """
+    top_times = []
+    for right_type, day_dict in df_dicts.items():
+        for day, df_dict in day_dict.items():
+            top_times_df = core.get_top_times(df_dict, strategy_settings)
+            top_times_df.insert(0, "Day", day)
+            top_times_df.insert(0, "Strategy", right_type)
+            top_times.append(top_times_df)
+    pd.concat(top_times, ignore_index=True).to_csv(filename, index=False)
+
+
+def write_walk_forward_results(results: dict, path: str) -> None:
+    """
+    Writes the daily walk forward results of each strategy and a CSV with
+    the summary metrics of all of them
+    """
+    summary = []
+    for strat, result_df in results.items():
+        if result_df.empty:
+            print(
+                f"{strat} contains no results. Perhaps the dataset does not"
+                " go back far enough?",
+                file=sys.stderr,
+            )
+            continue
+        filename = core.get_next_filename(path, f"{strat} - Walk Forward", ".csv")
+        result_df.to_csv(filename, index=False)
+        summary.append({"Strategy": strat, **core.calculate_summary_metrics(result_df)})
+
+    if summary:
+        filename = core.get_next_filename(path, "Summary Metrics", ".csv")
+        pd.DataFrame(summary).to_csv(filename, index=False)
+
+
+def get_args():
+    arg_parser = argparse.ArgumentParser(
+        description="Run the Tranche Time Analyzer without the GUI"
+    )
+    arg_parser.add_argument("files", nargs="+", help="trade log CSV files")
+    arg_parser.add_argument(
+        "--settings", help="settings JSON with the same keys as tta_settings.json"
+    )
+    arg_parser.add_argument(
+        "--output",
+        help="directory for the results, defaults to the data folder next to"
+        " the first trade log",
+    )
+    arg_parser.add_argument(
+        "--news-events", help="news event CSV from fxstreet.com/economic-calendar"
+    )
+    arg_parser.add_argument(
+        "--spx-history",
+        help="CSV with the daily Date, Open and Close of SPX to calculate the"
+        " gaps from instead of downloading them",
+    )
+    arg_parser.add_argument(
+        "--portfolio",
+        action=argparse.BooleanOptionalAction,
+        help="analyze the files as a portfolio of strategies",
+    )
+    arg_parser.add_argument(
+        "--walk-forward",
+        action=argparse.BooleanOptionalAction,
+        help="run the walk forward test after the analysis",
+    )
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of processes to analyze the files with, defaults to all"
+        " CPU cores when -PARALLEL- is set in the settings file, otherwise 1",
+    )
+    arg_parser.add_argument(
+        "--output-format",
+        choices=core.heatmap_output_formats,
+        help="format to save the heatmap tables in, None skips writing them",
+    )
+    arg_parser.add_argument("--start", help="walk forward start date")
+    arg_parser.add_argument("--end", help="walk forward end date")
+    arg_parser.add_argument(
+        "--initial-value", help="walk forward starting portfolio value"
+    )
+    arg_parser.add_argument(
+        "--scaling",
+        action=argparse.BooleanOptionalAction,
+        help="scale the number of tranches with the portfolio value",
+    )
+    arg_parser.add_argument(
+        "--export-trades",
+        action=argparse.BooleanOptionalAction,
+        help="export the walk forward trade logs",
+    )
+    arg_parser.add_argument(
+        "--export-oo-sig",
+        action=argparse.BooleanOptionalAction,
+        help="export the walk forward trades as Option Omega signal files",
+    )
+    arg_parser.add_argument(
+        "--fast-wf",
+        action=argparse.BooleanOptionalAction,
+        help="run the walk forward test with the vectorized engine when not"
+        " scaling and without passthrough or auto exclusions",
+    )
+    arg_parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="print the time, rows and peak memory of each stage of the run",
+    )
+    arg_parser.add_argument(
+        "--stage-log",
+        action=argparse.BooleanOptionalAction,
+        help="append the stage timings to stage_log.jsonl in the output directory",
+    )
+    return arg_parser.parse_args()
+
+
+def main() -> int:
+    args = get_args()
+
+    for file in args.files:
+        if os.path.splitext(file)[1].lower() != ".csv":
+            print(f"Error: {file} does not appear to be a csv file", file=sys.stderr)
+            return 1
+
+    app_settings = load_settings(args.settings)
+    # command line options take precedence over the settings file
+    for key, arg in [
+        ("-PORTFOLIO_MODE-", args.portfolio),
+        ("-OUTPUT_FORMAT-", args.output_format),
+        ("-BACKTEST-", args.walk_forward),
+        ("-START_DATE-", args.start),
+        ("-END_DATE-", args.end),
+        ("-START_VALUE-", args.initial_value),
+        ("-SCALING-", args.scaling),
+        ("-EXPORT-", args.export_trades),
+        ("-EXPORT_OO_SIG-", args.export_oo_sig),
+        ("-FAST_WF-", args.fast_wf),
+        ("-STAGE_LOG-", args.stage_log),
+    ]:
+        if arg is not None:
+            app_settings[key] = arg
+
+    strategy_settings = get_strategy_settings(args.files, app_settings)
+    result = core.validate_strategy_settings(strategy_settings)
+    if type(result) == str:
+        print(f"Error: {result}", file=sys.stderr)
+        return 1
+
+    try:
+        start_date = parse_date(app_settings["-START_DATE-"], "Start")
+        end_date = parse_date(app_settings["-END_DATE-"], "End")
+        initial_value = float(app_settings["-START_VALUE-"])
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if not load_news_events(args.news_events, strategy_settings):
+        return 1
+
+    if args.spx_history and not core.import_spx_history(args.spx_history):
+        print(
+            f"Error: {args.spx_history} does not appear to be a CSV with the daily"
+            " Date, Open and Close of SPX",
+            file=sys.stderr,
+        )
+        return 1
+
+    output_path = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(args.files[0])), "data"
+    )
+    os.makedirs(output_path, exist_ok=True)
+    stage_options["print"] = args.timings
+    if app_settings["-STAGE_LOG-"]:
+        stage_options["log_path"] = output_path
+
+    workers = args.workers
+    if workers is None:
+        workers = os.cpu_count() if app_settings["-PARALLEL-"] else 1
+    df_dicts = core.run_analysis_threaded(
+        args.files,
+        strategy_settings,
+        False,
+        workers=workers,
+        output_format=app_settings["-OUTPUT_FORMAT-"],
+    )
+    error = report_messages()
+    if not df_dicts or "Put-Call Comb" not in df_dicts:
+        print("Error: none of the trade logs could be analyzed", file=sys.stderr)
+        return 1
+
+    write_top_times(
+        df_dicts,
+        strategy_settings,
+        core.get_next_filename(output_path, "Top Times", ".csv"),
+    )
+
+    if app_settings["-BACKTEST-"]:
+        path = os.path.join(output_path, "trade_logs")
+        os.makedirs(path, exist_ok=True)
+        results = core.walk_forward_test(
+            df_dicts,
+            path,
+            strategy_settings,
+            initial_value=initial_value,
+            start=start_date,
+            end=end_date,
+            use_scaling=app_settings["-SCALING-"],
+            export_trades=app_settings["-EXPORT-"],
+            export_OO_sig=app_settings["-EXPORT_OO_SIG-"],
+            fast_engine=app_settings["-FAST_WF-"],
+        )
+        error = report_messages() or error
+        if results is None:
+            return 1
+        write_walk_forward_results(results, output_path)
+
+    # the heatmap workbooks are saved in the background during the walk forward
+    core.wait_for_heatmaps()
+    error = report_messages() or error
+    return 1 if error else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,3353 @@
+"""
+Analysis and walk forward engine of the Tranche Time Analyzer.
+
+Nothing in here imports PySimpleGUI or Tk so the same code runs behind the
+GUI in tranche_time_analyzer.py and headless from tta_cli.py.  Long running
+functions report their progress and results through 'results_queue'.
+"""
+
+import bisect
+import calendar
+import concurrent.futures
+import contextlib
+import datetime as dt
+import functools
+import gc
+import hashlib
+import os
+import json
+import multiprocessing
+import platform
+import queue
+import subprocess
+import sys
+import threading
+from time import perf_counter
+import uuid
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar,
+    GoodFriday,
+    Holiday,
+    USLaborDay,
+    USMartinLutherKingJr,
+    USMemorialDay,
+    USPresidentsDay,
+    USThanksgivingDay,
+    nearest_workday,
+    sunday_to_monday,
+)
+import xlsxwriter
+import yfinance as yf
+
+# results queue for threads
+results_queue = queue.Queue()
+cancel_flag = threading.Event()
+
+weekday_list = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+# formats the heatmap tables can be saved in, "None" only keeps them in memory
+heatmap_output_formats = ["None", "XLSX", "Parquet", "CSV"]
+day_names = weekday_list + ["Saturday", "Sunday"]
+analysis_options = {
+    "weekday_exclusions": [],
+    "put_or_call": True,
+    "idv_weekday": True,
+    "news_exclusions": [],
+}
+
+news_events = {
+    "CPI": [],
+    "Initial Jobless Claims": [],
+    "Retail Sales": [],
+    "ADP": [],
+    "JOLT": [],
+    "Unemployment/NFP": [],
+    "PPI": [],
+    "GDP": [],
+    "PCE": [],
+    "Triple Witching": [],
+    "Beige Book": [],
+    "ISM Manufacturing PMI": [],
+    "ISM Services PMI": [],
+    "S&P Global PMI": [],
+    "Fed Chair Speech": [],
+    "FOMC Minutes": [],
+    "FOMC": [],
+    "MI Consumer Sent.": [],
+    "Chicago PMI": [],
+}
+news_events_loaded = False
+# calendar index of news_events rebuilt on import. The bit of each event, the
+# dates of each event as frozen sets and an array with the bitmask of the
+# events on each day from the first event date onwards.
+news_event_bits = {event: 1 << i for i, event in enumerate(news_events)}
+news_event_dates = {event: frozenset() for event in news_events}
+news_event_calendar = {"start": 0, "bitmask": np.zeros(0, dtype=np.uint32)}
+
+# bump when the normalized trade log changes so old cached copies are ignored
+TRADE_LOG_CACHE_VERSION = 2
+# bump when the parsing of the economic calendar changes
+NEWS_EVENTS_CACHE_VERSION = 1
+
+# heatmap workbooks are written one at a time on a background thread, started
+# on first use so every process gets its own
+heatmap_executor = None
+heatmap_futures = []
+# color scale of the heatmap cells, red at the lowest value of a row, yellow
+# at the median and green at the highest like Excel's 3 color scale
+HEATMAP_COLORS = np.array([[255, 0, 0], [255, 255, 0], [0, 128, 0]])
+HEATMAP_COLOR_STEPS = 32
+# least seconds between the -PROGRESS- messages of a long running loop
+PROGRESS_INTERVAL = 0.25
+
+# folder the app runs from, next to the executable when frozen
+APP_DIR = os.path.dirname(
+    os.path.abspath(sys.executable if getattr(sys, "frozen", False) else __file__)
+)
+
+# SPX daily history shared by all trade logs, loaded from disk on first use.
+# It is kept in the app folder so every run finds it wherever it is started.
+spx_history_path = os.path.join(APP_DIR, "data", "cache")
+spx_history_store = None
+spx_history_lock = threading.Lock()
+# date ranges that could not be downloaded with the time they failed, not
+# tried again until SPX_DOWNLOAD_RETRY_SECONDS later
+spx_failed_downloads = []
+SPX_DOWNLOAD_RETRY_SECONDS = 60
+# regular full day closures of the NYSE, a range of only these days and
+# weekends has no SPX history to download
+nyse_holiday_calendar = AbstractHolidayCalendar(
+    "NYSE",
+    rules=[
+        Holiday("New Years Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday(
+            "Juneteenth",
+            month=6,
+            day=19,
+            start_date="2022-06-19",
+            observance=nearest_workday,
+        ),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ],
+)
+
+
+def with_gc(func):
+    """
+    Decorator to garbage collect threaded functions.
+    This resolves the Tcl_AsyncDelete error
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        gc.collect()
+        return result
+
+    return wrapper
+
+
+def get_peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of this process in MB, or None if it
+    can't be measured on this platform
+    """
+    # on Linux getrusage keeps the peak of the process that spawned this one,
+    # the high water mark in /proc only covers this process
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 2**10, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+@contextlib.contextmanager
+def timed_stage(stage: str, file: str = None, strategy: str = None, **details):
+    """
+    Times the with block and posts a -STAGE- message to 'results_queue'
+    with its duration, the rows it handled and the peak memory of the
+    process so far.  The block can set "rows" in the dict it is given.
+    """
+    span = {
+        "stage": stage,
+        "file": os.path.basename(file) if file else None,
+        "strategy": strategy,
+        **details,
+        "rows": None,
+    }
+    start = perf_counter()
+    try:
+        yield span
+    finally:
+        span["seconds"] = round(perf_counter() - start, 4)
+        span["peak_rss_mb"] = get_peak_rss_mb()
+        span["pid"] = os.getpid()
+        span["time"] = dt.datetime.now().isoformat(timespec="milliseconds")
+        results_queue.put(("-STAGE-", span))
+
+
+def timed(stage: str, count_rows=None):
+    """
+    Decorator to run a function as a timed_stage, with the rows counted
+    from its result by 'count_rows'
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed_stage(stage) as span:
+                result = func(*args, **kwargs)
+                if count_rows and result is not None:
+                    span["rows"] = count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def append_stage_log(path: str, span: dict) -> None:
+    """
+    Appends a -STAGE- span to the JSON lines stage log in 'path'
+    """
+    try:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "stage_log.jsonl"), "a") as f:
+            f.write(json.dumps(span) + "\n")
+    except OSError:
+        # the log is only diagnostics, never fail a run over it
+        pass
+
+
+def progress_reporter(task: str, total: float, unit: str):
+    """
+    Returns a function that posts how far 'task' is through 'total' units
+    to 'results_queue' as a -PROGRESS- message, along with the throughput
+    and the estimated time left.  It can be called on every step of a
+    loop, messages are sent at most every PROGRESS_INTERVAL seconds unless
+    forced.
+    """
+    start = perf_counter()
+    last_report = -PROGRESS_INTERVAL
+
+    def report(done: float, label: str = None, force: bool = False) -> None:
+        nonlocal last_report
+        now = perf_counter()
+        if now - last_report < PROGRESS_INTERVAL and not force:
+            return
+        last_report = now
+        elapsed = now - start
+        rate = done / elapsed if done and elapsed else None
+        results_queue.put(
+            (
+                "-PROGRESS-",
+                {
+                    "task": task,
+                    "done": done,
+                    "total": total,
+                    "unit": unit,
+                    "label": label,
+                    "elapsed": round(elapsed, 2),
+                    "rate": rate,
+                    "eta": (total - done) / rate if rate else None,
+                },
+            )
+        )
+
+    return report
+
+
+def build_analysis_cube(df: pd.DataFrame, settings: dict) -> pd.DataFrame:
+    """
+    Sums the values the PCR or average PnL is calculated from once for each
+    period, entry time, weekday, option type and gap direction, along with
+    the first and last entry time of each.  Each analysis slice can then be
+    filtered from this compact cube and summed per period and entry time
+    without regrouping the raw trades.
+    """
+    agg_type = "".join(word[0] for word in settings["-AGG_TYPE-"].split("-"))
+    calc_type = settings["-CALC_TYPE-"]
+    if calc_type not in ["PCR", "PnL"]:
+        raise ValueError("Invalid calc_type. Expected 'PCR' or 'PnL'.")
+
+    if agg_type == "SM":
+        # semi-monthly periods end on the 15th or the last day of the month
+        entry_times = df["EntryTime"].dt
+        period_day = np.where(entry_times.day <= 15, 15, entry_times.days_in_month)
+        period = entry_times.to_period("M").dt.to_timestamp() + pd.to_timedelta(
+            period_day - 1, unit="D"
+        )
+    else:
+        period = df["EntryTime"].dt.to_period(agg_type)
+
+    # the values are calculated the same way as the per trade P/L of each
+    # data set so the sums of a group match summing its trades on their own
+    if is_BYOB_data(df):
+        pnl = df["ProfitLossAfterSlippage"] - df["CommissionFees"] / 100
+        if calc_type == "PCR":
+            numerator, denominator = pnl, df["Premium"]
+        else:
+            # the average of the P/L of the trades that have one
+            numerator, denominator = pnl * 100, pnl.notna().astype(float)
+    else:  # OO BT data
+        numerator = df["P/L"]
+        if calc_type == "PCR":
+            denominator = df["Premium"] * df["No. of Contracts"]
+        else:
+            denominator = df["No. of Contracts"]
+
+    # gap direction for the day of the trade
+    gap = pd.Series("", index=df.index)
+    if settings["-GAP_ANALYSIS-"]:
+        _gap_type = "Gap%" if settings["-GAP_TYPE-"] == "%" else "Gap"
+        if _gap_type in df:
+            gap = gap.mask(df[_gap_type] > settings["-GAP_THRESHOLD-"], "Gap Up")
+            gap = gap.mask(df[_gap_type] < -settings["-GAP_THRESHOLD-"], "Gap Down")
+
+    trades = pd.DataFrame(
+        {
+            "period": period,
+            "Time": df["Time"],
+            "Day of Week": df["Day of Week"],
+            "OptionType": df["OptionType"],
+            "Gap": gap,
+            "Numerator": numerator.astype(float),
+            "Denominator": denominator.astype(float),
+            "EntryTime": df["EntryTime"],
+        }
+    )
+    return (
+        trades.groupby(
+            ["period", "Time", "Day of Week", "OptionType", "Gap"], observed=True
+        )
+        .agg(
+            Numerator=("Numerator", "sum"),
+            Denominator=("Denominator", "sum"),
+            FirstEntry=("EntryTime", "min"),
+            LastEntry=("EntryTime", "max"),
+        )
+        .reset_index()
+    )
+
+
+def calculate_period_metrics(cube: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduces a slice of the analysis cube to a table of PCR or average PnL
+    with a row for each period and a column for each entry time
+    """
+    sums = cube.groupby(["period", "Time"], observed=True)[
+        ["Numerator", "Denominator"]
+    ].sum()
+    values = sums["Numerator"] / sums["Denominator"]
+    values.index = values.index.remove_unused_levels()
+    df_calc = values.unstack(level=-1)
+    # the entry time labels become plain string columns of the output tables
+    df_calc.columns = df_calc.columns.astype(str)
+    return df_calc
+
+
+def analyze(
+    cube: pd.DataFrame,
+    settings: dict,
+    cache: dict = None,
+    average_weights: list = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Takes the slice of the analysis cube for one strategy/weekday/gap
+    and returns the weighted trailing average and 1 month average tables.
+    The period table and rolling averages of the slice are kept in 'cache'
+    so analyzing it again with other averaging settings can reuse them.
+    'average_weights' are the (period 1, period 2) weights in % the slice
+    will be analyzed with next, like the weights of a parameter sweep.  The
+    averages are weighted with all of them at once and kept in 'cache' until
+    other averaging periods are used.
+    """
+    if cache is None:
+        cache = {}
+    if cube.empty or settings["-PASSTHROUGH_MODE-"]:
+        return pd.DataFrame(columns=["Date Range"]), pd.DataFrame(
+            columns=["Date Range"]
+        )
+    short_avg_period = settings["-AVG_PERIOD_1-"]
+    long_avg_period = settings["-AVG_PERIOD_2-"]
+    short_weight = settings["-PERIOD_1_WEIGHT-"] / 100
+    long_weight = settings["-PERIOD_2_WEIGHT-"] / 100
+    calc_type = settings["-CALC_TYPE-"]
+    agg_type = "".join(word[0] for word in settings["-AGG_TYPE-"].split("-"))
+
+    def get_rolling_average(df, window):
+        if window not in cache:
+            cache[window] = df.rolling(window, min_periods=1).mean()
+        return cache[window]
+
+    def calculate_rolling_averages(df, short_avg_period, long_avg_period, agg_type):
+        if agg_type == "W":
+            short_avg_period = int(short_avg_period * 4.33)
+            long_avg_period = int(long_avg_period * 4.33)
+        elif agg_type == "SM":  # semi-monthly
+            short_avg_period = int(short_avg_period * 2)
+            long_avg_period = int(long_avg_period * 2)
+
+        windows = (short_avg_period, long_avg_period)
+        weights = (short_weight, long_weight)
+        if cache.get("weighted", {}).get("windows") != windows:
+            cache["weighted"] = {"windows": windows, "averages": {}}
+        weighted_avgs = cache["weighted"]["averages"]
+        if weights not in weighted_avgs:
+            weight_pairs = [weights] + [
+                (weight_1 / 100, weight_2 / 100)
+                for weight_1, weight_2 in average_weights or []
+            ]
+            weight_pairs = list(dict.fromkeys(weight_pairs))
+            # stack the averages and broadcast every pair of weights over them
+            averages = np.stack(
+                [
+                    get_rolling_average(df, short_avg_period).to_numpy(),
+                    get_rolling_average(df, long_avg_period).to_numpy(),
+                ]
+            )
+            short_weights, long_weights = np.array(weight_pairs).T[..., None, None]
+            weighted = short_weights * averages[0] + long_weights * averages[1]
+            for pair, values in zip(weight_pairs, weighted):
+                weighted_avgs[pair] = pd.DataFrame(
+                    values, index=df.index, columns=df.columns
+                )
+        return weighted_avgs[weights]
+
+    def create_output_labels(df, long_avg_period, start_date, end_date, agg_type):
+        # the end of each period and the start of its trailing average window
+        if agg_type == "M":
+            current_period_end = df.index.to_timestamp() + pd.offsets.MonthEnd(1)
+            previous_period_start = (df.index - (long_avg_period - 1)).to_timestamp()
+        elif agg_type == "W":
+            current_period_end = df.index.to_timestamp() + pd.offsets.Week(weekday=6)
+            previous_period_start = current_period_end - pd.DateOffset(
+                weeks=int(long_avg_period * 4.33)
+            )
+        elif agg_type == "SM":  # Semi-Monthly
+            month = df.index.to_period("M")
+            first_half = df.index.day <= 15
+            current_period_end = pd.DatetimeIndex(
+                np.where(
+                    first_half,
+                    month.to_timestamp() + pd.Timedelta(days=14),
+                    month.to_timestamp(how="end").normalize(),
+                )
+            )
+            previous_period_start = pd.DatetimeIndex(
+                np.where(
+                    first_half,
+                    current_period_end - pd.DateOffset(months=long_avg_period),
+                    (month - (long_avg_period - 1)).to_timestamp(),
+                )
+            )
+        else:
+            current_period_end = df.index.to_timestamp() + pd.offsets.DateOffset(
+                freq=agg_type
+            )
+            previous_period_start = current_period_end - pd.DateOffset(
+                freq=agg_type, periods=long_avg_period - 1
+            )
+
+        date_range_labels = (
+            current_period_end.strftime("%Y-%m-%d")
+            + " - "
+            + previous_period_start.strftime("%Y-%m-%d")
+        ).tolist()
+        # the newest row runs to the end of the data and the oldest row
+        # back to its start
+        if len(date_range_labels) > 1:
+            date_range_labels[-1] = f"{current_period_end[-1].date()} - {start_date}"
+        date_range_labels[0] = f"{end_date} - {previous_period_start[0].date()}"
+        return pd.DataFrame({"Date Range": date_range_labels}, index=df.index)
+
+    def perform_analysis(df_calc):
+        weighted_avg = calculate_rolling_averages(
+            df_calc, short_avg_period, long_avg_period, agg_type
+        )
+        one_month_avg = get_rolling_average(
+            df_calc, 1 if agg_type == "M" else 2 if agg_type == "SM" else 4
+        )
+
+        weighted_avg = weighted_avg.sort_index(ascending=False)
+        one_month_avg = one_month_avg.sort_index(ascending=False)
+
+        if isinstance(weighted_avg, pd.Series):
+            weighted_avg = weighted_avg.to_frame()
+
+        # round off the float error of the sums first, so a value that sits
+        # on a rounding boundary rounds the same way whatever order its
+        # trades were summed in and the top times rank the same
+        if calc_type == "PCR":
+            weighted_avg = weighted_avg.apply(lambda x: round(round(x, 10), 4))
+            one_month_avg = one_month_avg.apply(lambda x: round(round(x, 10), 4))
+        elif calc_type == "PnL":
+            weighted_avg = weighted_avg.apply(lambda x: round(round(x, 10), 2))
+            one_month_avg = one_month_avg.apply(lambda x: round(round(x, 10), 2))
+
+        output_labels = create_output_labels(
+            weighted_avg, long_avg_period, start_date, end_date, agg_type
+        )
+        one_month_avg_labels = create_output_labels(
+            one_month_avg, 1, start_date, end_date, agg_type
+        )
+
+        df_output = pd.concat([output_labels, weighted_avg], axis=1)
+        df_output_1mo_avg = pd.concat([one_month_avg_labels, one_month_avg], axis=1)
+
+        return df_output, df_output_1mo_avg
+
+    start_date = cube["FirstEntry"].min().date()
+    end_date = cube["LastEntry"].max().date()
+
+    if "period_metrics" not in cache:
+        cache["period_metrics"] = calculate_period_metrics(cube)
+    df_output_combined, df_output_1mo_avg_combined = perform_analysis(
+        cache["period_metrics"]
+    )
+
+    return (
+        df_output_combined,
+        df_output_1mo_avg_combined,
+    )
+
+
+def create_excel_file(
+    file,
+    settings,
+    open_files,
+    output_format: str = "XLSX",
+    analysis_cache: dict = None,
+    progress=None,
+    average_weights: list = None,
+) -> dict:
+    """
+    Analyzes every slice of a trade log and saves the heatmaps.  'progress'
+    is called with the number of slices done, the slice count and the
+    slice being analyzed.  'average_weights' are passed on to analyze.
+    """
+    calc_type = settings["-CALC_TYPE-"]
+    short_avg_period = settings["-AVG_PERIOD_1-"]
+    short_weight = settings["-PERIOD_1_WEIGHT-"] / 100
+    long_avg_period = settings["-AVG_PERIOD_2-"]
+    long_weight = settings["-PERIOD_2_WEIGHT-"] / 100
+    weekday_exclusions = []
+    news_exclusions = []
+    if settings["-APPLY_EXCLUSIONS-"] != "Walk Forward Test":
+        weekday_exclusions = settings["-WEEKDAY_EXCLUSIONS-"]
+        # news events with dates to skip.
+        news_exclusions = settings["-NEWS_EXCLUSIONS-"]
+
+    # runs that only change the averaging settings, like a parameter sweep,
+    # pass an 'analysis_cache' to reuse the trades and slices of each file
+    if analysis_cache is None:
+        file_cache = {}
+    else:
+        file_cache = analysis_cache.setdefault(file, {})
+
+    if "data" not in file_cache:
+        # load the data
+        with timed_stage("load_data", file) as span:
+            result = load_data(file)
+            if result:
+                span["rows"] = len(result[0])
+        if result:
+            df, start_date, end_date = result
+            filtered_df = df[
+                (~df["Day of Week"].isin(weekday_exclusions))
+                & (~get_news_event_mask(df["EntryTime"], news_exclusions))
+            ]
+        else:
+            return
+
+        # aggregate the trades used for the analysis once for all the slices below
+        with timed_stage("build_cube", file) as span:
+            cube = build_analysis_cube(filtered_df, settings)
+            span["rows"] = len(filtered_df)
+        file_cache["data"] = (df, filtered_df, cube, start_date, end_date)
+    df, filtered_df, cube, start_date, end_date = file_cache["data"]
+
+    # path and orginal filename
+    path = os.path.join(os.path.dirname(file), "data", "heatmaps")
+    org_filename = os.path.splitext(os.path.basename(file))[0]
+    os.makedirs(path, exist_ok=True)
+
+    # Create filename
+    filename = os.path.join(
+        path,
+        (
+            f"{org_filename}-TWAvg({calc_type})_{short_avg_period}mo({short_weight * 100:.0f})-{long_avg_period}mo({long_weight * 100:.0f})_{start_date} -"
+            f" {end_date}.xlsx"
+        ),
+    )
+
+    # get the sheets for day of week
+    day_to_num = {
+        "Monday": 1,
+        "Tuesday": 2,
+        "Wednesday": 3,
+        "Thursday": 4,
+        "Friday": 5,
+        "Saturday": 6,
+        "Sunday": 7,
+    }
+
+    days_sorted = ["All"]
+    if settings["-IDV_WEEKDAY-"]:
+        # This gets the unique days of the week from the DataFrame, then sorts them based on the numerical value
+        days_sorted = days_sorted + sorted(
+            [
+                d
+                for d in filtered_df["Day of Week"].unique()
+                if d not in settings["-WEEKDAY_EXCLUSIONS-"]
+            ],
+            key=lambda day: day_to_num[day],
+        )
+
+    df_dicts = {"Put-Call Comb": {}}
+    if settings["-PUT_OR_CALL-"]:
+        df_dicts["Puts"] = {}
+        df_dicts["Calls"] = {}
+
+    if settings["-GAP_ANALYSIS-"]:
+        for strat in df_dicts.copy():
+            df_dicts[f"{strat} Gap Up"] = {}
+            df_dicts[f"{strat} Gap Down"] = {}
+
+    gap_error = False
+    sheets = []
+    slice_count = len(df_dicts) * len(days_sorted)
+    for strat_index, strat in enumerate(df_dicts.copy()):
+        with timed_stage("analyze", file, strat) as span:
+            for day_index, day in enumerate(days_sorted):
+                # check for cancel flag to stop thread
+                if cancel_flag.is_set():
+                    return
+
+                if progress:
+                    progress(
+                        strat_index * len(days_sorted) + day_index,
+                        slice_count,
+                        f"{strat} {day}",
+                    )
+
+                slice_cache = file_cache.get((strat, day))
+                if slice_cache is None:
+                    try:
+                        slices = get_analysis_slice(
+                            df, filtered_df, cube, strat, day, settings
+                        )
+                    except KeyError:
+                        # gap data did not load, maybe no internet
+                        slices = (
+                            pd.DataFrame(columns=df.columns),
+                            pd.DataFrame(columns=df.columns),
+                            cube.iloc[0:0],
+                        )
+                        if not gap_error:
+                            gap_error = True  # only notify once
+                            results_queue.put(
+                                (
+                                    "-ERROR-",
+                                    "Gap data could not be loaded!\nAnalysis will continue without it.",
+                                )
+                            )
+                    slice_cache = {"slices": slices, "analysis": {}}
+                    file_cache[(strat, day)] = slice_cache
+                _df, _filtered_df, _cube = slice_cache["slices"]
+                if day == "All":
+                    span["rows"] = len(_filtered_df)
+
+                # run the analysis, the cube was built from the filtered df
+                # so the exclusions are already applied when they are needed
+                df_output, df_output_1mo_avg = analyze(
+                    _cube, settings, slice_cache["analysis"], average_weights
+                )
+                if settings["-APPLY_EXCLUSIONS-"] != "Walk Forward Test":
+                    # store the results and the original df in case we need it later
+                    df_dicts[strat][day[:3]] = {"org_df": _df, "result_df": df_output}
+                else:
+                    # store the results and the original df in case we need it later
+                    if settings["-APPLY_EXCLUSIONS-"] == "Analysis":
+                        # since we are only excluded from analysis we will store the non-filtered df
+                        df_dicts[strat][day[:3]] = {
+                            "org_df": _df,
+                            "result_df": df_output,
+                        }
+                    else:
+                        # otherwise we are exluding from both so we can should store the filtered df
+                        df_dicts[strat][day[:3]] = {
+                            "org_df": _filtered_df,
+                            "result_df": df_output,
+                        }
+                # index the trades the WF test will fill by entry time and date
+                if "trade_index" not in slice_cache:
+                    slice_cache["trade_index"] = index_trade_log(
+                        df_dicts[strat][day[:3]]["org_df"]
+                    )
+                df_dicts[strat][day[:3]].update(slice_cache["trade_index"])
+
+                # collect the sheets to write once the analysis is done
+                if not settings["-PASSTHROUGH_MODE-"]:
+                    sheets.append((f"{strat}_{day[:3]}", df_output))
+                    sheets.append((f"{strat}_1mo-{day[:3]}", df_output_1mo_avg))
+
+    # the heatmaps are written in the background so the results can be used
+    # while they are being saved
+    if sheets and output_format != "None":
+        save_heatmaps(filename, sheets, settings, open_files, output_format)
+
+    return df_dicts
+
+
+def get_heatmap_colors(
+    values: pd.DataFrame, top_x: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the color scale step of each cell, from 0 at the lowest value
+    of its row to 2 * HEATMAP_COLOR_STEPS at the highest, and whether the
+    cell is one of the top x values of its row
+    """
+    data = values.to_numpy(dtype=float)
+    if not data.size:
+        return np.zeros(data.shape, dtype=int), np.zeros(data.shape, dtype=bool)
+    row_min = values.min(axis=1).to_numpy()[:, None]
+    row_mid = values.quantile(0.5, axis=1).to_numpy()[:, None]
+    row_max = values.max(axis=1).to_numpy()[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(
+            data <= row_mid,
+            (data - row_min) / (row_mid - row_min),
+            1 + (data - row_mid) / (row_max - row_mid),
+        )
+    # rows with a single value are shown in the middle color
+    scale = np.nan_to_num(scale, nan=1.0)
+    steps = np.rint(scale * HEATMAP_COLOR_STEPS).astype(int)
+
+    top = np.zeros(data.shape, dtype=bool)
+    if top_x > 0:
+        ranked = -np.sort(-np.nan_to_num(data, nan=-np.inf), axis=1)
+        threshold = ranked[:, min(top_x, data.shape[1]) - 1][:, None]
+        top = data >= threshold
+    return steps, top
+
+
+def get_heatmap_column_widths(df_output: pd.DataFrame, decimals: int) -> list:
+    """
+    Returns the width of each column of a heatmap sheet from the header and
+    the magnitude of the values, without formatting every cell as text
+    """
+    widths = [max(map(len, df_output["Date Range"]), default=len("Date Range")) + 1]
+    for column in df_output.columns[1:]:
+        values = df_output[column].to_numpy(dtype=float)
+        largest = np.nanmax(np.abs(values), initial=0)
+        digits = int(np.log10(largest)) + 1 if largest >= 1 else 1
+        length = digits + 1 + decimals + int(np.nanmin(values, initial=0) < 0)
+        widths.append(max(length, len(column)) + 1)
+    return widths
+
+
+def write_heatmap_sheet(
+    workbook: xlsxwriter.Workbook,
+    sheet_name: str,
+    df_output: pd.DataFrame,
+    settings: dict,
+    formats: dict,
+) -> None:
+    """
+    Writes the results of one slice to a worksheet with the heatmap colors
+    and top x highlighting baked into the cell formats.  The rows are
+    written in order as the workbook is in constant memory mode.
+    """
+    is_pcr = settings["-CALC_TYPE-"] == "PCR"
+    worksheet = workbook.add_worksheet(sheet_name)
+    values = df_output.iloc[:, 1:]
+    steps, top = get_heatmap_colors(values, settings["-TOP_X-"])
+
+    def get_format(step, is_top):
+        key = (step, is_top)
+        if key not in formats:
+            # interpolate between the 2 colors on either side of the step
+            low = min(step // HEATMAP_COLOR_STEPS, 1)
+            frac = step / HEATMAP_COLOR_STEPS - low
+            color = HEATMAP_COLORS[low] + frac * (
+                HEATMAP_COLORS[low + 1] - HEATMAP_COLORS[low]
+            )
+            properties = {
+                "bg_color": "#{:02X}{:02X}{:02X}".format(*np.rint(color).astype(int))
+            }
+            if is_pcr:
+                properties.update({"num_format": "0.00%", "align": "center"})
+            if is_top:
+                properties.update({"bold": 1, "font_color": "#FFFFFF"})
+            formats[key] = workbook.add_format(properties)
+        return formats[key]
+
+    for col, (column, width) in enumerate(
+        zip(df_output.columns, get_heatmap_column_widths(df_output, 4 if is_pcr else 2))
+    ):
+        worksheet.set_column(col, col, width)
+        worksheet.write_string(0, col, str(column), formats["header"])
+
+    data = values.to_numpy(dtype=float)
+    valid = ~np.isnan(data)
+    for row, label in enumerate(df_output["Date Range"]):
+        worksheet.write_string(row + 1, 0, label, formats["label"])
+        for col in np.flatnonzero(valid[row]):
+            worksheet.write_number(
+                row + 1,
+                col + 1,
+                data[row, col],
+                get_format(steps[row, col], top[row, col]),
+            )
+
+
+def write_heatmap_workbook(
+    filename: str, sheets: list, settings: dict, open_files: bool
+) -> None:
+    """
+    Writes the analysis results of a trade log to a heatmap workbook with a
+    sheet for each (name, df) in 'sheets' and opens it if requested
+    """
+    try:
+        with timed_stage("write_xlsx", filename) as span:
+            span["rows"] = sum(len(df_output) for _, df_output in sheets)
+            workbook = xlsxwriter.Workbook(filename, {"constant_memory": True})
+            formats = {
+                "header": workbook.add_format(
+                    {"bold": 1, "border": 1, "align": "center", "valign": "top"}
+                ),
+                "label": workbook.add_format(
+                    {"align": "center"} if settings["-CALC_TYPE-"] == "PCR" else {}
+                ),
+            }
+            for sheet_name, df_output in sheets:
+                write_heatmap_sheet(workbook, sheet_name, df_output, settings, formats)
+            workbook.close()
+    except Exception as e:
+        results_queue.put(
+            ("-ERROR-", f"Could not save {os.path.basename(filename)}\n\n{e}")
+        )
+        return
+
+    # open file in excel
+    if open_files:
+        try:
+            if platform.system() == "Windows":
+                os.startfile(filename)
+            elif platform.system() == "Darwin":  # This is the value returned for macOS
+                subprocess.Popen(["open", filename])
+            else:
+                subprocess.call(("xdg-open", filename))  # linux
+        except:
+            pass
+
+
+def write_heatmap_tables(filename: str, sheets: list, output_format: str) -> None:
+    """
+    Writes each (name, df) in 'sheets' to its own Parquet or CSV file in a
+    folder named after the heatmap workbook
+    """
+    path = os.path.splitext(filename)[0]
+    try:
+        with timed_stage(f"write_{output_format.lower()}", path) as span:
+            span["rows"] = sum(len(df_output) for _, df_output in sheets)
+            os.makedirs(path, exist_ok=True)
+            for sheet_name, df_output in sheets:
+                table_filename = os.path.join(
+                    path, f"{sheet_name}.{output_format.lower()}"
+                )
+                if output_format == "Parquet":
+                    df_output.to_parquet(table_filename, index=False)
+                else:
+                    df_output.to_csv(table_filename, index=False)
+    except Exception as e:
+        results_queue.put(
+            ("-ERROR-", f"Could not save {os.path.basename(path)}\n\n{e}")
+        )
+
+
+def save_heatmaps(
+    filename: str, sheets: list, settings: dict, open_files: bool, output_format: str
+) -> None:
+    """
+    Queues the heatmap workbook or tables to be written on the background
+    thread
+    """
+    global heatmap_executor
+    if heatmap_executor is None:
+        heatmap_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    if output_format == "XLSX":
+        future = heatmap_executor.submit(
+            write_heatmap_workbook, filename, sheets, settings, open_files
+        )
+    else:
+        future = heatmap_executor.submit(
+            write_heatmap_tables, filename, sheets, output_format
+        )
+    heatmap_futures.append(future)
+
+
+def wait_for_heatmaps() -> None:
+    """
+    Blocks until all the queued heatmaps have been written
+    """
+    while heatmap_futures:
+        heatmap_futures.pop(0).result()
+
+
+def get_analysis_slice(
+    df: pd.DataFrame,
+    filtered_df: pd.DataFrame,
+    cube: pd.DataFrame,
+    strat: str,
+    day: str,
+    settings: dict,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Filters the trades, the trades with the exclusions removed and the
+    analysis cube for one strategy/weekday/gap slice.  Raises a KeyError
+    if the slice needs gap data that did not load.
+    """
+    # filter for the weekday
+    # we will keep a dataset with exlusions filtered out and one
+    # with all the data.  We will sort and filter those both for
+    # the analysis but the analysis will only happen on the filtered df
+    # this will allow us to store either the filtered df that has the
+    # exclusions removed or the original df that was filtered for the analysis
+    # type, but still has the excluded events.  This filtered, but non-excluded
+    # df will be what is used for the WF test.  This allows events/weekday exclusions
+    # to be done for analysis only, but still traded during the WF test.
+    if day == "All":
+        _df = df
+        _filtered_df = filtered_df
+        _cube = cube
+    else:
+        _df = df[df["Day of Week"] == day]
+        _filtered_df = filtered_df[filtered_df["Day of Week"] == day]
+        _cube = cube[cube["Day of Week"] == day]
+
+    # filter for calls/puts
+    if strat.startswith("Puts"):
+        _df = _df[_df["OptionType"] == "P"]
+        _filtered_df = _filtered_df[_filtered_df["OptionType"] == "P"]
+        _cube = _cube[_cube["OptionType"] == "P"]
+    elif strat.startswith("Calls"):
+        _df = _df[_df["OptionType"] == "C"]
+        _filtered_df = _filtered_df[_filtered_df["OptionType"] == "C"]
+        _cube = _cube[_cube["OptionType"] == "C"]
+
+    # filter for gaps
+    _gap_type = "Gap%" if settings["-GAP_TYPE-"] == "%" else "Gap"
+    if strat.endswith("Gap Up"):
+        _df = _df[_df[_gap_type] > settings["-GAP_THRESHOLD-"]]
+        _filtered_df = _filtered_df[
+            _filtered_df[_gap_type] > settings["-GAP_THRESHOLD-"]
+        ]
+        _cube = _cube[_cube["Gap"] == "Gap Up"]
+    elif strat.endswith("Gap Down"):
+        _df = _df[_df[_gap_type] < -settings["-GAP_THRESHOLD-"]]
+        _filtered_df = _filtered_df[
+            _filtered_df[_gap_type] < -settings["-GAP_THRESHOLD-"]
+        ]
+        _cube = _cube[_cube["Gap"] == "Gap Down"]
+
+    return _df, _filtered_df, _cube
+
+
+def export_oo_sig_file(trade_log_df: pd.DataFrame, filename: str):
+    """
+    Takes a trade log df and converts to an
+    Option Omega signal file that can be loaded
+    into OO for backtesting and adding to OO portfolio
+    """
+    signal_data = []
+    for _, trade in trade_log_df.iterrows():
+        if "Legs" in trade and isinstance(trade["Legs"], str):
+            # OO data processing (unchanged)
+            legs = trade["Legs"].split("|")
+            for leg in legs:
+                leg_parts = leg.strip().split(" ")
+                signal_data.append(
+                    {
+                        "OPEN_DATETIME": (
+                            trade["Date Opened"].strftime("%Y-%m-%d")
+                            + " "
+                            + trade["Time Opened"][:5]
+                        ),
+                        "BUY_SELL": "B" if leg_parts[5] == "BTO" else "S",
+                        "CALL_PUT": leg_parts[4],
+                        "STRIKE": leg_parts[3],
+                        "EXPIRATION": trade["Date Opened"].strftime("%Y-%m-%d"),
+                        "QUANTITY": int(leg_parts[0]) * trade["qty"],
+                    }
+                )
+        else:
+            # BYOB data processing
+            open_datetime = trade["EntryTime"].strftime("%Y-%m-%d %H:%M")
+
+            # Handle close datetime
+            if pd.notnull(trade["CloseDate"]) and pd.notnull(trade["CloseTime"]):
+                close_datetime = f"{trade['CloseDate']} {trade['CloseTime'][:5]}"
+            else:
+                # Use OpenDate and set time to 16:00 if CloseDate or CloseTime is missing
+                close_datetime = f"{trade['OpenDate']} 16:00"
+
+            signal_data.append(
+                {
+                    "OPEN_DATETIME": open_datetime,
+                    "BUY_SELL": "S",  # We'll do short for the first leg
+                    "CALL_PUT": trade["OptionType"],
+                    "STRIKE": trade["ShortStrike"],
+                    "EXPIRATION": trade["OpenDate"],
+                    "QUANTITY": trade["qty"],
+                }
+            )
+            signal_data.append(
+                {
+                    "OPEN_DATETIME": open_datetime,
+                    "BUY_SELL": "B",  # We'll do long for the second leg
+                    "CALL_PUT": trade["OptionType"],
+                    "STRIKE": trade["LongStrike"],
+                    "EXPIRATION": trade["OpenDate"],
+                    "QUANTITY": trade["qty"],
+                }
+            )
+
+    path = os.path.dirname(filename)
+    basename = os.path.basename(filename)
+    result_df = pd.DataFrame(signal_data)
+    result_df.to_csv(filename, index=False)  # full signal file with puts and calls
+    for right in ["Puts", "Calls"]:  # separate signal files
+        fitlered = result_df[result_df["CALL_PUT"] == right[0]]
+        file_path = os.path.join(path, f"{right}_{basename}")
+        fitlered.to_csv(file_path, index=False)
+
+    return result_df
+
+
+def get_spx_history_filenames() -> Tuple[str, str]:
+    """
+    Returns the filenames of the stored SPX daily history and the metadata
+    with the date range it covers.  The store is shared by all trade logs.
+    """
+    base = os.path.join(spx_history_path, "spx_history")
+    return f"{base}.parquet", f"{base}.json"
+
+
+def load_spx_history() -> dict:
+    """
+    Returns the stored SPX history, reading it from disk the first time.
+    The dict holds the daily Open/Close df indexed by date and the sorted
+    date ranges the df covers, including days the market was closed.
+    """
+    global spx_history_store
+    if spx_history_store is None:
+        history_filename, meta_filename = get_spx_history_filenames()
+        spx_history_store = {"history": pd.DataFrame(), "ranges": []}
+        try:
+            with open(meta_filename, "r") as f:
+                meta = json.load(f)
+            if "ranges" in meta:
+                ranges = meta["ranges"]
+            else:
+                # stores written before the ranges were kept cover one range
+                ranges = [[meta["start"], meta["end"]]]
+            spx_history_store = {
+                "history": pd.read_parquet(history_filename),
+                "ranges": [
+                    (dt.date.fromisoformat(start), dt.date.fromisoformat(end))
+                    for start, end in ranges
+                ],
+            }
+        except Exception:
+            # nothing stored yet, or pyarrow is not installed
+            pass
+    return spx_history_store
+
+
+def merge_date_ranges(ranges: list) -> list:
+    """
+    Returns the (start, end) date ranges sorted with the ones that overlap
+    or follow on from each other merged
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + dt.timedelta(1):
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def get_missing_date_ranges(ranges: list, start: dt.date, end: dt.date) -> list:
+    """
+    Returns the (start, end) date ranges from start to end that are not
+    covered by the sorted, merged 'ranges'
+    """
+    missing = []
+    for covered_start, covered_end in ranges:
+        if covered_end < start:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > start:
+            missing.append((start, covered_start - dt.timedelta(1)))
+        start = covered_end + dt.timedelta(1)
+    if start <= end:
+        missing.append((start, end))
+    return missing
+
+
+def save_spx_history(history: pd.DataFrame, start: dt.date, end: dt.date) -> None:
+    """
+    Merges the daily SPX Open/Close for the dates from start to end into
+    the store and writes it to disk
+    """
+    global spx_history_store
+    store = load_spx_history()
+    if history.empty:
+        history = store["history"]
+    elif not store["history"].empty:
+        # newer data replaces what was stored for the same dates
+        history = pd.concat([store["history"], history])
+        history = history[~history.index.duplicated(keep="last")]
+    spx_history_store = {
+        "history": history.sort_index(),
+        "ranges": merge_date_ranges(store["ranges"] + [(start, end)]),
+    }
+
+    history_filename, meta_filename = get_spx_history_filenames()
+    try:
+        os.makedirs(os.path.dirname(history_filename), exist_ok=True)
+        # write to temp files first so another process never reads half a file
+        spx_history_store["history"].to_parquet(f"{history_filename}.tmp")
+        with open(f"{meta_filename}.tmp", "w") as f:
+            json.dump(
+                {
+                    "ranges": [
+                        [start.isoformat(), end.isoformat()]
+                        for start, end in spx_history_store["ranges"]
+                    ]
+                },
+                f,
+            )
+        os.replace(f"{history_filename}.tmp", history_filename)
+        os.replace(f"{meta_filename}.tmp", meta_filename)
+    except Exception:
+        # the store is only an optimization, the history is still in memory
+        pass
+
+
+def normalize_spx_history(history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Takes daily OHLC data and returns the Open and Close indexed by date
+    """
+    history = history[["Open", "Close"]].astype(float)
+    dates = pd.DatetimeIndex(history.index)
+    if dates.tz is not None:
+        # keep the exchange's local date
+        dates = dates.tz_localize(None)
+    history.index = dates.normalize().rename("Date")
+    return history.dropna()
+
+
+def download_spx_history(start: dt.date, end: dt.date) -> bool:
+    """
+    Downloads the SPX history from yahoo finance for the dates from start
+    to end and adds it to the store.  Returns False if it could not be
+    downloaded, e.g. there is no internet connection.
+    """
+    holidays = nyse_holiday_calendar.holidays(start, end)
+    if not np.busday_count(
+        start, end + dt.timedelta(1), holidays=holidays.values.astype("datetime64[D]")
+    ):
+        # only weekends and holidays, nothing to download
+        save_spx_history(pd.DataFrame(), start, end)
+        return True
+    # when offline every file would wait on the same download again, so a
+    # range that failed is only tried again after a while
+    now = dt.datetime.now()
+    spx_failed_downloads[:] = [
+        (failed_start, failed_end, failed_at)
+        for failed_start, failed_end, failed_at in spx_failed_downloads
+        if (now - failed_at).total_seconds() < SPX_DOWNLOAD_RETRY_SECONDS
+    ]
+    for failed_start, failed_end, _ in spx_failed_downloads:
+        if start <= failed_end and end >= failed_start:
+            return False
+    try:
+        with timed_stage("download_spx") as span:
+            spx = yf.Ticker("^SPX")
+            history = spx.history(start=start, end=end + dt.timedelta(1), interval="1d")
+            span["rows"] = len(history)
+    except Exception:
+        history = pd.DataFrame()
+    if history.empty:
+        spx_failed_downloads.append((start, end, now))
+        return False
+    # today's bar is not final until the close, download it again next time
+    end = min(end, dt.date.today() - dt.timedelta(1))
+    if end >= start:
+        save_spx_history(normalize_spx_history(history), start, end)
+    return True
+
+
+def import_spx_history(filename: str) -> bool:
+    """
+    Imports daily SPX OHLC data from a CSV, e.g. one downloaded from yahoo
+    finance, into the store so gaps can be calculated without a download.
+    The CSV needs Date, Open and Close columns.
+    """
+    try:
+        df = pd.read_csv(filename)
+        df.columns = [column.strip().title() for column in df.columns]
+        df.index = pd.to_datetime(df["Date"], utc=True)
+        history = normalize_spx_history(df)
+    except Exception:
+        return False
+    if history.empty:
+        return False
+    with spx_history_lock:
+        save_spx_history(
+            history, history.index.min().date(), history.index.max().date()
+        )
+    return True
+
+
+def get_spx_gaps(start_date, end_date):
+    start = start_date - dt.timedelta(
+        10
+    )  # make sure we get a few days before for calcs
+    end = end_date + dt.timedelta(1)  # make sure we get the end date
+
+    with spx_history_lock:
+        # only download the dates the store doesn't cover yet
+        for missing_start, missing_end in get_missing_date_ranges(
+            load_spx_history()["ranges"], start, end_date
+        ):
+            download_spx_history(missing_start, missing_end)
+        spx_history = load_spx_history()["history"]
+
+    if spx_history.empty:
+        return spx_history
+    spx_history = spx_history.copy()
+    spx_history["Gap"] = spx_history["Open"] - spx_history["Close"].shift(1)
+    spx_history["Gap%"] = spx_history["Gap"] / spx_history["Close"].shift(1) * 100
+    return spx_history[
+        (spx_history.index >= pd.Timestamp(start))
+        & (spx_history.index < pd.Timestamp(end))
+    ]
+
+
+def get_source_settings(source: str, strategy_settings: dict) -> dict:
+    """
+    Returns the strategy settings that apply to a source in a df_dict
+    """
+    if "-SINGLE_MODE-" in strategy_settings:
+        return strategy_settings["-SINGLE_MODE-"]
+    try:
+        return strategy_settings[f"{source}.csv"]
+    except KeyError:
+        # this is probably the separate put/call analysis we need to parse the source file
+        return strategy_settings[f"{source.split('||')[1]}.csv"]
+
+
+def rank_top_times(result_df: pd.DataFrame, threshold: float) -> dict:
+    """
+    Ranks the entry times of every period in an analysis result so the top
+    times for a date can be looked up without slicing the DataFrame again
+    """
+    df = result_df.drop(columns="Date Range")
+    periods = []
+    ranked = []
+    # result_df is sorted newest first, the index is kept oldest first for bisect
+    for period, row in df.iloc[::-1].iterrows():
+        top_values = row[row >= threshold].sort_values(ascending=False)
+        periods.append(period)
+        ranked.append(list(top_values.items()))
+    return {"threshold": threshold, "periods": periods, "ranked": ranked}
+
+
+def index_top_times(df_dicts: dict, strategy_settings: dict) -> None:
+    """
+    Builds the ranked top times index of every source in df_dicts
+    """
+    for day_dict in df_dicts.values():
+        for df_dict in day_dict.values():
+            for source, _df_dict in df_dict.items():
+                settings = get_source_settings(source, strategy_settings)
+                _df_dict["top_times"] = rank_top_times(
+                    _df_dict["result_df"], settings["-TOP_TIME_THRESHOLD-"] / 100
+                )
+
+
+def get_top_time_records(
+    df_dict, strategy_settings, date: dt.datetime.date = None, top_n_override=0
+) -> List[Tuple[str, str, str, float]]:
+    """
+    Returns the top times for a date as (time, formatted value, source, value)
+    tuples using the ranked index of each source
+    """
+    portfolio_mode = "-SINGLE_MODE-" not in strategy_settings
+    all_top_values = []
+    top_n = 0
+    for source, _df_dict in df_dict.items():
+        settings = get_source_settings(source, strategy_settings)
+        agg_type = "".join(word[0] for word in settings["-AGG_TYPE-"].split("-"))
+        top_n = top_n_override if top_n_override else int(settings["-TOP_X-"])
+        calc_type = settings["-CALC_TYPE-"]
+        threshold = settings["-TOP_TIME_THRESHOLD-"] / 100
+
+        top_times = _df_dict.get("top_times")
+        if top_times is None or top_times["threshold"] != threshold:
+            top_times = rank_top_times(_df_dict["result_df"], threshold)
+            _df_dict["top_times"] = top_times
+        periods = top_times["periods"]
+        if not periods:
+            continue
+
+        if not date:
+            i = len(periods) - 1
+        else:
+            date_timestamp = pd.Timestamp(date)
+            if agg_type == "SM":
+                # For semi-monthly, we need to check if the date is in the first or second half of the month
+                if date_timestamp.day <= 15:
+                    period_start = date_timestamp.replace(day=1)
+                    period_end = date_timestamp.replace(day=15)
+                else:
+                    period_start = date_timestamp.replace(day=16)
+                    period_end = date_timestamp.replace(
+                        day=date_timestamp.days_in_month
+                    )
+                i = bisect.bisect_right(periods, period_end) - 1
+                if i < 0 or periods[i] < period_start:
+                    continue
+            else:
+                # select the latest period up to this one in case the current
+                # period is missing due to having some exclusions at that time.
+                period = pd.Period(date_timestamp, freq=agg_type)
+                i = bisect.bisect_right(periods, period) - 1
+                if i < 0:
+                    continue
+
+        for time, value in top_times["ranked"][i][:top_n]:
+            formatted_value = (
+                f"{value:.2f}" if calc_type == "PnL" else f"{value * 100:.2f}%"
+            )
+            all_top_values.append((time, formatted_value, source, value))
+
+    if not portfolio_mode:
+        # keep the best value of each time and select the overall top n
+        best_values = {}
+        for record in all_top_values:
+            if record[0] not in best_values or record[3] > best_values[record[0]][3]:
+                best_values[record[0]] = record
+        all_top_values = sorted(best_values.values(), key=lambda record: record[0])
+        # rank high to low exactly like DataFrame.sort_values(ascending=False)
+        # so tied values are picked in the same order as before
+        values = np.array([record[3] for record in all_top_values])
+        order = (len(values) - 1 - np.argsort(values[::-1], kind="quicksort"))[::-1]
+        all_top_values = [all_top_values[i] for i in order[:top_n]]
+
+    return all_top_values
+
+
+def get_top_times(
+    df_dict, strategy_settings, date: dt.datetime.date = None, top_n_override=0
+) -> pd.DataFrame:
+    records = get_top_time_records(df_dict, strategy_settings, date, top_n_override)
+    return pd.DataFrame(
+        [record[:3] for record in records], columns=["Top Times", "Values", "Source"]
+    )
+
+
+def get_news_events_cache_filename(file: str) -> str:
+    """
+    Takes an economic calendar CSV filename and returns the filename of
+    the parsed news event dates stored next to it
+    """
+    path = os.path.join(os.path.dirname(file), "data", "cache")
+    basename = os.path.splitext(os.path.basename(file))[0]
+    path_hash = hashlib.blake2b(
+        os.path.abspath(file).encode(), digest_size=6
+    ).hexdigest()
+    return os.path.join(path, f"{basename}-{path_hash}.npz")
+
+
+def load_news_events_cache(file: str) -> dict:
+    """
+    Returns the news event dates parsed from the calendar file earlier if
+    the file hasn't changed since.  Returns None if there is no usable
+    cache entry.
+    """
+    cache_filename = get_news_events_cache_filename(file)
+    try:
+        with np.load(cache_filename, allow_pickle=False) as cache:
+            meta = json.loads(str(cache["meta"]))
+            stat = os.stat(file)
+            if (
+                meta["version"] != NEWS_EVENTS_CACHE_VERSION
+                or meta["path"] != os.path.abspath(file)
+                or meta["size"] != stat.st_size
+                or meta["events"] != list(news_events)
+            ):
+                return None
+            if meta["mtime"] != stat.st_mtime_ns and meta["hash"] != get_file_hash(
+                file
+            ):
+                return None
+            return {
+                event: cache[f"event_{i}"].tolist()
+                for i, event in enumerate(meta["events"])
+            }
+    except Exception:
+        # missing or corrupt cache
+        return None
+
+
+def save_news_events_cache(file: str) -> None:
+    """
+    Stores the news event dates parsed from the calendar file as day
+    arrays so the next import of the same file can skip parsing the CSV
+    """
+    cache_filename = get_news_events_cache_filename(file)
+    try:
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+        stat = os.stat(file)
+        meta = {
+            "version": NEWS_EVENTS_CACHE_VERSION,
+            "path": os.path.abspath(file),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": get_file_hash(file),
+            "events": list(news_events),
+        }
+        event_dates = {
+            f"event_{i}": np.array(dates, dtype="datetime64[D]")
+            for i, dates in enumerate(news_events.values())
+        }
+        with open(cache_filename, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **event_dates)
+    except Exception:
+        # caching is only an optimization, the import can continue without it
+        pass
+
+
+def count_lines(file: str) -> int:
+    """
+    Counts the lines of a file in chunks without parsing it
+    """
+    lines = 0
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            lines += chunk.count(b"\n")
+    return lines
+
+
+def import_news_events(filename) -> bool:
+    global news_events
+    """
+    Import CSV downloaded from https://www.fxstreet.com/economic-calendar
+    populates the dates for the releases in 'news_events' dict
+    """
+
+    def get_triple_witching_dates(
+        start_year: int = 2000, end_year: int = dt.datetime.now().year
+    ):
+        """
+        These are not in the calendar and must be calculated
+        Triple witching ocurrs on the third friday of March, June, Sept, Dec
+        """
+        triple_witching_dates = []
+
+        for year in range(start_year, end_year + 1):
+            for month in [3, 6, 9, 12]:  # March, June, September, December
+                # Get the first day of the month
+                first_day = dt.datetime(year, month, 1)
+
+                # Find the first Friday
+                friday = first_day + dt.timedelta(
+                    days=(4 - first_day.weekday() + 7) % 7
+                )
+
+                # Get the third Friday
+                third_friday = friday + dt.timedelta(weeks=2)
+
+                triple_witching_dates.append(third_friday.date())
+
+        return triple_witching_dates
+
+    def get_event(name):
+        """
+        Helper function to add news_event column to the df
+        """
+        keyword_dict = {
+            "Consumer Price Index": "CPI",
+            "Nonfarm Payrolls": "NFP",
+            "ADP Employment": "ADP",
+            "Initial Jobless Claims": "Initial Jobless Claims",
+            "Retail Sales": "Retail Sales",
+            "JOLT": "JOLT",
+            "Unemployment": "Unemployment/NFP",
+            "Producer Price Index": "PPI",
+            "Gross Domestic Product": "GDP",
+            "Personal Consumption Expenditures": "PCE",
+            "Beige Book": "Beige Book",
+            "ISM Manufacturing PMI": "ISM Manufacturing PMI",
+            "ISM Services PMI": "ISM Services PMI",
+            "Fed's Chair": "Fed Chair Speech",
+            "FOMC Minutes": "FOMC Minutes",
+            "Fed Interest Rate Decision": "FOMC",
+            "Michigan Consumer Sentiment Index": "MI Consumer Sent.",
+            "Chicago Purchasing": "Chicago PMI",
+            "Chicago PMI": "Chicago PMI",
+        }
+
+        if "S&P" in name and "PMI" in name:
+            return "S&P Global PMI"
+        else:
+            for keyword, event in keyword_dict.items():
+                if keyword in name:
+                    return event
+            return ""
+
+    # use the dates parsed before if the calendar hasn't changed
+    cached_events = load_news_events_cache(filename)
+    if cached_events is not None:
+        news_events.update(cached_events)
+        # always calculated up to the current year
+        news_events["Triple Witching"] = get_triple_witching_dates()
+        build_news_event_calendar()
+        return True
+
+    # load csv, config dates and filter for US events
+    try:
+        df = pd.read_csv(filename)
+    except Exception as e:
+        return False
+    if (
+        "Start" not in df.columns
+        or "Currency" not in df.columns
+        or "Name" not in df.columns
+    ):
+        return False
+    df.drop_duplicates(inplace=True)
+    df = df[df["Currency"] == "USD"]
+    # the calendar repeats the same release names, so classify each unique
+    # name once and map the result back onto all the rows
+    event_names = {name: get_event(name) for name in df["Name"].unique()}
+    df = df.assign(news_event=df["Name"].map(event_names))
+    # only the dates of the releases we track need parsing
+    df = df[df["news_event"] != ""]
+    event_dates = pd.to_datetime(df["Start"]).dt.date.groupby(df["news_event"])
+    event_dates = {event: sorted(dates) for event, dates in event_dates}
+
+    for news_event in news_events:
+        if news_event == "Triple Witching":
+            news_events[news_event] = get_triple_witching_dates()
+        else:
+            news_events[news_event] = event_dates.get(news_event, [])
+
+    save_news_events_cache(filename)
+    build_news_event_calendar()
+    return True
+
+
+def build_news_event_calendar() -> None:
+    """
+    Indexes the dates in 'news_events' as frozen sets and as a bitmask of
+    the events on each day so lookups don't have to search the date lists
+    """
+    global news_event_dates, news_event_calendar
+    event_dates = {
+        event: frozenset(date_list) for event, date_list in news_events.items()
+    }
+    all_dates = frozenset().union(*event_dates.values())
+    if all_dates:
+        start = min(all_dates).toordinal()
+        bitmask = np.zeros(max(all_dates).toordinal() - start + 1, dtype=np.uint32)
+        for event, dates in event_dates.items():
+            days = [date.toordinal() - start for date in dates]
+            bitmask[days] |= news_event_bits[event]
+    else:
+        start = 0
+        bitmask = np.zeros(0, dtype=np.uint32)
+    news_event_dates = event_dates
+    news_event_calendar = {"start": start, "bitmask": bitmask}
+
+
+def get_news_event_bits(events) -> int:
+    """
+    Returns the combined calendar bits of the given news events
+    """
+    bits = 0
+    for event in events:
+        bits |= news_event_bits.get(event, 0)
+    return bits
+
+
+def get_date_news_event_bits(date: dt.date) -> int:
+    """
+    Returns the calendar bitmask of the news events on a date
+    """
+    bitmask = news_event_calendar["bitmask"]
+    day = date.toordinal() - news_event_calendar["start"]
+    return int(bitmask[day]) if 0 <= day < len(bitmask) else 0
+
+
+def get_date_news_events(date: dt.date) -> List[str]:
+    """
+    Returns the news events that occur on a date
+    """
+    return [event for event, dates in news_event_dates.items() if date in dates]
+
+
+def get_news_event_mask(dates: pd.Series, events) -> np.ndarray:
+    """
+    Returns a boolean array that is True for the datetimes in the Series that
+    fall on a date of any of the given news events
+    """
+    bitmask = news_event_calendar["bitmask"]
+    values = dates.to_numpy(dtype="datetime64[D]")
+    days = values.astype(np.int64) + (
+        dt.date(1970, 1, 1).toordinal() - news_event_calendar["start"]
+    )
+    in_calendar = ~np.isnat(values) & (days >= 0) & (days < len(bitmask))
+    date_bits = np.zeros(len(values), dtype=np.uint32)
+    date_bits[in_calendar] = bitmask[days[in_calendar]]
+    return (date_bits & get_news_event_bits(events)) != 0
+
+
+def find_and_import_news_events():
+    global news_events_loaded
+    best_file = None
+    max_rows = 0
+    required_columns = set(["Id", "Start", "Name", "Impact", "Currency"])
+
+    # Loop through all files in the current directory
+    for filename in os.listdir("."):
+        if filename.endswith(".csv"):
+            try:
+                # Only read the header, trade logs can be huge
+                columns = pd.read_csv(filename, nrows=0).columns
+
+                # Check if the required columns are present
+                if set(columns) == required_columns:
+                    # rows without the header
+                    rows = count_lines(filename) - 1
+
+                    # If this is the first valid file or has more rows than the previous best
+                    if best_file is None or rows > max_rows:
+                        best_file = filename
+                        max_rows = rows
+            except Exception as e:
+                # If there's an error reading the file, skip it
+                continue
+
+    # If a valid file was found, import the news events
+    if best_file:
+        success = import_news_events(best_file)
+        if success:
+            news_events_loaded = True
+            results_queue.put(
+                ("-IMPORT_NEWS-", "News event list found and loaded sucessuflly!")
+            )
+            return
+    results_queue.put(
+        (
+            "-IMPORT_NEWS-",
+            "Could not locate news event csv.\nPlease select under options if needed",
+        )
+    )
+
+
+def get_next_filename(path: str, base: str, ext: str) -> str:
+    """
+    Takes a path, base name, and extension.
+    Checks if a filename already exists with that filename
+    Adds (x) to the filename and returns the complete filename path
+    """
+    # Create filename
+    filename = os.path.join(path, f"{base}{ext}")
+    counter = 1
+    while os.path.exists(filename):
+        filename = os.path.join(path, f"{base}({counter}){ext}")
+        counter += 1
+    return filename
+
+
+def is_BYOB_data(df: pd.DataFrame) -> bool:
+    return df.columns[0] == "TradeID"
+
+
+def index_trade_log(df: pd.DataFrame) -> dict:
+    """
+    Returns the row positions of the trades for each entry time and each
+    trade date so the walk forward test can slice fills without a scan
+    """
+    if df.empty:
+        return {"entry_index": {}, "date_index": {}}
+    entry_times = df["EntryTime"]
+    return {
+        "entry_index": entry_times.groupby(entry_times).indices,
+        "date_index": entry_times.groupby(entry_times.dt.date).indices,
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def parse_entry_time(time: str) -> dt.time:
+    """
+    Returns the time of an HH:MM:SS entry time label.  There are only a few
+    hundred distinct entry times so each one is parsed once.
+    """
+    return dt.time.fromisoformat(time)
+
+
+def get_file_hash(file: str) -> str:
+    """
+    Returns a hash of the contents of the file.
+    Reads in chunks so large merged trade logs don't need to fit in memory
+    """
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_trade_log_cache_filenames(file: str) -> Tuple[str, str]:
+    """
+    Takes a trade log filename and returns the filenames of the cached
+    parquet data and the metadata used to validate it.  The cache is
+    keyed by the full path so files with the same name don't collide.
+    """
+    path = os.path.join(os.path.dirname(file), "data", "cache")
+    basename = os.path.splitext(os.path.basename(file))[0]
+    path_hash = hashlib.blake2b(
+        os.path.abspath(file).encode(), digest_size=6
+    ).hexdigest()
+    base = os.path.join(path, f"{basename}-{path_hash}")
+    return f"{base}.parquet", f"{base}.json"
+
+
+def load_trade_log_cache(file: str) -> pd.DataFrame:
+    """
+    Returns the normalized trade log df from the cache if the cached
+    copy is still valid for the file.  Returns None if there is no
+    usable cache entry.
+    """
+    cache_filename, meta_filename = get_trade_log_cache_filenames(file)
+    try:
+        with open(meta_filename, "r") as f:
+            meta = json.load(f)
+        stat = os.stat(file)
+        if (
+            meta["version"] != TRADE_LOG_CACHE_VERSION
+            or meta["path"] != os.path.abspath(file)
+            or meta["size"] != stat.st_size
+        ):
+            return None
+        if meta["mtime"] != stat.st_mtime_ns:
+            # file was touched or copied, make sure the contents still match
+            if meta["hash"] != get_file_hash(file):
+                return None
+            meta["mtime"] = stat.st_mtime_ns
+            with open(meta_filename, "w") as f:
+                json.dump(meta, f, indent=4)
+        return pd.read_parquet(cache_filename)
+    except Exception:
+        # missing or corrupt cache, or pyarrow is not installed
+        return None
+
+
+def save_trade_log_cache(file: str, df: pd.DataFrame) -> None:
+    """
+    Stores the normalized trade log df so the next load of
+    the same file can skip parsing the CSV
+    """
+    cache_filename, meta_filename = get_trade_log_cache_filenames(file)
+    try:
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+        stat = os.stat(file)
+        df.to_parquet(cache_filename)
+        meta = {
+            "version": TRADE_LOG_CACHE_VERSION,
+            "path": os.path.abspath(file),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": get_file_hash(file),
+        }
+        with open(meta_filename, "w") as f:
+            json.dump(meta, f, indent=4)
+    except Exception:
+        # caching is only an optimization, the analysis can continue without it
+        pass
+
+
+def read_trade_log(file: str) -> pd.DataFrame:
+    """
+    Takes a Trade Log CSV from either Option Omega or BYOB and returns
+    the normalized trade data sorted by entry time.  Returns None and posts an
+    -ERROR- message to 'results_queue' if the file could not be parsed.
+    """
+    # Load the CSV file
+    try:
+        delims = [",", ";", "\t", "|"]
+        for delim in delims:
+            df = pd.read_csv(file, delimiter=delim)
+            if len(df.columns) > 1:
+                break
+        if len(df.columns) <= 1:
+            # none of the delims worked
+            raise ValueError
+    except (UnicodeDecodeError, ValueError):
+        results_queue.put(
+            (
+                "-ERROR-",
+                f"{os.path.basename(file)} does not appear to be a backtest results\n"
+                "CSV from either OptionOmega or BYOB.\n\nPlease choose a different file",
+            )
+        )
+        return
+
+    # remove duplicate rows in case human error in combining csv files
+    df.drop_duplicates(inplace=True)
+
+    # Determine which type of data, OptionOmega or BYOB
+    is_byob = is_BYOB_data(df)
+    if is_byob is None:
+        results_queue.put(
+            (
+                "-ERROR-",
+                f"{os.path.basename(file)} does not appear to be a backtest results\n"
+                "CSV from either OptionOmega or BYOB.\n\nPlease choose a different file",
+            )
+        )
+        return
+
+    elif not is_byob:  # OO BT data
+        # Convert 'Date Opened' to datetime format
+        df["Date Opened"] = pd.to_datetime(df["Date Opened"])
+
+        # Add EntryTime Column for analysis
+        df["EntryTime"] = pd.to_datetime(
+            df["Date Opened"].astype(str) + " " + df["Time Opened"]
+        )
+
+        # Add column for Option Right 'C' or 'P'
+        df["OptionType"] = df["Legs"].apply(
+            lambda x: x.split("|")[0].strip().split(" ")[4]
+        )
+
+    # Convert 'EntryTime' to datetime format
+    df["EntryTime"] = pd.to_datetime(df["EntryTime"])
+
+    # trades without an entry time can't be placed in a period or time slot
+    missing_entry_time = df["EntryTime"].isna()
+    if missing_entry_time.any():
+        results_queue.put(
+            (
+                "-ERROR-",
+                f"{os.path.basename(file)} has {missing_entry_time.sum()} trade(s)"
+                " without an entry time.\nThey will be left out of the analysis.",
+            )
+        )
+        df = df[~missing_entry_time].copy()
+
+    # Option right, weekday and entry time are stored as categoricals so they
+    # are held as small integer codes and only the distinct labels are strings
+    df["OptionType"] = df["OptionType"].astype("category")
+
+    # Add Day of week column
+    df["Day of Week"] = pd.Categorical.from_codes(
+        df["EntryTime"].dt.weekday, categories=day_names
+    )
+
+    # Create a 'Time' column, formatting each distinct entry time once
+    seconds = (df["EntryTime"] - df["EntryTime"].dt.normalize()).dt.total_seconds()
+    codes, entry_times = pd.factorize(seconds.astype(np.int32), sort=True)
+    df["Time"] = pd.Categorical.from_codes(
+        codes,
+        categories=[
+            f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in entry_times
+        ],
+    )
+
+    # Sort by 'EntryTime'
+    df.sort_values(["EntryTime"], inplace=True)
+
+    return df
+
+
+def load_data(
+    file: str,
+    weekday_exclusions: list = [],
+) -> Tuple[pd.DataFrame, dt.datetime.date, dt.datetime.date]:
+    """
+    Takes a Trade Log CSV from either Option Omega or BYOB
+    and returns a dataframe containing the trade data and
+    the start and end dates of the dataset
+    """
+    # use the parsed data from the cache if this file hasn't changed
+    df = load_trade_log_cache(file)
+    if df is None:
+        with timed_stage("parse_csv", file) as span:
+            df = read_trade_log(file)
+            if df is not None:
+                span["rows"] = len(df)
+        if df is None:
+            return
+        save_trade_log_cache(file, df)
+
+    # Determine start and end dates
+    start_date = df["EntryTime"].min().date()
+    end_date = df["EntryTime"].max().date()
+
+    # Add temporary Date column for merging gap info
+    df["Date"] = df["EntryTime"].dt.date
+
+    # Get SPX historical open/close from yahoo finance and calc gaps
+    spx_history = get_spx_gaps(start_date, end_date)
+    if not spx_history.empty:
+        spx_history = spx_history.reset_index()  # Reset index to make 'Date' a column
+        spx_history["Date"] = spx_history["Date"].dt.date
+
+        # drop the rows from spx_history that are not in df
+        spx_history = spx_history[spx_history["Date"].isin(df["Date"].to_list())]
+
+        # remove already present gap column from OO data
+        df = df.drop(columns=["Gap"], errors="ignore")
+
+        # Merge SPX gap information with the main dataframe
+        df = pd.merge(df, spx_history[["Date", "Gap", "Gap%"]], on="Date", how="left")
+
+    # Remove the temporary "Date" column if not needed
+    df = df.drop(columns=["Date"])
+
+    return (
+        df[~df["Day of Week"].isin(weekday_exclusions)],
+        start_date,
+        end_date,
+    )
+
+
+def get_analysis_worker_state() -> dict:
+    """
+    Returns the state of this module the GUI/CLI process has set up that a
+    worker process of the analysis pool needs, to be passed to
+    init_analysis_worker
+    """
+    return {
+        "news_events": news_events,
+        "news_events_loaded": news_events_loaded,
+        "spx_history_path": spx_history_path,
+        "spx_failed_downloads": spx_failed_downloads,
+    }
+
+
+def init_analysis_worker(state: dict) -> None:
+    """
+    Sets up a worker process of the analysis pool with the state returned
+    by get_analysis_worker_state in the GUI/CLI process
+    """
+    global results_queue, heatmap_executor, heatmap_futures
+    global news_events_loaded, spx_history_path, spx_history_store
+    global spx_failed_downloads
+    # the worker posts its messages to its own queue, they are passed on to
+    # the main process with the results of each file
+    results_queue = queue.Queue()
+    heatmap_executor = None
+    heatmap_futures = []
+    news_events.update(state["news_events"])
+    news_events_loaded = state["news_events_loaded"]
+    build_news_event_calendar()
+    # the SPX history is loaded from the store on first use
+    spx_history_path = state["spx_history_path"]
+    spx_history_store = None
+    spx_failed_downloads = list(state["spx_failed_downloads"])
+
+
+def analyze_file(
+    file: str, settings: dict, open_files: bool, output_format: str
+) -> Tuple[dict, list]:
+    """
+    Runs create_excel_file for a file in a worker process.  Returns the
+    result dicts along with the messages posted to 'results_queue' so
+    they can be passed on to the main process.
+    """
+    result_dicts = create_excel_file(file, settings, open_files, output_format)
+    # any error saving the heatmaps has to be passed on with the results
+    wait_for_heatmaps()
+    messages = []
+    while True:
+        try:
+            messages.append(results_queue.get(block=False))
+        except queue.Empty:
+            break
+    return result_dicts, messages
+
+
+def analyze_files_in_pool(
+    files_list: list,
+    settings_list: list,
+    open_files: bool,
+    workers: int,
+    output_format: str,
+    progress=None,
+) -> list:
+    """
+    Analyzes the files concurrently in a pool of worker processes.
+    Returns the result dicts of each file in the order of 'files_list',
+    or None if the analysis was canceled.  'progress' is called with the
+    number of files done as each one finishes.
+    """
+    # spawn fresh workers, forking would copy the locks held by the GUI and
+    # heatmap threads into them
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(workers, len(files_list)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_analysis_worker,
+        initargs=(get_analysis_worker_state(),),
+    )
+    try:
+        futures = [
+            executor.submit(analyze_file, file, settings, open_files, output_format)
+            for file, settings in zip(files_list, settings_list)
+        ]
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                # pass on any errors from the worker as soon as the file is done
+                for message in future.result()[1]:
+                    results_queue.put(message)
+            if done and progress:
+                finished = len(files_list) - len(pending)
+                progress(finished, f"{finished} of {len(files_list)} files")
+
+            # check for cancel flag to stop the workers
+            if cancel_flag.is_set():
+                return
+
+        return [future.result()[0] for future in futures]
+    finally:
+        # don't wait on files still being analyzed when canceled
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@with_gc
+def run_analysis_threaded(
+    files_list,
+    strategy_settings,
+    open_files,
+    workers: int = 1,
+    output_format: str = "XLSX",
+    analysis_cache: dict = None,
+    average_weights: list = None,
+):
+    # initialize df_dicts
+    df_dicts = {}
+
+    single_mode = "-SINGLE_MODE-" in strategy_settings
+    settings_list = [
+        strategy_settings["-SINGLE_MODE-" if single_mode else os.path.basename(file)]
+        for file in files_list
+    ]
+
+    progress = progress_reporter("Analysis", len(files_list), "files")
+    if workers > 1 and len(files_list) > 1:
+        progress(0, f"0 of {len(files_list)} files", force=True)
+        file_results = analyze_files_in_pool(
+            files_list,
+            settings_list,
+            open_files,
+            workers,
+            output_format,
+            lambda done, label: progress(done, label, force=True),
+        )
+        if file_results is None:
+            cancel_flag.clear()
+            results_queue.put(("-BACKTEST_CANCELED-", ""))
+            return
+    else:
+        file_results = []
+        for index, (file, settings) in enumerate(zip(files_list, settings_list)):
+            name = os.path.basename(file)
+            progress(index, f"{name}: loading", force=True)
+            file_results.append(
+                create_excel_file(
+                    file,
+                    settings,
+                    open_files,
+                    output_format,
+                    analysis_cache,
+                    # each file is one unit, its slices are fractions of it
+                    lambda done, total, label: progress(
+                        index + done / total, f"{name}: {label} ({done + 1}/{total})"
+                    ),
+                    average_weights,
+                )
+            )
+
+            # check for cancel flag to stop thread
+            if cancel_flag.is_set():
+                cancel_flag.clear()
+                results_queue.put(("-BACKTEST_CANCELED-", ""))
+                return
+
+    # merge the results in the order of the files so the output is the same
+    # no matter which file finished first
+    for file, result_dicts in zip(files_list, file_results):
+        if not result_dicts:
+            # file could not be read, the error has already been posted
+            continue
+
+        source = os.path.splitext(os.path.basename(file))[0]
+        for right_type, day_dict in result_dicts.items():
+            if right_type not in df_dicts:
+                df_dicts[right_type] = {
+                    "All": {},
+                    "Mon": {},
+                    "Tue": {},
+                    "Wed": {},
+                    "Thu": {},
+                    "Fri": {},
+                }
+            for day, df_dict in day_dict.items():
+                df_dicts[right_type][day][source] = df_dict
+
+    for _best in ["Best P/C", "Best P/C Gap Up", "Best P/C Gap Down"]:
+        df_dicts[_best] = {
+            "All": {},
+            "Mon": {},
+            "Tue": {},
+            "Wed": {},
+            "Thu": {},
+            "Fri": {},
+        }
+
+        # combine the put and call dfs into 1 dict for dertmining the best time
+        # from among both individual datasets
+        for _right in ["Puts", "Calls"]:
+            if _best.endswith("Gap Up"):
+                _right += " Gap Up"
+            elif _best.endswith("Gap Down"):
+                _right += " Gap Down"
+
+            if _right in df_dicts:
+                for _day, _day_dict in df_dicts[_right].items():
+                    for _source, _df_dict in _day_dict.items():
+                        df_dicts[_best][_day][
+                            f"{_right.removesuffix("s")}||{_source}"
+                        ] = _df_dict
+
+    results_queue.put(("-RUN_ANALYSIS_END-", df_dicts))
+    return df_dicts
+
+
+def set_default_app_settings(app_settings):
+    # Setup defaults if setting did not load/exist
+    if "-THEME-" not in app_settings:
+        app_settings["-THEME-"] = "Light"
+    if "-AVG_PERIOD_1-" not in app_settings:
+        app_settings["-AVG_PERIOD_1-"] = "4"
+    if "-AVG_PERIOD_2-" not in app_settings:
+        app_settings["-AVG_PERIOD_2-"] = "8"
+    if "-PERIOD_1_WEIGHT-" not in app_settings:
+        app_settings["-PERIOD_1_WEIGHT-"] = "25"
+    if "-PERIOD_2_WEIGHT-" not in app_settings:
+        app_settings["-PERIOD_2_WEIGHT-"] = "75"
+    if "-TOP_X-" not in app_settings:
+        app_settings["-TOP_X-"] = "5"
+    if "-CALC_TYPE-" not in app_settings:
+        app_settings["-CALC_TYPE-"] = "PCR"
+    if "-AGG_TYPE-" not in app_settings:
+        app_settings["-AGG_TYPE-"] = "Monthly"
+    if "-OPEN_FILES-" not in app_settings:
+        app_settings["-OPEN_FILES-"] = False
+    if "-BACKTEST-" not in app_settings:
+        app_settings["-BACKTEST-"] = False
+    if "-START_VALUE-" not in app_settings:
+        app_settings["-START_VALUE-"] = "100000"
+    if "-START_DATE-" not in app_settings:
+        app_settings["-START_DATE-"] = ""
+    if "-END_DATE-" not in app_settings:
+        app_settings["-END_DATE-"] = ""
+    if "-EXPORT-" not in app_settings:
+        app_settings["-EXPORT-"] = False
+    if "-EXPORT_OO_SIG-" not in app_settings:
+        app_settings["-EXPORT_OO_SIG-"] = False
+    if "-SCALING-" not in app_settings:
+        app_settings["-SCALING-"] = False
+    if "-MIN_TRANCHES-" not in app_settings:
+        app_settings["-MIN_TRANCHES-"] = "5"
+    if "-MAX_TRANCHES-" not in app_settings:
+        app_settings["-MAX_TRANCHES-"] = "5"
+    if "-BP_PER-" not in app_settings:
+        app_settings["-BP_PER-"] = "6000"
+    if "-PORTFOLIO_MODE-" not in app_settings:
+        app_settings["-PORTFOLIO_MODE-"] = False
+    if "-TOP_TIME_THRESHOLD-" not in app_settings:
+        app_settings["-TOP_TIME_THRESHOLD-"] = ""
+    if "-PARALLEL-" not in app_settings:
+        app_settings["-PARALLEL-"] = False
+    if "-OUTPUT_FORMAT-" not in app_settings:
+        app_settings["-OUTPUT_FORMAT-"] = "XLSX"
+    if "-FAST_WF-" not in app_settings:
+        app_settings["-FAST_WF-"] = False
+    if "-STAGE_LOG-" not in app_settings:
+        app_settings["-STAGE_LOG-"] = False
+
+
+def update_strategy_settings(values, settings):
+    settings.update(
+        {
+            "-AVG_PERIOD_1-": values["-AVG_PERIOD_1-"],
+            "-PERIOD_1_WEIGHT-": values["-PERIOD_1_WEIGHT-"],
+            "-AVG_PERIOD_2-": values["-AVG_PERIOD_2-"],
+            "-PERIOD_2_WEIGHT-": values["-PERIOD_2_WEIGHT-"],
+            "-TOP_X-": values["-TOP_X-"],
+            "-CALC_TYPE-": values["-CALC_TYPE-"],
+            "-AGG_TYPE-": values["-AGG_TYPE-"],
+            "-MIN_TRANCHES-": values["-MIN_TRANCHES-"],
+            "-MAX_TRANCHES-": values["-MAX_TRANCHES-"],
+            "-BP_PER-": values["-BP_PER-"],
+            "-PASSTHROUGH_MODE-": values["-PASSTHROUGH_MODE-"],
+            "-PORT_WEIGHT-": values["-PORT_WEIGHT-"],
+            "-TOP_TIME_THRESHOLD-": values["-TOP_TIME_THRESHOLD-"],
+        }
+    )
+
+    # Initialize option settings if they don't exist
+    for option in [
+        "-WEEKDAY_EXCLUSIONS-",
+        "-NEWS_EXCLUSIONS-",
+        "-PUT_OR_CALL-",
+        "-IDV_WEEKDAY-",
+        "-AUTO_EXCLUSIONS-",
+        "-GAP_ANALYSIS-",
+    ]:
+        if option not in settings:
+            settings[option] = []
+    if "-APPLY_EXCLUSIONS-" not in settings:
+        settings["-APPLY_EXCLUSIONS-"] = "Both"
+    if "-GAP_THRESHOLD-" not in settings:
+        settings["-GAP_THRESHOLD-"] = 0
+    if "-GAP_TYPE-" not in settings:
+        settings["-GAP_TYPE-"] = "%"
+
+
+def validate_strategy_settings(strategy_settings):
+    for strategy in strategy_settings:
+        try:
+            period1 = int(strategy_settings[strategy]["-AVG_PERIOD_1-"])
+            period2 = int(strategy_settings[strategy]["-AVG_PERIOD_2-"])
+            weight1 = float(strategy_settings[strategy]["-PERIOD_1_WEIGHT-"])
+            weight2 = float(strategy_settings[strategy]["-PERIOD_2_WEIGHT-"])
+            strategy_settings[strategy]["-AVG_PERIOD_1-"] = period1
+            strategy_settings[strategy]["-AVG_PERIOD_2-"] = period2
+            strategy_settings[strategy]["-PERIOD_1_WEIGHT-"] = weight1
+            strategy_settings[strategy]["-PERIOD_2_WEIGHT-"] = weight2
+
+            strategy_settings[strategy]["-TOP_X-"] = int(
+                strategy_settings[strategy]["-TOP_X-"]
+            )
+            strategy_settings[strategy]["-MIN_TRANCHES-"] = int(
+                strategy_settings[strategy]["-MIN_TRANCHES-"]
+            )
+            strategy_settings[strategy]["-MAX_TRANCHES-"] = int(
+                strategy_settings[strategy]["-MAX_TRANCHES-"]
+            )
+            strategy_settings[strategy]["-BP_PER-"] = float(
+                strategy_settings[strategy]["-BP_PER-"]
+            )
+            strategy_settings[strategy]["-PORT_WEIGHT-"] = float(
+                strategy_settings[strategy]["-PORT_WEIGHT-"]
+            )
+            if strategy_settings[strategy]["-TOP_TIME_THRESHOLD-"]:
+                strategy_settings[strategy]["-TOP_TIME_THRESHOLD-"] = float(
+                    strategy_settings[strategy]["-TOP_TIME_THRESHOLD-"]
+                )
+            else:
+                strategy_settings[strategy]["-TOP_TIME_THRESHOLD-"] = float("-inf")
+        except ValueError:
+            return (
+                "Problem with values entered.\nPlease enter only positive whole numbers"
+            )
+        if period1 < 1 or period2 < 1 or period1 > period2:
+            return "Please make sure both averaging periods are > 0\nand that Trailing Avg 2 is >= to Trailing Avg 1"
+        if weight1 + weight2 != 100:
+            return "Trailing Avg Weights should add up to 100"
+
+    return True
+
+
+@with_gc
+@timed("walk_forward", lambda results: sum(len(df) for df in results.values()))
+def walk_forward_test(
+    df_dicts: dict,
+    path: str,
+    strategy_settings: dict,
+    start: dt.datetime.date = None,
+    end: dt.datetime.date = None,
+    initial_value: float = 100_000,
+    use_scaling=False,
+    export_trades=False,
+    export_OO_sig=False,
+    fast_engine=False,
+):
+    portfolio_mode = "-SINGLE_MODE-" not in strategy_settings
+    start_date = dt.date.min
+    passthrough_start_date = dt.date.min
+    end_date = dt.date.max
+    # loop through all the source dfs
+    for source, df_dict in df_dicts["Put-Call Comb"]["All"].items():
+        try:
+            passthrough = strategy_settings[f"{source}.csv"]["-PASSTHROUGH_MODE-"]
+        except KeyError as e:
+            passthrough = False
+
+        _start_date = df_dict["org_df"]["EntryTime"].min().date()
+        _end_date = df_dict["org_df"]["EntryTime"].max().date()
+        # find the latest start date
+        if not passthrough:
+            if _start_date > start_date:
+                start_date = _start_date
+        else:
+            # we need to treat passthrough seperate since there is no
+            # warm up period necessary.
+            if _start_date > passthrough_start_date:
+                passthrough_start_date = _start_date
+
+        # find the earliest end date passthrough doesn't matter here
+        if _end_date < end_date:
+            end_date = _end_date
+
+    max_long_avg_period = max(
+        [
+            max(settings["-AVG_PERIOD_1-"], settings["-AVG_PERIOD_2-"])
+            for settings in strategy_settings.values()
+        ]
+    )
+    date_adv = start_date + relativedelta(months=max_long_avg_period)
+    warm_start = dt.date(date_adv.year, date_adv.month, 1)
+    # use either the user input date or the first warmed up date
+    if start:
+        start_test_date = max(warm_start, start)
+    else:
+        start_test_date = warm_start
+    end = end_date if end is None else end
+
+    # check if any strats are using auto exclusion
+    warm_up_date = start_test_date
+    using_auto_exclusions = False
+    for setting in strategy_settings.values():
+        if setting["-AUTO_EXCLUSIONS-"]:
+            # set the warmup date
+            warm_up_date = warm_start + relativedelta(months=max_long_avg_period)
+            using_auto_exclusions = True
+            break
+    # now we just need to see if the passthrough strats start later
+    warm_up_date = max(warm_up_date, passthrough_start_date)
+
+    if not portfolio_mode:
+        settings = strategy_settings["-SINGLE_MODE-"]
+        strats = ["All-P_C_Comb"]
+        if settings["-PUT_OR_CALL-"] and settings["-IDV_WEEKDAY-"]:
+            strats += ["Weekday-P_C_Comb", "All-Best_P_or_C", "Weekday-Best_P_or_C"]
+        elif settings["-IDV_WEEKDAY-"]:
+            strats.append("Weekday-P_C_Comb")
+        elif settings["-PUT_OR_CALL-"]:
+            strats.append("All-Best_P_or_C")
+        if settings["-GAP_ANALYSIS-"]:
+            for _strat in strats.copy():
+                strats.append(f"{_strat}-Gap")
+    else:
+        strats = ["Portfolio"] + list(strategy_settings.keys())
+
+    # the vectorized engine covers the tests where the tranche qtys don't
+    # depend on the results so far, the rest are stepped day by day below
+    if (
+        fast_engine
+        and not use_scaling
+        and not using_auto_exclusions
+        and not any(
+            settings["-PASSTHROUGH_MODE-"] for settings in strategy_settings.values()
+        )
+    ):
+        return walk_forward_test_vectorized(
+            df_dicts,
+            path,
+            strategy_settings,
+            strats,
+            start_test_date,
+            end,
+            initial_value,
+            export_trades,
+            export_OO_sig,
+        )
+
+    portfolio_metrics = {}
+    for _strat in strats:
+        portfolio_metrics[_strat] = {
+            "Current Value": initial_value,
+            "Highest Value": initial_value,
+            "Max DD": 0.0,
+            "Current DD": 0.0,
+            "DD Days": 0,
+            "Tranche Qtys": [],
+            "Port Tranche Qtys": [],
+            "Num Tranches": 1,
+            "Port Num Tranches": 1,
+            # trades are collected in lists and concatenated once at the end
+            "trade log": [],
+            # PnL sums by period of each weekday and news event for warm-up
+            # to calc EV for auto exclusions
+            "Auto Exclusion PnL": {},
+            "Win Streak": 0,
+            "Loss Streak": 0,
+        }
+
+    if portfolio_mode:
+        port_dict = portfolio_metrics["Portfolio"]
+
+    # init results, a list of daily rows for each strategy until the test is done
+    results = {}
+    for strategy in portfolio_metrics:
+        results[strategy] = []
+
+    # convert weekdays from full day name to short name. i.e. Monday to Mon
+    day_list = [_day[:3] for _day in weekday_list]
+
+    def get_auto_exclusion_period(date: dt.date, agg_type: str) -> int:
+        """
+        Returns a sequential number for the resample period ("ME", "SME" or
+        "W-SAT") that a trade entered on the date falls in
+        """
+        month = date.year * 12 + date.month
+        if agg_type == "Monthly":
+            return month
+        elif agg_type == "Semi-Monthly":
+            # SME periods start on the 15th and on the last day of the month
+            if date.day == calendar.monthrange(date.year, date.month)[1]:
+                return month * 2 + 1
+            elif date.day >= 15:
+                return month * 2
+            else:
+                return month * 2 - 1
+        else:
+            # weeks ending on Saturday
+            return date.toordinal() // 7
+
+    def log_auto_exclusion_pnl(
+        period_pnl: dict, date: dt.date, pnl: float, agg_type: str
+    ) -> None:
+        """
+        Adds the PnL of trades on the given date to the period sums of the
+        weekday and every news event that occurs on that date
+        """
+        period = get_auto_exclusion_period(date, agg_type)
+        keys = [("weekday", date.strftime("%a"))] + [
+            ("event", event) for event in get_date_news_events(date)
+        ]
+        for key in keys:
+            sums = period_pnl.setdefault(
+                key, {"first": period, "last": period, "pnl": {}}
+            )
+            sums["last"] = max(sums["last"], period)
+            sums["pnl"][period] = sums["pnl"].get(period, 0) + pnl
+
+    def determine_auto_skip(date: dt.date, period_pnl: dict, agg_type: str) -> bool:
+        """
+        Calculate the expected value of any news events that
+        occur on the given date and return True if negative expectancy
+        """
+
+        def _get_current_rolling_avg(sums):
+            # rolling average of the period sums from the first period with a
+            # trade, empty periods count as 0
+            window = (
+                max_long_avg_period
+                if agg_type == "Monthly"
+                else (
+                    int(max_long_avg_period * 2)
+                    if agg_type == "Semi-Monthly"
+                    else int(max_long_avg_period * 4.33)
+                )
+            )
+            num_periods = min(window, sums["last"] - sums["first"] + 1)
+            total = sum(
+                sums["pnl"].get(period, 0)
+                for period in range(sums["last"] - num_periods + 1, sums["last"] + 1)
+            )
+            return total / num_periods
+
+        # find the events that occur on this date and calc the expectancy
+        for event in get_date_news_events(date):
+            if ("event", event) in period_pnl:
+                current_avg = _get_current_rolling_avg(period_pnl[("event", event)])
+                if current_avg < 0:
+                    # this event has negative expectancy, whole day can be skipped
+                    return True
+
+        # passed all news events, lets see if we skip the weekday
+        weekday_key = ("weekday", date.strftime("%a"))
+        if weekday_key in period_pnl:
+            current_avg = _get_current_rolling_avg(period_pnl[weekday_key])
+            if current_avg < 0:
+                # this dat has negative expectancy, whole day can be skipped
+                return True
+        return False
+
+    # rank the top times of every period once instead of on every lookup
+    index_top_times(df_dicts, strategy_settings)
+
+    if using_auto_exclusions:
+        current_date = warm_start
+    else:
+        current_date = max(start_test_date, passthrough_start_date)
+
+    # determine if we need to use gaps
+    spx_history = get_walk_forward_gaps(strategy_settings, current_date, end)
+
+    first_date = current_date
+    progress = progress_reporter(
+        "Walk forward", max((end - first_date).days + 1, 0), "days"
+    )
+    while current_date <= end:
+        # check for cancel flag to stop thread
+        if cancel_flag.is_set():
+            cancel_flag.clear()
+            results_queue.put(("-BACKTEST_CANCELED-", ""))
+            return
+
+        progress((current_date - first_date).days, str(current_date))
+
+        warmed_up = current_date >= warm_up_date
+
+        if portfolio_mode:
+            # reset daily pnl for portfolio
+            port_dict["Current Day PnL"] = 0
+
+        current_weekday = current_date.strftime("%a")
+        current_news_event_bits = get_date_news_event_bits(current_date)
+        for strat, strat_dict in portfolio_metrics.items():
+            if portfolio_mode and strat == "Portfolio":
+                # we don't trade the portfolio, it is just the combination of all individual strats
+                continue
+            elif portfolio_mode:
+                settings = strategy_settings[strat]
+            else:
+                settings = strategy_settings["-SINGLE_MODE-"]
+
+            # reset daily pnl for individual strategy
+            strat_dict["Current Day PnL"] = 0
+
+            day_exlusions = []
+            news_exclusion_bits = 0
+            if settings["-APPLY_EXCLUSIONS-"] != "Analysis":
+                # we are applying exclusions to either the WF test or both the WF and Analysis
+                day_exlusions = [_day[:3] for _day in settings["-WEEKDAY_EXCLUSIONS-"]]
+                # get the news events with dates to skip.
+                news_exclusion_bits = get_news_event_bits(settings["-NEWS_EXCLUSIONS-"])
+
+            skip_day = False
+            if warmed_up and using_auto_exclusions:
+                skip_day = determine_auto_skip(
+                    current_date,
+                    strat_dict["Auto Exclusion PnL"],
+                    settings["-AGG_TYPE-"],
+                )
+            elif (
+                current_weekday in day_exlusions
+                or current_weekday not in day_list
+                or current_news_event_bits & news_exclusion_bits
+            ):
+                skip_day = True
+
+            if not settings["-PASSTHROUGH_MODE-"]:
+                if use_scaling:
+
+                    def determine_num_tranches(
+                        min_tranches, max_tranches, num_contracts
+                    ):
+                        tranches = max_tranches
+                        while True:
+                            if num_contracts > tranches:
+                                max_tranche_qty = int(num_contracts / tranches)
+                                remain_qty = num_contracts - (
+                                    tranches * max_tranche_qty
+                                )
+                                if remain_qty >= min_tranches or remain_qty == 0:
+                                    # we're done we can stay at this number of tranches with
+                                    # the remainder filling up another set of at least min tranches
+                                    return tranches
+                                else:
+                                    # we need to take a tranche away so we can try to fill up at
+                                    # least 1 full set at min amount
+                                    if tranches - 1 < min_tranches:
+                                        # we can't reduce any further, got with what we have
+                                        # even if that means we will be adding contracts below the min
+                                        return tranches
+                                    else:
+                                        tranches -= 1
+                            else:
+                                return num_contracts
+
+                    def determine_tranche_qtys(tranches):
+                        tranche_qtys = []
+                        for x in range(tranches):
+                            if x < num_contracts % tranches:
+                                # this is where we add the remaining contracts after filling up all tranches
+                                tranche_qtys.append(int(num_contracts / tranches) + 1)
+                            else:
+                                tranche_qtys.append(int(num_contracts / tranches))
+                        return tranche_qtys
+
+                    min_tranches = settings["-MIN_TRANCHES-"]
+                    max_tranches = settings["-MAX_TRANCHES-"]
+                    bp_per_contract = settings["-BP_PER-"]
+                    num_contracts = int(strat_dict["Current Value"] / bp_per_contract)
+                    tranches = determine_num_tranches(
+                        min_tranches, max_tranches, num_contracts
+                    )
+                    strat_dict["Num Tranches"] = tranches
+                    strat_dict["Tranche Qtys"] = determine_tranche_qtys(tranches)
+                    if portfolio_mode:
+                        weighted_value = (
+                            port_dict["Current Value"] * settings["-PORT_WEIGHT-"] / 100
+                        )
+                        num_contracts = int(weighted_value / bp_per_contract)
+                        tranches = determine_num_tranches(
+                            min_tranches, max_tranches, num_contracts
+                        )
+                        strat_dict["Port Num Tranches"] = tranches
+                        strat_dict["Port Tranche Qtys"] = determine_tranche_qtys(
+                            tranches
+                        )
+                else:
+                    # not scaling
+                    num_contracts = settings["-TOP_X-"]
+                    strat_dict["Num Tranches"] = num_contracts
+                    strat_dict["Tranche Qtys"] = [1 for x in range(num_contracts)]
+                    strat_dict["Port Num Tranches"] = num_contracts
+                    strat_dict["Port Tranche Qtys"] = [1 for x in range(num_contracts)]
+
+            if settings["-AGG_TYPE-"] == "Monthly":
+                # date for best times should be the month prior as we don't know the future yet
+                best_time_date = current_date - relativedelta(months=1)
+            elif settings["-AGG_TYPE-"] == "Semi-Monthly":
+                # grab from last half-month
+                if current_date.day != 31:
+                    best_time_date = current_date - relativedelta(days=15)
+                else:
+                    best_time_date = current_date - relativedelta(days=16)
+            else:
+                # grab from last week
+                best_time_date = current_date - relativedelta(weeks=1)
+
+            def log_pnl_and_trades(strat_dict, num_tranches, tranche_qtys):
+                # determine gap info
+                gap_str = ""
+                if settings["-GAP_ANALYSIS-"]:
+                    _gap_type = "Gap%" if settings["-GAP_TYPE-"] == "%" else "Gap"
+                    try:
+                        gap_value = spx_history.at[current_date, _gap_type]
+                    except KeyError as e:
+                        # probably a day market was not open (i.e. holiday)
+                        gap_value = 0
+                    if gap_value > settings["-GAP_THRESHOLD-"]:
+                        gap_str = " Gap Up"
+                    elif gap_value < -settings["-GAP_THRESHOLD-"]:
+                        gap_str = " Gap Down"
+
+                if portfolio_mode:
+                    # determine which strat to use
+                    if settings["-PUT_OR_CALL-"]:
+                        _strat = "Best P/C"
+                    else:
+                        _strat = "Put-Call Comb"
+
+                    _strat = _strat + gap_str  # add gap info onto the end of strat name
+
+                    # determine which weekday to use
+                    if settings["-IDV_WEEKDAY-"]:
+                        _weekday = current_weekday
+                    else:
+                        _weekday = "All"
+
+                else:
+                    # determine strat name for df_dicts
+                    if "P_C_Comb" in strat:
+                        _strat = "Put-Call Comb"
+                    else:
+                        _strat = "Best P/C"
+
+                    # determine gap type
+                    if "Gap" not in strat:
+                        gap_str = ""
+
+                    _strat = _strat + gap_str  # add gap onto the end of strat name
+
+                    # determine weekday type
+                    if strat.startswith("All"):
+                        _weekday = "All"
+                    else:
+                        _weekday = current_weekday
+
+                # finally select the appropriate df_dict
+                df_dict = df_dicts[_strat][_weekday]
+
+                # get the best times for this strat
+                best_time_records = get_top_time_records(
+                    df_dict, strategy_settings, best_time_date, num_tranches
+                )
+
+                if portfolio_mode:
+                    # filter out other sources since all sources are included
+                    source = os.path.splitext(strat)[0]
+                    best_time_records = sorted(
+                        [
+                            record
+                            for record in best_time_records
+                            if record[2].endswith(source)
+                        ],
+                        key=lambda record: record[1],
+                        reverse=True,
+                    )[:num_tranches]
+
+                if settings["-PASSTHROUGH_MODE-"]:
+                    # get all the times this traded on this date
+                    source_dict = df_dicts["Put-Call Comb"]["All"][source]
+                    source_df = source_dict["org_df"]
+                    _filtered_df = source_df.iloc[
+                        source_dict["date_index"].get(current_date, [])
+                    ]
+                    best_times = _filtered_df["Time"].unique().tolist()
+                    # we don't determine the tranche qtys in passthrough mode, we just need
+                    # to trade whaterver is in the trade log for that day.  Let's determine
+                    # the qtys to trade for each trade in the log.
+                    tranche_qtys = []
+                    for _ in best_times:
+                        if use_scaling:
+                            current_value = strat_dict["Current Value"]
+                            # calc total qty
+                            total_qty = (
+                                current_value
+                                * settings["-PORT_WEIGHT-"]
+                                / 100
+                                / settings["-BP_PER-"]
+                            )
+
+                            # qty per trade
+                            qty = int(total_qty / len(best_times))
+                            tranche_qtys.append(max(qty, 1))
+                        else:
+                            tranche_qtys.append(1)
+                else:  # no passthrough, use best times analysis
+                    best_times = [record[0] for record in best_time_records]
+                    # source of the first record for each time
+                    time_sources = {}
+                    for record in best_time_records:
+                        time_sources.setdefault(record[0], record[2])
+
+                for time in best_times:
+                    # get the qty for this tranche time
+                    qty = tranche_qtys[best_times.index(time)]
+                    full_dt = dt.datetime.combine(current_date, parse_entry_time(time))
+
+                    if not settings["-PASSTHROUGH_MODE-"]:
+                        # get the source df, we already have it from eariler for pass-through
+                        source = time_sources[time]
+                        source_dict = df_dict[source]
+                        source_df = source_dict["org_df"]
+
+                    positions = source_dict["entry_index"].get(full_dt)
+                    if positions is None:
+                        continue
+                    filtered_rows = source_df.iloc[positions].copy()
+
+                    filtered_rows["qty"] = qty
+                    filtered_rows["source"] = source
+
+                    if is_BYOB_data(source_df):
+                        gross_pnl = (
+                            filtered_rows["ProfitLossAfterSlippage"].sum() * 100 * qty
+                        )
+                        commissions = filtered_rows["CommissionFees"].sum() * qty
+                        pnl = gross_pnl - commissions
+                    else:
+                        pnl = filtered_rows["P/L"].sum() * qty
+
+                    # log trade
+                    if using_auto_exclusions:
+                        # the expectancy is based on a single contract
+                        if is_BYOB_data(source_df):
+                            trade_pnl = (
+                                filtered_rows["ProfitLossAfterSlippage"] * 100
+                                - filtered_rows["CommissionFees"]
+                            ).sum()
+                        else:
+                            trade_pnl = filtered_rows["P/L"].sum()
+                        log_auto_exclusion_pnl(
+                            strat_dict["Auto Exclusion PnL"],
+                            current_date,
+                            trade_pnl,
+                            settings["-AGG_TYPE-"],
+                        )
+                    if warmed_up and not skip_day:
+                        strat_dict["trade log"].append(filtered_rows)
+                        strat_dict["Current Value"] += pnl
+                        strat_dict["Current Day PnL"] += pnl
+
+            if current_weekday in day_list:
+                # make sure its not the weekend
+                num_tranches = strat_dict["Num Tranches"]
+                tranche_qtys = strat_dict["Tranche Qtys"]
+                log_pnl_and_trades(strat_dict, num_tranches, tranche_qtys)
+                if portfolio_mode:
+                    num_tranches = strat_dict["Port Num Tranches"]
+                    tranche_qtys = strat_dict["Port Tranche Qtys"]
+                    log_pnl_and_trades(port_dict, num_tranches, tranche_qtys)
+
+            def calc_metrics(strat_dict: dict, strat: str, results: dict) -> None:
+                # calc metrics and log the results for the day
+                if strat_dict["Current Value"] >= strat_dict["Highest Value"]:
+                    strat_dict["Highest Value"] = strat_dict["Current Value"]
+                    strat_dict["DD Days"] = 0
+                else:
+                    # we are in Drawdown
+                    dd = (
+                        strat_dict["Highest Value"] - strat_dict["Current Value"]
+                    ) / strat_dict["Highest Value"]
+                    strat_dict["Current DD"] = dd
+                    if dd > strat_dict["Max DD"]:
+                        strat_dict["Max DD"] = dd
+                    strat_dict["DD Days"] += 1
+
+                if strat_dict["Current Day PnL"] > 0:
+                    strat_dict["Win Streak"] += 1
+                    strat_dict["Loss Streak"] = 0
+                elif strat_dict["Current Day PnL"] < 0:
+                    # tie does not change any streak
+                    strat_dict["Win Streak"] = 0
+                    strat_dict["Loss Streak"] += 1
+
+                results[strat].append(
+                    {
+                        "Date": current_date,
+                        "Current Value": strat_dict["Current Value"],
+                        "Highest Value": strat_dict["Highest Value"],
+                        "Max DD": strat_dict["Max DD"],
+                        "Current DD": strat_dict["Current DD"],
+                        "DD Days": strat_dict["DD Days"],
+                        "Day PnL": strat_dict["Current Day PnL"],
+                        "Win Streak": strat_dict["Win Streak"],
+                        "Loss Streak": strat_dict["Loss Streak"],
+                        "Initial Value": initial_value,
+                        "Weekday": current_weekday,
+                    }
+                )
+
+            if warmed_up and not skip_day:
+                calc_metrics(strat_dict, strat, results)
+
+            if skip_day:
+                # this is a skip day just increment the DD days if needed
+                if strat_dict["DD Days"] > 0:
+                    strat_dict["DD Days"] += 1
+                if portfolio_mode and port_dict["DD Days"] > 0:
+                    port_dict["DD Days"] += 1
+
+        # calculate all the stats for the portfolio now that all other strats have traded
+        if portfolio_mode and warmed_up and not skip_day:
+            calc_metrics(port_dict, "Portfolio", results)
+
+        current_date += dt.timedelta(1)
+
+    for strat in portfolio_metrics:
+        # build the results and trade log DataFrames from the collected rows
+        results[strat] = pd.DataFrame(results[strat])
+        trade_log = portfolio_metrics[strat]["trade log"]
+        portfolio_metrics[strat]["trade log"] = (
+            pd.concat(trade_log, ignore_index=True) if trade_log else pd.DataFrame()
+        )
+        if not results[strat].empty:
+            results[strat]["Date"] = pd.to_datetime(results[strat]["Date"])
+            uuid_str = str(uuid.uuid4())[:8]
+            if export_trades:
+                base_filename = f"{strat} - TradeLog_{uuid_str}"
+                ext = ".csv"
+                export_filename = get_next_filename(path, base_filename, ext)
+                portfolio_metrics[strat]["trade log"].to_csv(
+                    export_filename, index=False
+                )
+            if export_OO_sig:
+                base_filename = f"{strat} - OO_Signal_File_{uuid_str}"
+                ext = ".csv"
+                export_filename = get_next_filename(path, base_filename, ext)
+                export_oo_sig_file(
+                    portfolio_metrics[strat]["trade log"], export_filename
+                )
+    results_queue.put(("-BACKTEST_END-", results))
+    return results
+
+
+def get_walk_forward_gaps(
+    strategy_settings: dict, start: dt.date, end: dt.date
+) -> pd.DataFrame:
+    """
+    Returns the SPX gaps indexed by date for the walk forward test if any
+    strategy uses gap analysis, otherwise an empty DataFrame
+    """
+    spx_history = pd.DataFrame()
+    for setting in strategy_settings.values():
+        if setting["-GAP_ANALYSIS-"]:
+            spx_history = get_spx_gaps(start, end)
+            if not spx_history.empty:
+                # reset the index to just the date, dropping the time component
+                spx_history = spx_history.reset_index()
+                spx_history["Date"] = spx_history["Date"].dt.date
+                spx_history = spx_history.set_index("Date")
+    return spx_history
+
+
+def calculate_walk_forward_results(
+    dates: list,
+    rows: np.ndarray,
+    skips: np.ndarray,
+    tranche_days: np.ndarray,
+    tranche_pnl: np.ndarray,
+    initial_value: float,
+) -> pd.DataFrame:
+    """
+    Calculates the daily results of a strategy in the walk forward test from
+    the PnL of every tranche it traded.  'rows' marks the days that are
+    logged, 'skips' counts the times a day was skipped, which adds to the
+    drawdown days, and 'tranche_days' is the day of each tranche.  The PnL
+    is summed in the order of the tranches so the values are the same as
+    adding them up one at a time.
+    """
+    num_days = len(dates)
+    if not rows.any():
+        return pd.DataFrame()
+
+    # value at the end of each day, the PnL added one tranche at a time
+    values = np.cumsum(np.concatenate([[initial_value], tranche_pnl]))
+    tranches_to_date = np.cumsum(np.bincount(tranche_days, minlength=num_days))
+    day_pnl = np.bincount(tranche_days, weights=tranche_pnl, minlength=num_days)
+
+    row_days = np.flatnonzero(rows)
+    current_value = values[tranches_to_date[row_days]]
+    highest_value = np.maximum.accumulate(
+        np.concatenate([[initial_value], current_value])
+    )
+    prev_highest = highest_value[:-1]
+    highest_value = highest_value[1:]
+    new_high = current_value >= prev_highest
+
+    # drawdown is only updated on days below the high
+    dd = np.where(new_high, 0.0, (prev_highest - current_value) / prev_highest)
+    max_dd = np.maximum.accumulate(dd)
+    last_dd_row = np.maximum.accumulate(np.where(new_high, -1, np.arange(len(dd))))
+    current_dd = np.where(last_dd_row >= 0, dd[last_dd_row], 0.0)
+
+    # drawdown days restart at each new high, count every logged day below
+    # it and every skip after the first of those days
+    all_days = np.arange(num_days)
+    new_high_days = np.zeros(num_days, dtype=bool)
+    new_high_days[row_days] = new_high
+    rows_to_date = np.cumsum(rows)
+    skips_to_date = np.cumsum(skips)
+    last_high = np.maximum.accumulate(np.where(new_high_days, all_days, -1))
+    rows_at_high = np.where(last_high >= 0, rows_to_date[last_high], 0)
+    rows_since_high = rows_to_date - rows_at_high
+    first_dd_day = row_days[np.minimum(rows_at_high, len(row_days) - 1)]
+    dd_days = np.where(
+        rows_since_high > 0,
+        rows_since_high + skips_to_date - skips_to_date[first_dd_day],
+        0,
+    )[row_days]
+
+    # a day without PnL does not change either streak
+    row_pnl = day_pnl[row_days]
+    row_numbers = np.arange(len(row_days))
+    wins_to_date = np.cumsum(row_pnl > 0)
+    losses_to_date = np.cumsum(row_pnl < 0)
+    last_loss = np.maximum.accumulate(np.where(row_pnl < 0, row_numbers, -1))
+    last_win = np.maximum.accumulate(np.where(row_pnl > 0, row_numbers, -1))
+    win_streak = wins_to_date - np.where(last_loss >= 0, wins_to_date[last_loss], 0)
+    loss_streak = losses_to_date - np.where(last_win >= 0, losses_to_date[last_win], 0)
+
+    row_dates = [dates[day] for day in row_days]
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(row_dates),
+            "Current Value": current_value,
+            "Highest Value": highest_value,
+            "Max DD": max_dd,
+            "Current DD": current_dd,
+            "DD Days": dd_days,
+            "Day PnL": row_pnl,
+            "Win Streak": win_streak,
+            "Loss Streak": loss_streak,
+            "Initial Value": initial_value,
+            "Weekday": [date.strftime("%a") for date in row_dates],
+        }
+    )
+
+
+def walk_forward_test_vectorized(
+    df_dicts: dict,
+    path: str,
+    strategy_settings: dict,
+    strats: list,
+    start: dt.date,
+    end: dt.date,
+    initial_value: float,
+    export_trades: bool,
+    export_OO_sig: bool,
+) -> dict:
+    """
+    Runs the walk forward test for a fixed number of 1 lot tranches.  The
+    days each strategy skips or logs are worked out for the whole calendar
+    at once, and only the weekdays the trade logs have trades on are
+    stepped through to pick the tranche times, with the top times of each
+    period looked up once.  The PnL of the tranches is then summed from
+    arrays of each source and the daily values, drawdowns and streaks are
+    calculated for all the days at once.
+    """
+    portfolio_mode = "-SINGLE_MODE-" not in strategy_settings
+    day_list = [_day[:3] for _day in weekday_list]
+    index_top_times(df_dicts, strategy_settings)
+    spx_history = get_walk_forward_gaps(strategy_settings, start, end)
+
+    # the periods that the dates for the best times can fall in
+    agg_types = {settings["-AGG_TYPE-"] for settings in strategy_settings.values()}
+
+    def get_period_key(date: dt.date) -> tuple:
+        key = []
+        if "Monthly" in agg_types or "Semi-Monthly" in agg_types:
+            key += [date.year, date.month, date.day <= 15]
+        if "Weekly" in agg_types:
+            # weeks ending on Sunday like pd.Period(date, "W")
+            key.append((date.toordinal() - 1) // 7)
+        return tuple(key)
+
+    top_time_records = {}
+
+    def get_best_time_records(_strat, _weekday, best_time_date, num_tranches):
+        key = (_strat, _weekday, get_period_key(best_time_date), num_tranches)
+        if key not in top_time_records:
+            top_time_records[key] = get_top_time_records(
+                df_dicts[_strat][_weekday],
+                strategy_settings,
+                best_time_date,
+                num_tranches,
+            )
+        return top_time_records[key]
+
+    dates = [start + dt.timedelta(days) for days in range((end - start).days + 1)]
+    calendar_dates = pd.Series(pd.to_datetime(dates))
+    weekdays = calendar_dates.dt.strftime("%a").to_numpy()
+    traded = [strat for strat in strats if strat != "Portfolio"]
+    rows = {strat: np.zeros(len(dates), dtype=bool) for strat in strats}
+    skips = {strat: np.zeros(len(dates), dtype=int) for strat in strats}
+    # the day and the fill of each tranche
+    tranches = {strat: ([], []) for strat in strats}
+    trade_logs = {strat: [] for strat in strats}
+
+    # the days each strategy skips, which still count towards the drawdown
+    # days, and the days it is logged on
+    for strat in traded:
+        settings = strategy_settings[strat if portfolio_mode else "-SINGLE_MODE-"]
+        skip_days = ~np.isin(weekdays, day_list)
+        if settings["-APPLY_EXCLUSIONS-"] != "Analysis":
+            day_exlusions = [_day[:3] for _day in settings["-WEEKDAY_EXCLUSIONS-"]]
+            skip_days |= np.isin(weekdays, day_exlusions)
+            skip_days |= get_news_event_mask(
+                calendar_dates, settings["-NEWS_EXCLUSIONS-"]
+            )
+        skips[strat] += skip_days
+        rows[strat] = ~skip_days
+        if portfolio_mode:
+            skips["Portfolio"] += skip_days
+            # the portfolio is logged when the last strategy traded
+            rows["Portfolio"] = ~skip_days
+
+    # only the days with trades in the logs can have fills
+    trade_dates = set()
+    for day_dict in df_dicts.values():
+        for df_dict in day_dict.values():
+            for source_dict in df_dict.values():
+                trade_dates.update(source_dict["date_index"])
+    trading_days = [
+        day
+        for day, current_date in enumerate(dates)
+        if current_date in trade_dates and weekdays[day] in day_list
+    ]
+
+    # the source df and trade positions of every fill
+    fill_sources = []
+    fill_positions = []
+
+    progress = progress_reporter("Walk forward", len(trading_days), "days")
+    for trading_day, day in enumerate(trading_days):
+        # check for cancel flag to stop thread
+        if cancel_flag.is_set():
+            cancel_flag.clear()
+            results_queue.put(("-BACKTEST_CANCELED-", ""))
+            return
+
+        current_date = dates[day]
+        progress(trading_day, str(current_date))
+
+        current_weekday = weekdays[day]
+        for strat in traded:
+            if not rows[strat][day]:
+                continue
+            settings = strategy_settings[strat if portfolio_mode else "-SINGLE_MODE-"]
+
+            if settings["-AGG_TYPE-"] == "Monthly":
+                # date for best times should be the month prior as we don't know the future yet
+                best_time_date = current_date - relativedelta(months=1)
+            elif settings["-AGG_TYPE-"] == "Semi-Monthly":
+                # grab from last half-month
+                if current_date.day != 31:
+                    best_time_date = current_date - relativedelta(days=15)
+                else:
+                    best_time_date = current_date - relativedelta(days=16)
+            else:
+                # grab from last week
+                best_time_date = current_date - relativedelta(weeks=1)
+
+            # determine gap info
+            gap_str = ""
+            if settings["-GAP_ANALYSIS-"]:
+                _gap_type = "Gap%" if settings["-GAP_TYPE-"] == "%" else "Gap"
+                try:
+                    gap_value = spx_history.at[current_date, _gap_type]
+                except KeyError:
+                    # probably a day market was not open (i.e. holiday)
+                    gap_value = 0
+                if gap_value > settings["-GAP_THRESHOLD-"]:
+                    gap_str = " Gap Up"
+                elif gap_value < -settings["-GAP_THRESHOLD-"]:
+                    gap_str = " Gap Down"
+
+            # select the df_dict the same way the day by day test does
+            if portfolio_mode:
+                _strat = "Best P/C" if settings["-PUT_OR_CALL-"] else "Put-Call Comb"
+                _weekday = current_weekday if settings["-IDV_WEEKDAY-"] else "All"
+            else:
+                _strat = "Put-Call Comb" if "P_C_Comb" in strat else "Best P/C"
+                if "Gap" not in strat:
+                    gap_str = ""
+                _weekday = "All" if strat.startswith("All") else current_weekday
+            _strat = _strat + gap_str
+            df_dict = df_dicts[_strat][_weekday]
+
+            # the number of tranches is fixed without scaling
+            num_tranches = settings["-TOP_X-"]
+            best_time_records = get_best_time_records(
+                _strat, _weekday, best_time_date, num_tranches
+            )
+            if portfolio_mode:
+                # filter out other sources since all sources are included
+                source = os.path.splitext(strat)[0]
+                best_time_records = sorted(
+                    [
+                        record
+                        for record in best_time_records
+                        if record[2].endswith(source)
+                    ],
+                    key=lambda record: record[1],
+                    reverse=True,
+                )[:num_tranches]
+
+            # source of the first record for each time
+            time_sources = {}
+            for record in best_time_records:
+                time_sources.setdefault(record[0], record[2])
+
+            for record in best_time_records:
+                time = record[0]
+                source = time_sources[time]
+                source_dict = df_dict[source]
+                full_dt = dt.datetime.combine(current_date, parse_entry_time(time))
+                positions = source_dict["entry_index"].get(full_dt)
+                if positions is None:
+                    continue
+                fill = len(fill_positions)
+                fill_sources.append(source_dict["org_df"])
+                fill_positions.append(positions)
+
+                # the portfolio trades the same 1 lot tranches as the strategy
+                for _strat_name in [strat, "Portfolio"] if portfolio_mode else [strat]:
+                    tranches[_strat_name][0].append(day)
+                    tranches[_strat_name][1].append(fill)
+                    if export_trades or export_OO_sig:
+                        trade_logs[_strat_name].append(
+                            (source_dict["org_df"], positions, source)
+                        )
+
+    # sum the PnL of the trades of every fill from the PnL columns of its
+    # source, missing values add 0
+    fill_pnl = np.zeros(len(fill_positions))
+    source_fills = {}
+    for fill, source_df in enumerate(fill_sources):
+        source_fills.setdefault(id(source_df), (source_df, []))[1].append(fill)
+    for source_df, fills in source_fills.values():
+        columns = (
+            ["ProfitLossAfterSlippage", "CommissionFees"]
+            if is_BYOB_data(source_df)
+            else ["P/L"]
+        )
+        positions = [fill_positions[fill] for fill in fills]
+        starts = np.cumsum([0] + [len(_positions) for _positions in positions[:-1]])
+        positions = np.concatenate(positions)
+        sums = [
+            np.add.reduceat(
+                np.nan_to_num(source_df[column].to_numpy(dtype=float))[positions],
+                starts,
+            )
+            for column in columns
+        ]
+        if len(sums) == 2:
+            # BYOB BT data
+            fill_pnl[fills] = sums[0] * 100 - sums[1]
+        else:
+            fill_pnl[fills] = sums[0]  # OO BT data
+
+    results = {}
+    for strat in strats:
+        tranche_days, tranche_fills = tranches[strat]
+        results[strat] = calculate_walk_forward_results(
+            dates,
+            rows[strat],
+            skips[strat],
+            np.array(tranche_days, dtype=int),
+            fill_pnl[np.array(tranche_fills, dtype=int)],
+            initial_value,
+        )
+        if results[strat].empty or not (export_trades or export_OO_sig):
+            continue
+
+        # build the trade log with the qty and source of every trade, taking
+        # the rows of each source at once and then putting them in trade order
+        source_trades = {}
+        row_number = 0
+        for source_df, positions, source in trade_logs[strat]:
+            trades = source_trades.setdefault(
+                (id(source_df), source), (source_df, source, [], [])
+            )
+            trades[2].append(positions)
+            trades[3].append(np.arange(row_number, row_number + len(positions)))
+            row_number += len(positions)
+        trade_log = pd.DataFrame()
+        if source_trades:
+            trade_log = []
+            for source_df, source, positions, row_numbers in source_trades.values():
+                filtered_rows = source_df.iloc[np.concatenate(positions)].copy()
+                filtered_rows["qty"] = 1
+                filtered_rows["source"] = source
+                trade_log.append(filtered_rows)
+            row_numbers = np.concatenate(
+                [np.concatenate(trades[3]) for trades in source_trades.values()]
+            )
+            trade_log = (
+                pd.concat(trade_log, ignore_index=True)
+                .iloc[np.argsort(row_numbers)]
+                .reset_index(drop=True)
+            )
+        uuid_str = str(uuid.uuid4())[:8]
+        if export_trades:
+            export_filename = get_next_filename(
+                path, f"{strat} - TradeLog_{uuid_str}", ".csv"
+            )
+            trade_log.to_csv(export_filename, index=False)
+        if export_OO_sig:
+            export_filename = get_next_filename(
+                path, f"{strat} - OO_Signal_File_{uuid_str}", ".csv"
+            )
+            export_oo_sig_file(trade_log, export_filename)
+
+    results_queue.put(("-BACKTEST_END-", results))
+    return results
+
+
+def calculate_summary_metrics(df: pd.DataFrame) -> dict:
+    """
+    Takes the daily results df of a strategy from the walk forward test
+    and returns its summary statistics.  The df is not modified.
+    """
+    final_value = df["Current Value"].iloc[-1]
+    initial_value = df["Initial Value"].min()
+    max_dd = df["Max DD"].max()
+
+    # CAGR
+    start_dt = df["Date"].iloc[0]
+    end_dt = df["Date"].iloc[-1]
+    years = (end_dt - start_dt).days / 365.25
+    cagr = ((final_value / initial_value) ** (1 / years)) - 1
+
+    # Sharpe Ratio
+    daily_return = df["Current Value"].pct_change()
+    std_dev = daily_return.std()
+    risk_free_rate = 0.02 / 252  # Assume 2% annual risk-free rate, convert to daily
+    excess_returns = daily_return - risk_free_rate
+    sharpe_ratio = np.sqrt(252) * excess_returns.mean() / std_dev  # Annualized
+
+    if max_dd:
+        mar = cagr / max_dd
+    else:
+        mar = float("inf")
+
+    # Group PnL by month
+    monthly_pnl = df.groupby(df["Date"].dt.to_period("M"))["Day PnL"].sum()
+
+    return {
+        "Final Value": final_value,
+        "Initial Value": initial_value,
+        "Net PnL": final_value - initial_value,
+        "Total Return": (final_value - initial_value) / initial_value,
+        "CAGR": cagr,
+        "Max DD": max_dd,
+        "DD Days": df["DD Days"].max(),
+        "Win Streak": df["Win Streak"].max(),
+        "Loss Streak": df["Loss Streak"].max(),
+        "Largest Monthly PnL": monthly_pnl.max(),
+        "Largest Monthly PnL Date": monthly_pnl.idxmax().to_timestamp(),
+        "Lowest Monthly PnL": monthly_pnl.min(),
+        "Lowest Monthly PnL Date": monthly_pnl.idxmin().to_timestamp(),
+        "MAR": mar,
+        "Sharpe": sharpe_ratio,
+    }
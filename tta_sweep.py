@@ -0,0 +1,428 @@
+"""
+Sweeps the trailing average settings of the Tranche Time Analyzer and ranks
+the walk forward results of every combination.
+
+Takes the same trade logs and settings JSON as tta_cli.py plus a list of
+values for each of -AVG_PERIOD_1-, -AVG_PERIOD_2-, -PERIOD_1_WEIGHT- and
+-TOP_X-.  -PERIOD_2_WEIGHT- is set to 100 minus -PERIOD_1_WEIGHT-.  The
+trades, analysis cube, period tables and rolling averages of each file are
+computed once per worker process and reused for every combination.  The
+averages of each pair of averaging periods are weighted with every weight
+of the sweep in one array operation, so each combination only costs its
+walk forward test.
+
+Every combination is tested over the same dates, starting once the longest
+averaging period in the sweep has warmed up.  The ranked CAGR, Max DD, MAR
+and Sharpe of each combination are written to "Sweep Results.csv" in the
+output directory.
+
+Usage:
+    python tta_sweep.py trade_log.csv [...] [--settings tta_settings.json]
+                        --avg-period-1 2 4 --avg-period-2 6 8 12
+                        [--period-1-weight 25 50] [--top-x 3 5]
+"""
+
+import argparse
+import concurrent.futures
+import copy
+import datetime as dt
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+from typing import Tuple
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+import tta_cli
+import tta_core as core
+
+SWEEP_METRICS = ["CAGR", "Max DD", "MAR", "Sharpe"]
+
+# state of a sweep worker process, set up once by init_sweep_worker
+sweep_state = {}
+
+
+def get_sweep_combinations(args) -> list:
+    """
+    Returns the settings of every combination of the parameter grids, with
+    the long averaging period at least as long as the short one
+    """
+    combinations = []
+    for period1, period2, weight1, top_x in itertools.product(
+        args.avg_period_1, args.avg_period_2, args.period_1_weight, args.top_x
+    ):
+        if period2 < period1:
+            continue
+        combinations.append(
+            {
+                "-AVG_PERIOD_1-": period1,
+                "-AVG_PERIOD_2-": period2,
+                "-PERIOD_1_WEIGHT-": weight1,
+                "-PERIOD_2_WEIGHT-": 100 - weight1,
+                "-TOP_X-": top_x,
+            }
+        )
+    return combinations
+
+
+def init_sweep_worker(
+    files_list: list,
+    strategy_settings: dict,
+    wf_settings: dict,
+    average_weights: list,
+    state: dict,
+) -> None:
+    """
+    Sets up a worker process of the sweep pool with the files, settings and
+    weights of the sweep and the state of tta_core in the main process
+    """
+    core.init_analysis_worker(state)
+    sweep_state.update(
+        {
+            "files": files_list,
+            "strategy_settings": strategy_settings,
+            "wf_settings": wf_settings,
+            # trades, slices and rolling averages reused by every combination
+            "analysis_cache": {},
+            # the averages of each pair of periods are weighted with all of
+            # these at once
+            "average_weights": average_weights,
+        }
+    )
+
+
+def get_messages() -> list:
+    """
+    Empties 'results_queue' and returns the errors posted to it
+    """
+    errors = []
+    while True:
+        try:
+            result_key, result = core.results_queue.get(block=False)
+        except queue.Empty:
+            return errors
+        if result_key == "-ERROR-":
+            errors.append(result)
+
+
+def get_sweep_start(df_dicts: dict, max_period: int, start: dt.date) -> dt.date:
+    """
+    Returns the first date the walk forward test can start with the
+    longest averaging period of the sweep, the same way walk_forward_test
+    finds its warmed up start date
+    """
+    first_date = max(
+        df_dict["org_df"]["EntryTime"].min().date()
+        for df_dict in df_dicts["Put-Call Comb"]["All"].values()
+    )
+    date_adv = first_date + relativedelta(months=max_period)
+    warm_start = dt.date(date_adv.year, date_adv.month, 1)
+    return max(warm_start, start) if start else warm_start
+
+
+def run_sweep_combination(combination: dict) -> Tuple[dict, list]:
+    """
+    Runs the analysis and walk forward test with the settings of one
+    combination.  Returns its summary metrics and any errors.
+    """
+    strategy_settings = copy.deepcopy(sweep_state["strategy_settings"])
+    for settings in strategy_settings.values():
+        settings.update(combination)
+    wf_settings = sweep_state["wf_settings"]
+
+    df_dicts = core.run_analysis_threaded(
+        sweep_state["files"],
+        strategy_settings,
+        False,
+        output_format="None",
+        analysis_cache=sweep_state["analysis_cache"],
+        average_weights=sweep_state["average_weights"],
+    )
+    if not df_dicts or "Put-Call Comb" not in df_dicts:
+        return None, get_messages()
+
+    results = core.walk_forward_test(
+        df_dicts,
+        wf_settings["path"],
+        strategy_settings,
+        initial_value=wf_settings["initial_value"],
+        start=get_sweep_start(
+            df_dicts, wf_settings["max_period"], wf_settings["start"]
+        ),
+        end=wf_settings["end"],
+        use_scaling=wf_settings["use_scaling"],
+        fast_engine=wf_settings["fast_engine"],
+    )
+    errors = get_messages()
+    if not results:
+        return None, errors
+
+    # rank the portfolio as a whole or the combined puts and calls of a
+    # single strategy
+    strat = "All-P_C_Comb" if "-SINGLE_MODE-" in strategy_settings else "Portfolio"
+    if results[strat].empty:
+        return None, errors
+    metrics = core.calculate_summary_metrics(results[strat])
+    return {
+        **combination,
+        **{metric: metrics[metric] for metric in SWEEP_METRICS},
+    }, errors
+
+
+def run_sweep(
+    files_list: list,
+    strategy_settings: dict,
+    combinations: list,
+    wf_settings: dict,
+    workers: int,
+) -> pd.DataFrame:
+    """
+    Runs the walk forward test of every combination, in a pool of worker
+    processes if 'workers' is more than 1, and returns a row of metrics
+    for each in the order of 'combinations'
+    """
+    average_weights = list(
+        dict.fromkeys(
+            (combination["-PERIOD_1_WEIGHT-"], combination["-PERIOD_2_WEIGHT-"])
+            for combination in combinations
+        )
+    )
+    initargs = (
+        files_list,
+        strategy_settings,
+        wf_settings,
+        average_weights,
+        core.get_analysis_worker_state(),
+    )
+    rows = []
+
+    def add_result(i, result):
+        row, errors = result
+        for error in errors:
+            print(f"Error: {error}", file=sys.stderr)
+        if row:
+            rows.append(row)
+        print(f"Tested {i + 1} of {len(combinations)} combinations", file=sys.stderr)
+
+    if workers > 1 and len(combinations) > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(workers, len(combinations)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_sweep_worker,
+            initargs=initargs,
+        ) as executor:
+            # hand out the combinations with the same averaging periods
+            # together so a worker reuses their weighted averages
+            same_periods = len(combinations) // len(
+                {
+                    (combination["-AVG_PERIOD_1-"], combination["-AVG_PERIOD_2-"])
+                    for combination in combinations
+                }
+            )
+            chunksize = max(1, min(same_periods, len(combinations) // workers))
+            results = executor.map(
+                run_sweep_combination, combinations, chunksize=chunksize
+            )
+            for i, result in enumerate(results):
+                add_result(i, result)
+    else:
+        init_sweep_worker(*initargs)
+        for i, combination in enumerate(combinations):
+            add_result(i, run_sweep_combination(combination))
+
+    return pd.DataFrame(rows, columns=list(combinations[0].keys()) + SWEEP_METRICS)
+
+
+def rank_sweep_results(df: pd.DataFrame, rank_by: str) -> pd.DataFrame:
+    """
+    Sorts the sweep results best first by one of SWEEP_METRICS
+    """
+    df = df.sort_values(
+        rank_by, ascending=rank_by == "Max DD", kind="stable", ignore_index=True
+    )
+    df.insert(0, "Rank", range(1, len(df) + 1))
+    return df
+
+
+def get_args():
+    arg_parser = argparse.ArgumentParser(
+        description="Rank the walk forward results of a grid of averaging settings"
+    )
+    arg_parser.add_argument("files", nargs="+", help="trade log CSV files")
+    arg_parser.add_argument(
+        "--settings", help="settings JSON with the same keys as tta_settings.json"
+    )
+    arg_parser.add_argument(
+        "--output",
+        help="directory for the results, defaults to the data folder next to"
+        " the first trade log",
+    )
+    arg_parser.add_argument(
+        "--news-events", help="news event CSV from fxstreet.com/economic-calendar"
+    )
+    arg_parser.add_argument(
+        "--avg-period-1",
+        type=int,
+        nargs="+",
+        help="short averaging periods, defaults to -AVG_PERIOD_1- of the settings",
+    )
+    arg_parser.add_argument(
+        "--avg-period-2",
+        type=int,
+        nargs="+",
+        help="long averaging periods, defaults to -AVG_PERIOD_2- of the settings",
+    )
+    arg_parser.add_argument(
+        "--period-1-weight",
+        type=float,
+        nargs="+",
+        help="weights in %% of the short period, defaults to -PERIOD_1_WEIGHT-"
+        " of the settings",
+    )
+    arg_parser.add_argument(
+        "--top-x",
+        type=int,
+        nargs="+",
+        help="top times to select, defaults to -TOP_X- of the settings",
+    )
+    arg_parser.add_argument(
+        "--portfolio",
+        action=argparse.BooleanOptionalAction,
+        help="analyze the files as a portfolio of strategies",
+    )
+    arg_parser.add_argument(
+        "--rank-by",
+        choices=SWEEP_METRICS,
+        default="MAR",
+        help="metric to rank the combinations by, defaults to MAR",
+    )
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of processes to test the combinations with, defaults to"
+        " all CPU cores",
+    )
+    arg_parser.add_argument("--start", help="walk forward start date")
+    arg_parser.add_argument("--end", help="walk forward end date")
+    arg_parser.add_argument(
+        "--initial-value", help="walk forward starting portfolio value"
+    )
+    arg_parser.add_argument(
+        "--scaling",
+        action=argparse.BooleanOptionalAction,
+        help="scale the number of tranches with the portfolio value",
+    )
+    arg_parser.add_argument(
+        "--fast-wf",
+        action=argparse.BooleanOptionalAction,
+        help="run the walk forward tests with the vectorized engine when not"
+        " scaling and without passthrough or auto exclusions",
+    )
+    return arg_parser.parse_args()
+
+
+def main() -> int:
+    args = get_args()
+
+    for file in args.files:
+        if os.path.splitext(file)[1].lower() != ".csv":
+            print(f"Error: {file} does not appear to be a csv file", file=sys.stderr)
+            return 1
+
+    app_settings = tta_cli.load_settings(args.settings)
+    # command line options take precedence over the settings file
+    for key, arg in [
+        ("-PORTFOLIO_MODE-", args.portfolio),
+        ("-START_DATE-", args.start),
+        ("-END_DATE-", args.end),
+        ("-START_VALUE-", args.initial_value),
+        ("-SCALING-", args.scaling),
+        ("-FAST_WF-", args.fast_wf),
+    ]:
+        if arg is not None:
+            app_settings[key] = arg
+
+    strategy_settings = tta_cli.get_strategy_settings(args.files, app_settings)
+    result = core.validate_strategy_settings(strategy_settings)
+    if type(result) == str:
+        print(f"Error: {result}", file=sys.stderr)
+        return 1
+
+    # the settings are the grid when no values are given for a parameter
+    settings = next(iter(strategy_settings.values()))
+    for key, arg in [
+        ("-AVG_PERIOD_1-", "avg_period_1"),
+        ("-AVG_PERIOD_2-", "avg_period_2"),
+        ("-PERIOD_1_WEIGHT-", "period_1_weight"),
+        ("-TOP_X-", "top_x"),
+    ]:
+        if getattr(args, arg) is None:
+            setattr(args, arg, [settings[key]])
+
+    if min(args.avg_period_1 + args.avg_period_2 + args.top_x) < 1:
+        print(
+            "Error: averaging periods and top x should be whole numbers > 0",
+            file=sys.stderr,
+        )
+        return 1
+    if not all(0 <= weight <= 100 for weight in args.period_1_weight):
+        print("Error: period 1 weights should be between 0 and 100", file=sys.stderr)
+        return 1
+
+    combinations = get_sweep_combinations(args)
+    if not combinations:
+        print(
+            "Error: none of the long averaging periods are as long as the short ones",
+            file=sys.stderr,
+        )
+        return 1
+
+    try:
+        start_date = tta_cli.parse_date(app_settings["-START_DATE-"], "Start")
+        end_date = tta_cli.parse_date(app_settings["-END_DATE-"], "End")
+        initial_value = float(app_settings["-START_VALUE-"])
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if not tta_cli.load_news_events(args.news_events, strategy_settings):
+        return 1
+
+    output_path = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(args.files[0])), "data"
+    )
+    os.makedirs(output_path, exist_ok=True)
+
+    wf_settings = {
+        "path": output_path,
+        "initial_value": initial_value,
+        "start": start_date,
+        "end": end_date,
+        "use_scaling": app_settings["-SCALING-"],
+        "fast_engine": app_settings["-FAST_WF-"],
+        "max_period": max(
+            max(combination["-AVG_PERIOD_1-"], combination["-AVG_PERIOD_2-"])
+            for combination in combinations
+        ),
+    }
+    sweep_df = run_sweep(
+        args.files, strategy_settings, combinations, wf_settings, args.workers
+    )
+    if sweep_df.empty:
+        print("Error: none of the combinations could be tested", file=sys.stderr)
+        return 1
+
+    sweep_df = rank_sweep_results(sweep_df, args.rank_by)
+    filename = core.get_next_filename(output_path, "Sweep Results", ".csv")
+    sweep_df.to_csv(filename, index=False)
+    print(sweep_df.head(10).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())